@@ -2,22 +2,33 @@ import streamlit as st
 import json
 import re
 import datetime
-from PyPDF2 import PdfReader
-from ai_client import AIClient
-from study_planner import validate_text_input
-from sqlalchemy.orm import Session
+import concurrent.futures
+import time
+from ai_client import AIClient, AIClientError
+from config import Config
+from retrieval import DocumentIndex, format_context
+from document_library import store_upload, list_library, open_from_library, document_pages
+from jobs import JobRunner, QUEUED, DONE, FAILED
+from study_planner import validate_text_input, save_roadmap
+from content_packs import PackLibrary
+from diagrams import DiagramRenderer, DiagramError, GraphvizNotInstalledError, inline_svg, validate_dot
+from knowledge_graph import graph_cache, to_dot
+from prerequisites import PrerequisiteGraph, fetch_prerequisites
+from queries import list_user_decks, list_user_quizzes, community_cache, quiz_items, clone_deck, clone_quiz, delete_deck, delete_quiz
 from sqlalchemy import func
 from sqlalchemy.exc import OperationalError
 
 # --- Database, Auth, and SRS Imports ---
-from database import init_db, get_db, User, StudyTopic, QuizResult, FlashcardDeck, Flashcard, StudyRoadmap, RoadmapItem, KnowledgeNode, KnowledgeEdge, RoadmapProject, QuizCollection, QuizQuestion
+from database import init_db, session_scope, Document, User, StudyTopic, QuizResult, FlashcardDeck, Flashcard, StudyRoadmap, RoadmapItem, KnowledgeNode, KnowledgeEdge, RoadmapProject, QuizCollection, QuizQuestion
 from auth import create_user, authenticate_user
 from srs import update_card
 
 # --- Initialize Database ---
-init_db()
-db_gen = get_db()
-db: Session = next(db_gen)
+@st.cache_resource(show_spinner=False)
+def prepare_database():
+    """Creates missing tables once per server process rather than on every rerun."""
+    init_db()
+prepare_database()
 
 
 # --- 1. AESTHETIC AND UI CONFIGURATION ---
@@ -213,782 +224,997 @@ TASK_OPTIONS = [
 def get_ai_client(): return AIClient()
 client = get_ai_client()
 
+@st.cache_resource
+def get_job_runner(): return JobRunner(client)
+job_runner = get_job_runner()
+
+@st.cache_resource
+def get_content_packs(): return PackLibrary()
+curated_packs = get_content_packs()
+
+@st.cache_resource
+def get_diagram_renderer(): return DiagramRenderer()
+diagram_renderer = get_diagram_renderer()
+
+@st.cache_resource
+def get_prerequisite_graph(): return PrerequisiteGraph()
+prerequisite_graph = get_prerequisite_graph()
+
 # ==================================
 # --- 4. AUTHENTICATION & MAIN FLOW ---
 # ==================================
 
-if 'user' not in st.session_state:
-    auth_cols = st.columns((1, 1.5), gap="large")
+# One session per script run, closed when the run ends, including by st.rerun() or st.stop()
+with session_scope() as db:
+    if 'user' not in st.session_state:
+        auth_cols = st.columns((1, 1.5), gap="large")
     
-    with auth_cols[0]:
-        st.title("Welcome to 🧠 Brainstorm Buddy")
-        st.markdown("### Your personal AI-powered learning companion.")
-        st.write("") 
-
-        choice = st.radio("Choose Action", ["Login", "Sign Up"], label_visibility="collapsed")
-
-        if choice == "Login":
-            st.header("Login to Your Account")
-            with st.form("login_form"):
-                username = st.text_input("Username", placeholder="aditya_ranjan")
-                password = st.text_input("Password", type="password", placeholder="••••••••")
-                submitted = st.form_submit_button("Login", type="primary", use_container_width=True)
-                if submitted:
-                    user = authenticate_user(db, username, password)
-                    if user:
-                        st.session_state.user = user
-                        st.rerun()
-                    else:
-                        st.error("Invalid username or password.")
+        with auth_cols[0]:
+            st.title("Welcome to 🧠 Brainstorm Buddy")
+            st.markdown("### Your personal AI-powered learning companion.")
+            st.write("") 
+
+            choice = st.radio("Choose Action", ["Login", "Sign Up"], label_visibility="collapsed")
+
+            if choice == "Login":
+                st.header("Login to Your Account")
+                with st.form("login_form"):
+                    username = st.text_input("Username", placeholder="aditya_ranjan")
+                    password = st.text_input("Password", type="password", placeholder="••••••••")
+                    submitted = st.form_submit_button("Login", type="primary", use_container_width=True)
+                    if submitted:
+                        user = authenticate_user(db, username, password)
+                        if user:
+                            st.session_state.user = user
+                            st.rerun()
+                        else:
+                            st.error("Invalid username or password.")
         
-        if choice == "Sign Up":
-            st.header("Create a New Account")
-            with st.form("signup_form"):
-                new_username = st.text_input("Username", placeholder="Choose a unique username")
-                new_password = st.text_input("Password", type="password", placeholder="Choose a strong password")
-                submitted = st.form_submit_button("Sign Up", type="primary", use_container_width=True)
-                if submitted:
-                    if not new_username or not new_password:
-                        st.error("Username and password cannot be empty.")
-                    elif db.query(User).filter(User.username == new_username).first():
-                        st.error("Username already exists.")
-                    else:
-                        new_user = create_user(db, new_username, new_password)
-                        st.session_state.user = new_user
-                        st.success("Account created successfully! Welcome.")
-                        st.rerun()
-    with auth_cols[1]:
-        st.write("<br><br><br><br>", unsafe_allow_html=True)
-        st.subheader("Master Any Subject with AI")
+            if choice == "Sign Up":
+                st.header("Create a New Account")
+                with st.form("signup_form"):
+                    new_username = st.text_input("Username", placeholder="Choose a unique username")
+                    new_password = st.text_input("Password", type="password", placeholder="Choose a strong password")
+                    submitted = st.form_submit_button("Sign Up", type="primary", use_container_width=True)
+                    if submitted:
+                        if not new_username or not new_password:
+                            st.error("Username and password cannot be empty.")
+                        elif db.query(User).filter(User.username == new_username).first():
+                            st.error("Username already exists.")
+                        else:
+                            new_user = create_user(db, new_username, new_password)
+                            st.session_state.user = new_user
+                            st.success("Account created successfully! Welcome.")
+                            st.rerun()
+        with auth_cols[1]:
+            st.write("<br><br><br><br>", unsafe_allow_html=True)
+            st.subheader("Master Any Subject with AI")
         
-        features = {
-            "🧠 Personalized Learning Paths": "Generate custom study roadmaps tailored to your goals.",
-            "🧩 Interactive Quizzes": "Test your knowledge with dynamic, AI-generated questions.",
-            "🃏 Kinetic Flashcards": "Reinforce memory with our intelligent spaced repetition system.",
-            "💬 24/7 AI Tutor": "Get instant explanations and answers to your toughest questions."
-        }
+            features = {
+                "🧠 Personalized Learning Paths": "Generate custom study roadmaps tailored to your goals.",
+                "🧩 Interactive Quizzes": "Test your knowledge with dynamic, AI-generated questions.",
+                "🃏 Kinetic Flashcards": "Reinforce memory with our intelligent spaced repetition system.",
+                "💬 24/7 AI Tutor": "Get instant explanations and answers to your toughest questions."
+            }
         
-        for title, description in features.items():
-            with st.container(border=True):
-                st.markdown(f"<h5>{title}</h5>", unsafe_allow_html=True)
-                st.markdown(f"<p style='color: #94A3B8;'>{description}</p>", unsafe_allow_html=True)
-
-else:
-    # --- 5. UTILITY FUNCTIONS ---
-    def get_current_user_id():
-        return st.session_state.user.id
-
-    def extract_file_text(uploaded_file):
-        if uploaded_file is None: return ""
-        if uploaded_file.type == "text/plain": return uploaded_file.read().decode("utf-8")
-        elif uploaded_file.type == "application/pdf":
+            for title, description in features.items():
+                with st.container(border=True):
+                    st.markdown(f"<h5>{title}</h5>", unsafe_allow_html=True)
+                    st.markdown(f"<p style='color: #94A3B8;'>{description}</p>", unsafe_allow_html=True)
+
+    else:
+        # --- 5. UTILITY FUNCTIONS ---
+        def get_current_user_id():
+            return st.session_state.user.id
+
+        def load_uploaded_document(uploaded_file):
+            """Stores an upload in the user's document library and returns its Document, or None if it is unreadable."""
+            if uploaded_file is None: return None
+            # Reruns map the same upload straight to its Document instead of re-reading and re-hashing it.
+            file_key = getattr(uploaded_file, "file_id", None) or (uploaded_file.name, uploaded_file.size)
+            known = st.session_state.setdefault("uploaded_documents", {})
+            if file_key in known:
+                document = db.get(Document, known[file_key])
+                if document: return document
+            progress_box = st.empty()
+            def on_page(done, total):
+                if done == 1 or done % 10 == 0 or done == total:
+                    progress_box.progress(done / total, text=f"Reading page {done}/{total}")
             try:
-                pdf, text = PdfReader(uploaded_file), ""
-                for page in pdf.pages: text += page.extract_text() or ""
-                return text
-            except Exception: return ""
-        try:
-            return uploaded_file.read().decode("utf-8")
-        except:
-            st.warning("Could not read the uploaded file as text. Only text-based files and PDFs are fully supported for content extraction.")
-            return ""
-
-
-    def extract_json_from_string(text):
-        """Finds and extracts the first valid JSON object or array from a string."""
-        match = re.search(r"```json\s*([\s\S]*?)\s*```", text)
-        if match:
-            return match.group(1).strip()
-        
-        first_bracket = -1
-        last_bracket = -1
-        
-        first_curly = text.find('{')
-        first_square = text.find('[')
-        
-        if first_curly != -1 and (first_square == -1 or first_curly < first_square):
-            first_bracket = first_curly
-            last_bracket = text.rfind('}')
-        elif first_square != -1:
-            first_bracket = first_square
-            last_bracket = text.rfind(']')
-
-        if first_bracket != -1 and last_bracket != -1:
-            return text[first_bracket : last_bracket + 1].strip()
-
-        return text
+                document = store_upload(db, get_current_user_id(), uploaded_file.getvalue(), uploaded_file.name, uploaded_file.type, on_page)
+            except ValueError as e:
+                st.warning(str(e))
+                return None
+            finally:
+                progress_box.empty()
+            known[file_key] = document.id
+            return document
+
+        def extract_file_text(uploaded_file):
+            document = load_uploaded_document(uploaded_file)
+            return document.text if document else ""
+
+        def library_picker(key):
+            """Select box over the user's document library; returns the chosen document id or None."""
+            entries = list_library(db, get_current_user_id())
+            if not entries: return None
+            labels = {e.document_id: f"{e.filename} ({e.page_count} pages)" if e.page_count > 1 else e.filename for e in entries}
+            return st.selectbox("Or reuse a document from your library", [None] + list(labels),
+                                format_func=lambda i: "—" if i is None else labels[i], key=key)
+
+        def library_text(document_id):
+            document = open_from_library(db, get_current_user_id(), document_id)
+            return document.text if document else ""
+
+        def study_pack_checkbox(key):
+            return st.checkbox("📦 Study pack: prepare the summary, quiz and flashcards together", value=True, key=key,
+                               help="One AI request covers all three; the other two pages are then served instantly for the same text.")
+
+        def learn_checkbox(key):
+            if not Config.KNOWLEDGE_GRAPH_ENABLED:
+                return False
+            return st.checkbox("🕸️ Add its concepts to my knowledge graph", value=False, key=key,
+                               help="Uses one more AI request per text. Explore the result under 'What I Know' on the dashboard.")
+
+        def start_job(kind, params):
+            """Starts a background generation job for the current page and reruns so the page shows its progress."""
+            job_runner.submit(get_current_user_id(), kind, params, page=st.session_state.current_task)
+            st.rerun()
 
-    def get_and_store_topic(content, is_explicit_topic=False):
-        user_id = get_current_user_id()
-        if is_explicit_topic:
-            topic_title = content
-        else:
-            topic_prompt = f"Analyze the following text and provide a concise, 2-4 word topic title for it. Only return the title and nothing else.\n\nTEXT: \"\"\"{content[:1000]}\"\"\""
-            topic_title = client.ask_gemini(topic_prompt).strip()
+        def show_job(on_done):
+            """
+            Follows the user's latest generation job on the current page. While it runs, shows its progress, queue
+            position and a cancel button and polls again every JOB_POLL_SECONDS; once it has finished, calls
+            on_done(result) (or shows the error) exactly once.
+            """
+            job = job_runner.latest(get_current_user_id(), st.session_state.current_task)
+            if job is None: return
+            if job.active:
+                stage, done, total = job_runner.progress(job.id)
+                status = client.queue_status(get_current_user_id())
+                with st.container(border=True):
+                    if total:
+                        st.progress(min(done / total, 1.0), text=f"{stage}: {done}/{total}")
+                    else:
+                        st.progress(0.0, text="⏳ Waiting to start..." if job.status == QUEUED else "🤖 AI is working on it...")
+                    if status["queued"]:
+                        st.caption(f"⏳ {status['ahead']} request(s) ahead of you · about {status['eta_seconds']:.0f}s")
+                    st.caption("This keeps running if your connection drops; switching to another page cancels it.")
+                    if st.button("Cancel", key=f"cancel_job_{job.id}"):
+                        job_runner.cancel(job.id)
+                        st.rerun()
+                time.sleep(Config.JOB_POLL_SECONDS)
+                st.rerun()
+            job_runner.mark_delivered(job.id)
+            if job.status == DONE:
+                if job.result.get("from_pack"):
+                    st.toast("📦 Served from your study pack")
+                on_done(job.result)
+            elif job.status == FAILED:
+                st.error(f"❌ {job.error}")
+
+        def show_diagram(dot):
+            """Shows a DOT diagram laid out on the server (cached by its source), or in the browser when Graphviz is missing."""
+            try:
+                rendered = diagram_renderer.render(dot)
+            except GraphvizNotInstalledError:
+                st.graphviz_chart(validate_dot(dot))
+            except DiagramError as e:
+                st.caption(f"⚠️ The diagram could not be drawn: {e}")
+                with st.expander("Diagram source"):
+                    st.code(dot, language="dot")
+            else:
+                st.image(inline_svg(rendered.svg))
+
+        def show_ai_error(error):
+            """Shows a typed AIClient error and stops this script run."""
+            st.error(f"❌ {error}")
+            st.stop()
+
+        def wait_for_ai(future):
+            """
+            Waits for a short AIClient call on the script thread, showing the user's queue position and ETA while
+            it waits for a slot. Long generations run as background jobs instead (see start_job).
+            """
+            status_box = st.empty()
+            while not future.done():
+                status = client.queue_status(get_current_user_id())
+                with status_box.container():
+                    if status["queued"]:
+                        st.caption(f"⏳ {status['ahead']} request(s) ahead of you · about {status['eta_seconds']:.0f}s")
+                concurrent.futures.wait([future], timeout=0.5)
+            status_box.empty()
+            try:
+                return future.result()
+            except AIClientError as e:
+                show_ai_error(e)
+
+        def get_and_store_topic(content, is_explicit_topic=False):
+            user_id = get_current_user_id()
+            if is_explicit_topic:
+                topic_title = content
+            else:
+                topic_title = wait_for_ai(client.submit(client.agenerate_topic_title(content), user_id=user_id))
         
-        new_topic = StudyTopic(topic_name=topic_title, user_id=user_id)
-        db.add(new_topic)
-        db.commit()
-        return topic_title
-
-    def calculate_daily_streak(user_id):
-        """Calculates the user's daily study streak."""
-        today = datetime.date.today()
+            new_topic = StudyTopic(topic_name=topic_title, user_id=user_id)
+            db.add(new_topic)
+            db.commit()
+            return topic_title
+
+        def calculate_daily_streak(user_id):
+            """Calculates the user's daily study streak."""
+            today = datetime.date.today()
         
-        study_dates = db.query(func.date(StudyTopic.timestamp)).filter(
-            StudyTopic.user_id == user_id
-        ).distinct().order_by(func.date(StudyTopic.timestamp).desc()).all()
+            study_dates = db.query(func.date(StudyTopic.timestamp)).filter(
+                StudyTopic.user_id == user_id
+            ).distinct().order_by(func.date(StudyTopic.timestamp).desc()).all()
         
-        study_dates = [d[0] for d in study_dates]
+            study_dates = [d[0] for d in study_dates]
         
-        if not study_dates:
-            return 0
+            if not study_dates:
+                return 0
 
-        if study_dates[0] not in [today, today - datetime.timedelta(days=1)]:
-            return 0
+            if study_dates[0] not in [today, today - datetime.timedelta(days=1)]:
+                return 0
 
-        streak = 0
-        expected_date = today
+            streak = 0
+            expected_date = today
         
-        if study_dates[0] == today - datetime.timedelta(days=1):
-            expected_date = today - datetime.timedelta(days=1)
+            if study_dates[0] == today - datetime.timedelta(days=1):
+                expected_date = today - datetime.timedelta(days=1)
 
-        for study_date in study_dates:
-            if study_date == expected_date:
-                streak += 1
-                expected_date -= datetime.timedelta(days=1)
-            else:
-                break
+            for study_date in study_dates:
+                if study_date == expected_date:
+                    streak += 1
+                    expected_date -= datetime.timedelta(days=1)
+                else:
+                    break
                 
-        return streak
-
-    # --- 6. HEADER AND SIDEBAR NAVIGATION ---
-    with st.sidebar:
-        st.title(f"🧠 Brainstorm Buddy")
-        st.markdown("---")
-        st.success(f"Welcome, **{st.session_state.user.username}**!")
-        if st.button("Logout"):
-            del st.session_state.user
-            st.rerun()
-        st.markdown("---")
-        st.subheader("AI Toolkit")
+            return streak
+
+        # --- 6. HEADER AND SIDEBAR NAVIGATION ---
+        with st.sidebar:
+            st.title(f"🧠 Brainstorm Buddy")
+            st.markdown("---")
+            st.success(f"Welcome, **{st.session_state.user.username}**!")
+            if st.button("Logout"):
+                del st.session_state.user
+                st.rerun()
+            st.markdown("---")
+            st.subheader("AI Toolkit")
 
-        if st.session_state.get("navigate_to"):
-            st.session_state.current_task = st.session_state.pop("navigate_to")
-        if 'current_task' not in st.session_state:
-            st.session_state.current_task = "📊 Learning Dashboard"
+            if st.session_state.get("navigate_to"):
+                st.session_state.current_task = st.session_state.pop("navigate_to")
+            if 'current_task' not in st.session_state:
+                st.session_state.current_task = "📊 Learning Dashboard"
         
-        def set_current_task(task_name):
-            """Callback function to update the current task and clear old state."""
-            if st.session_state.current_task != task_name:
-                st.session_state.current_task = task_name
-                keys_to_clear = ['quiz_data', 'final_score_info', 'flashcards_data', 'review_queue', 'show_answer', 'explain_topic_input', 'quiz_topic_input', 'current_question_index', 'score', 'user_answers', 'answer_submitted', 'current_flashcard_index', 'chat_file_context']
-                for key in keys_to_clear:
-                    st.session_state.pop(key, None)
-
-        for task_name in TASK_OPTIONS:
-            if task_name == "---":
-                st.markdown("---")
-                continue
+            def set_current_task(task_name):
+                """Callback function to update the current task and clear old state."""
+                if st.session_state.current_task != task_name:
+                    st.session_state.current_task = task_name
+                    job_runner.cancel_superseded(get_current_user_id(), task_name)
+                    keys_to_clear = ['quiz_data', 'final_score_info', 'flashcards_data', 'review_queue', 'show_answer', 'explain_topic_input', 'quiz_topic_input', 'current_question_index', 'score', 'user_answers', 'answer_submitted', 'current_flashcard_index', 'chat_index', 'chat_doc_key', 'summary_result']
+                    for key in keys_to_clear:
+                        st.session_state.pop(key, None)
+
+            for task_name in TASK_OPTIONS:
+                if task_name == "---":
+                    st.markdown("---")
+                    continue
             
-            st.button(
-                label=task_name,
-                key=f"nav_{task_name}",
-                on_click=set_current_task,
-                args=(task_name,),
-                use_container_width=True,
-                type="primary" if st.session_state.current_task == task_name else "secondary"
-            )
+                st.button(
+                    label=task_name,
+                    key=f"nav_{task_name}",
+                    on_click=set_current_task,
+                    args=(task_name,),
+                    use_container_width=True,
+                    type="primary" if st.session_state.current_task == task_name else "secondary"
+                )
         
-        st.markdown("---")
-        st.subheader("Contribute")
-        st.markdown("Love this project? We're open source! Feel free to contribute on [GitHub](https://github.com/Aditya-afk-hue/).", unsafe_allow_html=True)
+            st.markdown("---")
+            st.subheader("Contribute")
+            st.markdown("Love this project? We're open source! Feel free to contribute on [GitHub](https://github.com/Aditya-afk-hue/).", unsafe_allow_html=True)
 
 
-    user_id = get_current_user_id()
+        user_id = get_current_user_id()
 
-    # ============================
-    # --- 7. TASK IMPLEMENTATIONS ---
-    # ============================
+        # ============================
+        # --- 7. TASK IMPLEMENTATIONS ---
+        # ============================
 
-    st.header(st.session_state.current_task)
+        st.header(st.session_state.current_task)
 
-    if st.session_state.current_task == "📊 Learning Dashboard":
-        tasks_completed = db.query(StudyTopic).filter(StudyTopic.user_id == user_id).count()
-        quizzes_passed = db.query(QuizResult).filter(QuizResult.user_id == user_id, QuizResult.is_passed == 1).count()
+        if st.session_state.current_task == "📊 Learning Dashboard":
+            tasks_completed = db.query(StudyTopic).filter(StudyTopic.user_id == user_id).count()
+            quizzes_passed = db.query(QuizResult).filter(QuizResult.user_id == user_id, QuizResult.is_passed == 1).count()
         
-        col1, col2, col3 = st.columns(3)
-        col1.metric("Topics Studied", tasks_completed)
-        col2.metric("Quizzes Passed", quizzes_passed)
-        streak = calculate_daily_streak(user_id)
-        col3.metric("Daily Streak", f"🔥 {streak} Day{'s' if streak != 1 else ''}")
-        st.markdown("---")
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Topics Studied", tasks_completed)
+            col2.metric("Quizzes Passed", quizzes_passed)
+            streak = calculate_daily_streak(user_id)
+            col3.metric("Daily Streak", f"🔥 {streak} Day{'s' if streak != 1 else ''}")
+            st.markdown("---")
         
-        st.subheader("🏆 Skills Mastery")
-        mastery_data = db.query(QuizResult.topic_name, func.avg(QuizResult.score * 100.0 / QuizResult.total_questions).label('avg_score')).filter(QuizResult.user_id == user_id).group_by(QuizResult.topic_name).all()
-        if not mastery_data:
-            st.info("Complete quizzes on different topics to see your mastery levels here!")
-        else:
-            for topic, avg_score in mastery_data:
-                avg_score = round(avg_score)
-                level = "🟢 Mastered" if avg_score >= 80 else "🟡 Intermediate" if avg_score >= 50 else "🔴 Beginner"
-                st.write(f"**{topic}**")
-                st.progress(int(avg_score), text=f"{level} ({avg_score}%)")
-        st.markdown("---")
+            st.subheader("🏆 Skills Mastery")
+            mastery_data = db.query(QuizResult.topic_name, func.avg(QuizResult.score * 100.0 / QuizResult.total_questions).label('avg_score')).filter(QuizResult.user_id == user_id).group_by(QuizResult.topic_name).all()
+            if not mastery_data:
+                st.info("Complete quizzes on different topics to see your mastery levels here!")
+            else:
+                for topic, avg_score in mastery_data:
+                    avg_score = round(avg_score)
+                    level = "🟢 Mastered" if avg_score >= 80 else "🟡 Intermediate" if avg_score >= 50 else "🔴 Beginner"
+                    st.write(f"**{topic}**")
+                    st.progress(int(avg_score), text=f"{level} ({avg_score}%)")
+            st.markdown("---")
         
-        st.subheader("🎯 Recommended Focus Areas")
-        weak_topics = [t[0] for t in db.query(QuizResult.topic_name).filter(QuizResult.user_id == user_id, QuizResult.is_passed == 0).distinct().all()]
-        if not weak_topics:
-            st.info("Your focus areas will appear here after you score below 80% on a quiz!")
-        else:
-            st.write("Based on your quiz performance, you should review these topics:")
-            for topic in weak_topics:
-                with st.container(border=True):
-                    st.warning(f"Review Recommended: **{topic}**")
-                    t_col1, t_col2 = st.columns(2)
-                    if t_col1.button(f"Explain '{topic}'", key=f"explain_{topic}", use_container_width=True):
-                        st.session_state.navigate_to = "✨ Explain a Topic"
-                        st.session_state.prefill_topic = topic
-                        st.rerun()
-                    if t_col2.button(f"Quiz me on '{topic}'", key=f"quiz_{topic}", use_container_width=True):
-                        st.session_state.navigate_to = "🧩 Interactive Quiz"
-                        st.session_state.prefill_topic = topic
-                        st.rerun()
-
-    elif st.session_state.current_task == "📚 My Collections":
-        tab1, tab2, tab3 = st.tabs(["Due for Review", "My Flashcard Decks", "My Saved Quizzes"])
-
-        with tab1:
-            due_cards = db.query(Flashcard).join(FlashcardDeck).filter(FlashcardDeck.user_id == user_id, Flashcard.next_review_date <= datetime.date.today()).all()
-            if 'review_queue' not in st.session_state:
-                st.session_state.review_queue = due_cards
-            
-            if not st.session_state.review_queue:
-                st.success("🎉 All done! You have no cards to review today.")
+            st.subheader("🎯 Recommended Focus Areas")
+            weak_topics = [t[0] for t in db.query(QuizResult.topic_name).filter(QuizResult.user_id == user_id, QuizResult.is_passed == 0).distinct().all()]
+            if not weak_topics:
+                st.info("Your focus areas will appear here after you score below 80% on a quiz!")
             else:
-                st.info(f"You have **{len(st.session_state.review_queue)}** cards to review.")
-                current_card = st.session_state.review_queue[0]
-                with st.container(border=True):
-                    st.markdown(f"<div style='font-size: 24px; text-align: center; min-height: 100px; display: flex; align-items: center; justify-content: center;'>{current_card.front}</div>", unsafe_allow_html=True)
-                    if st.button("Show Answer", use_container_width=True, key="show_answer_btn"):
-                        st.session_state.show_answer = True
-                    if st.session_state.get('show_answer'):
-                        st.markdown("---")
-                        st.markdown(f"<div style='font-size: 20px; text-align: center; color: #818CF8;'>{current_card.back}</div>", unsafe_allow_html=True)
-                        st.markdown("<br>", unsafe_allow_html=True)
-                        st.write("How well did you remember?")
-                        r_col1, r_col2, r_col3 = st.columns(3)
-                        def handle_review(quality_score):
-                            update_card(current_card, quality_score)
-                            db.commit()
-                            st.session_state.review_queue.pop(0)
-                            st.session_state.show_answer = False
+                st.write("Based on your quiz performance, you should review these topics:")
+                for topic in weak_topics:
+                    with st.container(border=True):
+                        st.warning(f"Review Recommended: **{topic}**")
+                        t_col1, t_col2 = st.columns(2)
+                        if t_col1.button(f"Explain '{topic}'", key=f"explain_{topic}", use_container_width=True):
+                            st.session_state.navigate_to = "✨ Explain a Topic"
+                            st.session_state.prefill_topic = topic
+                            st.rerun()
+                        if t_col2.button(f"Quiz me on '{topic}'", key=f"quiz_{topic}", use_container_width=True):
+                            st.session_state.navigate_to = "🧩 Interactive Quiz"
+                            st.session_state.prefill_topic = topic
                             st.rerun()
-                        if r_col1.button("🟥 Hard", use_container_width=True): handle_review(0)
-                        if r_col2.button("🟨 Good", use_container_width=True): handle_review(3)
-                        if r_col3.button("🟩 Easy", use_container_width=True): handle_review(5)
-
-        with tab2:
-            st.subheader("My Flashcard Decks")
-            my_decks = db.query(FlashcardDeck).filter(FlashcardDeck.user_id == user_id).all()
-            if not my_decks:
-                st.info("You haven't saved any decks. Go to 'Kinetic Flashcards' to create and save a new one!")
-            for deck in my_decks:
-                with st.container(border=True):
-                    c1, c2, c3 = st.columns([0.6, 0.2, 0.2])
-                    c1.write(f"**{deck.topic_name}** ({len(deck.cards)} cards)")
-                    if c2.button("Study Deck", key=f"study_deck_{deck.id}", use_container_width=True):
-                        st.warning("Full deck study mode coming soon! For now, cards due for review will appear in the 'Due for Review' tab.")
-                    if c3.button("Delete", key=f"del_deck_{deck.id}", use_container_width=True):
-                        db.delete(deck)
-                        db.commit()
-                        st.rerun()
-
-        with tab3:
-            st.subheader("My Saved Quizzes")
-            my_quizzes = db.query(QuizCollection).filter(QuizCollection.user_id == user_id).all()
-            if not my_quizzes:
-                st.info("You haven't saved any quizzes yet. After taking a quiz, you'll get an option to save it!")
-            for quiz in my_quizzes:
-                with st.container(border=True):
-                    c1, c2, c3 = st.columns([0.6, 0.2, 0.2])
-                    c1.write(f"**{quiz.topic_name}** ({len(quiz.questions)} questions)")
-                    
-                    if c2.button("Take Quiz", key=f"take_{quiz.id}", use_container_width=True):
-                        quiz_data = []
-                        for q in quiz.questions:
-                            quiz_data.append({
-                                "question": q.question_text,
-                                "options": json.loads(q.options),
-                                "answer": q.correct_answer
-                            })
-                        st.session_state.quiz_data = quiz_data
-                        st.session_state.current_quiz_topic = quiz.topic_name
-                        st.session_state.current_question_index = 0
-                        st.session_state.score = 0
-                        st.session_state.user_answers = [None] * len(quiz_data)
-                        st.session_state.answer_submitted = False
-                        st.session_state.navigate_to = "🧩 Interactive Quiz"
-                        st.rerun()
-
-                    if c3.button("Delete", key=f"del_{quiz.id}", use_container_width=True):
-                        db.delete(quiz)
-                        db.commit()
-                        st.rerun()
 
-    elif st.session_state.current_task == "💬 AI Tutor Chat":
-        uploaded_file = st.file_uploader("Upload a document for context (any type)", type=None, key="chat_uploader")
-        if uploaded_file:
-            with st.spinner("Reading file..."):
-                file_context = extract_file_text(uploaded_file)
-                st.session_state.chat_file_context = file_context
-                st.info("File uploaded as context. Ask a question about it below.")
-
-        if "messages" not in st.session_state: st.session_state.messages = []
-        for message in st.session_state.messages:
-            with st.chat_message(message["role"]): st.markdown(message["content"])
-
-        if prompt := st.chat_input("Ask your question..."):
-            st.session_state.messages.append({"role": "user", "content": prompt})
-            with st.chat_message("user"): st.markdown(prompt)
+                st.write("**🧭 Suggested review order**")
+                if prerequisite_graph.unexpanded(db, weak_topics):
+                    st.caption("Find the foundations behind your focus areas to get a full review path.")
+                    if st.button("🔎 Find prerequisites", key="expand_prerequisites"):
+                        failed = []
+
+                        def fetch(names):
+                            found = wait_for_ai(client.submit(fetch_prerequisites(client, names), user_id=user_id))
+                            if found is None:
+                                failed.extend(names)
+                            return found
+
+                        prerequisite_graph.expand(db, weak_topics, fetch=fetch)
+                        if failed:
+                            # wait_for_ai has shown the error; keep it on screen instead of rerunning.
+                            st.caption(f"Skipped for now: {', '.join(failed)}. Try again in a moment.")
+                        else:
+                            st.rerun()
+                for step, (topic, is_weak) in enumerate(prerequisite_graph.review_order(db, weak_topics), start=1):
+                    st.write(f"{step}. {'**' + topic + '** (focus area)' if is_weak else topic}")
+            st.markdown("---")
+
+            st.subheader("🕸️ What I Know")
+            knowledge = graph_cache.get(db, user_id)
+            if not len(knowledge):
+                st.info("Tick 'Add its concepts to my knowledge graph' when you summarize or study notes, and their concepts will be connected here!")
+            else:
+                concepts = knowledge.concepts()
+                k_col1, k_col2 = st.columns([3, 1])
+                focus = k_col1.selectbox("Concept", concepts, key="knowledge_focus")
+                hops = k_col2.slider("Depth", 1, 3, 2, key="knowledge_hops")
+                nodes, edges = knowledge.subgraph(focus, hops=hops)
+                show_diagram(to_dot(nodes, edges, focus=focus))
+                with st.expander("How are two concepts connected?"):
+                    other = st.selectbox("Connect it to", [c for c in concepts if c != focus], key="knowledge_other")
+                    path = knowledge.shortest_path(focus, other) if other else None
+                    if path:
+                        st.markdown("\n".join(f"- **{source}** {relation or '→'} **{target}**" for source, relation, target in path))
+                    elif other:
+                        st.caption(f"No link between {focus} and {other} yet.")
+
+        elif st.session_state.current_task == "📚 My Collections":
+            tab1, tab2, tab3 = st.tabs(["Due for Review", "My Flashcard Decks", "My Saved Quizzes"])
+
+            with tab1:
+                due_cards = db.query(Flashcard).join(FlashcardDeck).filter(FlashcardDeck.user_id == user_id, Flashcard.next_review_date <= datetime.date.today()).all()
+                if 'review_queue' not in st.session_state:
+                    # Card ids, not Flashcard objects: each rerun loads the current card in its own session
+                    st.session_state.review_queue = [card.id for card in due_cards]
             
-            with st.chat_message("assistant"):
-                full_prompt = prompt
-                if st.session_state.get("chat_file_context"):
-                    context = st.session_state.chat_file_context
-                    full_prompt = f"Using the following document as context:\n---\n{context}\n---\n\nAnswer the student's question: {prompt}"
-                
-                response = client.ask_gemini(f"As an AI Tutor, answer the student's question: {full_prompt}")
-                st.markdown(response)
-            st.session_state.messages.append({"role": "assistant", "content": response})
-
-
-    elif st.session_state.current_task == "✨ Explain a Topic":
-        if "prefill_topic" in st.session_state:
-            st.session_state.explain_topic_input = st.session_state.pop("prefill_topic")
+                if not st.session_state.review_queue:
+                    st.success("🎉 All done! You have no cards to review today.")
+                else:
+                    st.info(f"You have **{len(st.session_state.review_queue)}** cards to review.")
+                    current_card = db.get(Flashcard, st.session_state.review_queue[0])
+                    if current_card is None:
+                        # The card's deck was deleted since the queue was built
+                        st.session_state.review_queue.pop(0)
+                        st.rerun()
+                    with st.container(border=True):
+                        st.markdown(f"<div style='font-size: 24px; text-align: center; min-height: 100px; display: flex; align-items: center; justify-content: center;'>{current_card.front}</div>", unsafe_allow_html=True)
+                        if st.button("Show Answer", use_container_width=True, key="show_answer_btn"):
+                            st.session_state.show_answer = True
+                        if st.session_state.get('show_answer'):
+                            st.markdown("---")
+                            st.markdown(f"<div style='font-size: 20px; text-align: center; color: #818CF8;'>{current_card.back}</div>", unsafe_allow_html=True)
+                            st.markdown("<br>", unsafe_allow_html=True)
+                            st.write("How well did you remember?")
+                            r_col1, r_col2, r_col3 = st.columns(3)
+                            def handle_review(quality_score):
+                                update_card(current_card, quality_score)
+                                db.commit()
+                                st.session_state.review_queue.pop(0)
+                                st.session_state.show_answer = False
+                                st.rerun()
+                            if r_col1.button("🟥 Hard", use_container_width=True): handle_review(0)
+                            if r_col2.button("🟨 Good", use_container_width=True): handle_review(3)
+                            if r_col3.button("🟩 Easy", use_container_width=True): handle_review(5)
+
+            with tab2:
+                st.subheader("My Flashcard Decks")
+                my_decks = list_user_decks(db, user_id)
+                if not my_decks:
+                    st.info("You haven't saved any decks. Go to 'Kinetic Flashcards' to create and save a new one!")
+                for deck in my_decks:
+                    with st.container(border=True):
+                        c1, c2, c3 = st.columns([0.6, 0.2, 0.2])
+                        c1.write(f"**{deck.topic_name}** ({deck.card_count} cards)")
+                        if c2.button("Study Deck", key=f"study_deck_{deck.id}", use_container_width=True):
+                            st.warning("Full deck study mode coming soon! For now, cards due for review will appear in the 'Due for Review' tab.")
+                        if c3.button("Delete", key=f"del_deck_{deck.id}", use_container_width=True):
+                            delete_deck(db, deck.id, user_id)
+                            st.rerun()
 
-        with st.form("explain_form"):
-            st.subheader("Explain a Topic or Document")
-            topic_from_text = st.text_area("Enter a topic, paste content, or ask a question to explain:", key="explain_topic_input")
-            uploaded_file = st.file_uploader("Or upload a document to explain its contents", type=None)
+            with tab3:
+                st.subheader("My Saved Quizzes")
+                my_quizzes = list_user_quizzes(db, user_id)
+                if not my_quizzes:
+                    st.info("You haven't saved any quizzes yet. After taking a quiz, you'll get an option to save it!")
+                for quiz in my_quizzes:
+                    with st.container(border=True):
+                        c1, c2, c3 = st.columns([0.6, 0.2, 0.2])
+                        c1.write(f"**{quiz.topic_name}** ({quiz.question_count} questions)")
+                    
+                        if c2.button("Take Quiz", key=f"take_{quiz.id}", use_container_width=True):
+                            quiz_data = quiz_items(db, quiz.id)
+                            st.session_state.quiz_data = quiz_data
+                            st.session_state.current_quiz_topic = quiz.topic_name
+                            st.session_state.current_question_index = 0
+                            st.session_state.score = 0
+                            st.session_state.user_answers = [None] * len(quiz_data)
+                            st.session_state.answer_submitted = False
+                            st.session_state.navigate_to = "🧩 Interactive Quiz"
+                            st.rerun()
 
-            submitted = st.form_submit_button("Explain", type="primary", use_container_width=True)
-            if submitted:
-                final_content = ""
-                if uploaded_file is not None:
-                    final_content = extract_file_text(uploaded_file)
-                else:
-                    final_content = topic_from_text
+                        if c3.button("Delete", key=f"del_{quiz.id}", use_container_width=True):
+                            delete_quiz(db, quiz.id, user_id)
+                            st.rerun()
 
-                is_valid, msg = validate_text_input(final_content, "Content")
-                if not is_valid: 
-                    st.error(msg)
-                else:
-                    with st.spinner("🤖 AI is preparing an explanation..."):
-                        explanation = client.explain_topic(final_content)
-                        get_and_store_topic(final_content)
-                    st.markdown(explanation)
-
-
-    elif st.session_state.current_task == "📝 Summarize Notes":
-        with st.form("summary_form"):
-            st.subheader("Summarize Your Notes")
-            notes_from_text = st.text_area("Paste notes here:", height=250)
-            uploaded_file = st.file_uploader("Or upload a document to summarize", type=None)
-
-            submitted = st.form_submit_button("Summarize", type="primary", use_container_width=True)
-            if submitted:
-                final_notes = ""
-                if uploaded_file is not None:
-                    final_notes = extract_file_text(uploaded_file)
-                else:
-                    final_notes = notes_from_text
+        elif st.session_state.current_task == "💬 AI Tutor Chat":
+            uploaded_file = st.file_uploader("Upload a document for context (any type)", type=None, key="chat_uploader")
+            picked_document_id = library_picker("chat_library_pick")
+            if uploaded_file:
+                with st.spinner("Reading file..."):
+                    chat_document = load_uploaded_document(uploaded_file)
+            else:
+                chat_document = open_from_library(db, user_id, picked_document_id) if picked_document_id else None
+            if chat_document:
+                # Index each document once; reruns for later questions reuse it.
+                if st.session_state.get("chat_doc_key") != chat_document.content_hash:
+                    with st.spinner("Indexing document..."):
+                        pages, has_page_numbers = document_pages(chat_document)
+                        st.session_state.chat_index = DocumentIndex(pages, has_page_numbers=has_page_numbers)
+                        st.session_state.chat_doc_key = chat_document.content_hash
+                st.info(f"Document indexed as context ({len(st.session_state.chat_index)} passages). Ask a question about it below.")
+            else:
+                st.session_state.pop("chat_index", None)
+                st.session_state.pop("chat_doc_key", None)
 
-                is_valid, msg = validate_text_input(final_notes, "Notes")
-                if not is_valid: 
-                    st.error(msg)
-                else:
-                    with st.spinner("🤖 AI is distilling the key points..."):
-                        summary = client.summarize_notes(final_notes)
-                        get_and_store_topic(final_notes)
-                    st.markdown(summary)
+            if "messages" not in st.session_state: st.session_state.messages = []
+            for message in st.session_state.messages:
+                with st.chat_message(message["role"]): st.markdown(message["content"])
 
-    elif st.session_state.current_task == "🧩 Interactive Quiz":
-        if 'quiz_data' not in st.session_state:
-            if "prefill_topic" in st.session_state:
-                st.session_state.quiz_topic_input = st.session_state.pop("prefill_topic")
+            if prompt := st.chat_input("Ask your question..."):
+                st.session_state.messages.append({"role": "user", "content": prompt})
+                with st.chat_message("user"): st.markdown(prompt)
             
-            with st.form("quiz_generation_form"):
-                st.subheader("Generate a New Quiz")
-                quiz_text_from_area = st.text_area("Paste text or enter a topic to be quizzed on.", height=250, key="quiz_topic_input")
-                uploaded_file = st.file_uploader("Or upload a document to generate a quiz from", type=None)
+                with st.chat_message("assistant"):
+                    full_prompt = prompt
+                    passages = []
+                    if st.session_state.get("chat_index"):
+                        # Only the most relevant passages are sent, so the prompt stays the same size for any document.
+                        passages = st.session_state.chat_index.context_for(prompt)
+                        context = format_context(passages)
+                        full_prompt = (f"Using the following excerpts from the student's document as context:\n---\n{context}\n---\n\n"
+                                       f"Cite the excerpts you rely on with their labels, e.g. [p. 3]. Answer the student's question: {prompt}")
                 
-                num_q = st.slider("Number of Questions:", 3, 10, 5)
-                submitted = st.form_submit_button("Generate Quiz", type="primary", use_container_width=True)
+                    try:
+                        response = st.write_stream(client.stream(f"As an AI Tutor, answer the student's question: {full_prompt}", method="chat", user_id=user_id))
+                    except AIClientError as e:
+                        show_ai_error(e)
+                    if passages:
+                        sources = "📄 Sources: " + ", ".join(dict.fromkeys(passage.citation for passage in passages))
+                        st.caption(sources)
+                        response = f"{response}\n\n{sources}"
+                st.session_state.messages.append({"role": "assistant", "content": response})
+
+
+        elif st.session_state.current_task == "✨ Explain a Topic":
+            if "prefill_topic" in st.session_state:
+                st.session_state.explain_topic_input = st.session_state.pop("prefill_topic")
+
+            with st.form("explain_form"):
+                st.subheader("Explain a Topic or Document")
+                topic_from_text = st.text_area("Enter a topic, paste content, or ask a question to explain:", key="explain_topic_input")
+                uploaded_file = st.file_uploader("Or upload a document to explain its contents", type=None)
+                picked_document_id = library_picker("explain_library_pick")
+                with_diagram = st.checkbox("🗺️ Include a diagram", key="explain_with_diagram")
+
+                submitted = st.form_submit_button("Explain", type="primary", use_container_width=True)
                 if submitted:
-                    final_quiz_text = ""
+                    final_content = ""
                     if uploaded_file is not None:
-                        final_quiz_text = extract_file_text(uploaded_file)
+                        final_content = extract_file_text(uploaded_file)
+                    elif picked_document_id:
+                        final_content = library_text(picked_document_id)
                     else:
-                        final_quiz_text = quiz_text_from_area
-                    
-                    is_valid, msg = validate_text_input(final_quiz_text, "Quiz Text")
-                    if not is_valid:
+                        final_content = topic_from_text
+
+                    is_valid, msg = validate_text_input(final_content, "Content")
+                    curated = curated_packs.match(final_content) if is_valid else None
+                    if not is_valid: 
                         st.error(msg)
+                    elif curated and curated.explanation:
+                        st.markdown(curated.explanation)
+                        st.caption(f"📦 From the curated {curated.module} pack")
+                        get_and_store_topic(curated.module, is_explicit_topic=True)
+                    elif with_diagram:
+                        (explanation, dot_code), topic = wait_for_ai(client.submit_many(
+                            client.agenerate_graphviz_diagram(final_content), client.agenerate_topic_title(final_content), user_id=user_id))
+                        st.markdown(explanation)
+                        if dot_code:
+                            show_diagram(dot_code)
+                        get_and_store_topic(topic, is_explicit_topic=True)
                     else:
-                        with st.spinner("🤖 AI is crafting your quiz..."):
-                            quiz_json_str = client.generate_quiz(final_quiz_text, num_q)
-                            st.session_state.current_quiz_topic = get_and_store_topic(final_quiz_text)
+                        topic_future = client.submit(client.agenerate_topic_title(final_content), user_id=user_id)
                         try:
-                            st.session_state.quiz_to_save = json.loads(extract_json_from_string(quiz_json_str))
-                            st.session_state.quiz_data = st.session_state.quiz_to_save
-                            st.session_state.current_question_index = 0
-                            st.session_state.score = 0
-                            st.session_state.user_answers = [None] * len(st.session_state.quiz_data)
-                            st.session_state.answer_submitted = False
+                            st.write_stream(client.stream_explain_topic(final_content, user_id=user_id))
+                        except AIClientError as e:
+                            show_ai_error(e)
+                        get_and_store_topic(wait_for_ai(topic_future), is_explicit_topic=True)
+
+
+        elif st.session_state.current_task == "📝 Summarize Notes":
+            show_job(lambda result: st.session_state.update(summary_result=result))
+            with st.form("summary_form"):
+                st.subheader("Summarize Your Notes")
+                notes_from_text = st.text_area("Paste notes here:", height=250)
+                uploaded_file = st.file_uploader("Or upload a document to summarize", type=None)
+                picked_document_id = library_picker("notes_library_pick")
+                use_study_pack = study_pack_checkbox("notes_study_pack")
+                learn_concepts = learn_checkbox("notes_learn")
+
+                submitted = st.form_submit_button("Summarize", type="primary", use_container_width=True)
+                if submitted:
+                    final_notes = ""
+                    if uploaded_file is not None:
+                        final_notes = extract_file_text(uploaded_file)
+                    elif picked_document_id:
+                        final_notes = library_text(picked_document_id)
+                    else:
+                        final_notes = notes_from_text
+
+                    is_valid, msg = validate_text_input(final_notes, "Notes", max_length=Config.MAX_DOCUMENT_LENGTH)
+                    if not is_valid: 
+                        st.error(msg)
+                    else:
+                        start_job("summary", {"text": final_notes, "use_study_pack": use_study_pack, "learn_concepts": learn_concepts})
+            if "summary_result" in st.session_state:
+                st.markdown(st.session_state.summary_result["summary"])
+
+        elif st.session_state.current_task == "🧩 Interactive Quiz":
+            def start_quiz(result):
+                if not result["items"]:
+                    st.error("No usable questions came back for this text. Please try again.")
+                    return
+                st.session_state.current_quiz_topic = result["title"]
+                st.session_state.quiz_to_save = result["items"]
+                st.session_state.quiz_data = st.session_state.quiz_to_save
+                st.session_state.current_question_index = 0
+                st.session_state.score = 0
+                st.session_state.user_answers = [None] * len(st.session_state.quiz_data)
+                st.session_state.answer_submitted = False
+            show_job(start_quiz)
+
+            if not st.session_state.get('quiz_data'):
+                if "prefill_topic" in st.session_state:
+                    st.session_state.quiz_topic_input = st.session_state.pop("prefill_topic")
+            
+                with st.form("quiz_generation_form"):
+                    st.subheader("Generate a New Quiz")
+                    quiz_text_from_area = st.text_area("Paste text or enter a topic to be quizzed on.", height=250, key="quiz_topic_input")
+                    uploaded_file = st.file_uploader("Or upload a document to generate a quiz from", type=None)
+                    picked_document_id = library_picker("quiz_text_library_pick")
+                
+                    num_q = st.slider("Number of Questions:", 3, 10, 5)
+                    use_study_pack = study_pack_checkbox("quiz_study_pack")
+                    learn_concepts = learn_checkbox("quiz_learn")
+                    submitted = st.form_submit_button("Generate Quiz", type="primary", use_container_width=True)
+                    if submitted:
+                        final_quiz_text = ""
+                        if uploaded_file is not None:
+                            final_quiz_text = extract_file_text(uploaded_file)
+                        elif picked_document_id:
+                            final_quiz_text = library_text(picked_document_id)
+                        else:
+                            final_quiz_text = quiz_text_from_area
+                    
+                        is_valid, msg = validate_text_input(final_quiz_text, "Quiz Text", max_length=Config.MAX_DOCUMENT_LENGTH)
+                        if not is_valid:
+                            st.error(msg)
+                        elif (curated := curated_packs.match(final_quiz_text)) and curated.quiz:
+                            start_quiz({"title": get_and_store_topic(curated.module, is_explicit_topic=True), "items": curated.quiz_items(num_q)})
                             st.rerun()
-                        except (json.JSONDecodeError, TypeError):
-                            st.error("AI returned an invalid format. Please try again.")
-                            st.code(quiz_json_str)
+                        else:
+                            start_job("quiz", {"text": final_quiz_text, "num_questions": num_q, "use_study_pack": use_study_pack,
+                                               "learn_concepts": learn_concepts})
         
-        elif 'final_score_info' not in st.session_state:
-            st.subheader(f"Quiz on: {st.session_state.get('current_quiz_topic', 'General Knowledge')}")
+            elif 'final_score_info' not in st.session_state:
+                st.subheader(f"Quiz on: {st.session_state.get('current_quiz_topic', 'General Knowledge')}")
             
-            progress = st.session_state.current_question_index / len(st.session_state.quiz_data)
-            st.progress(progress, text=f"Question {st.session_state.current_question_index + 1}/{len(st.session_state.quiz_data)}")
+                progress = st.session_state.current_question_index / len(st.session_state.quiz_data)
+                st.progress(progress, text=f"Question {st.session_state.current_question_index + 1}/{len(st.session_state.quiz_data)}")
 
-            q = st.session_state.quiz_data[st.session_state.current_question_index]
+                q = st.session_state.quiz_data[st.session_state.current_question_index]
 
-            with st.container(border=True):
-                st.subheader(f"Question {st.session_state.current_question_index + 1}")
-                st.markdown(f"**{q['question']}**")
+                with st.container(border=True):
+                    st.subheader(f"Question {st.session_state.current_question_index + 1}")
+                    st.markdown(f"**{q['question']}**")
 
-                for i, option in enumerate(q["options"]):
-                    is_correct = (option == q["answer"])
-                    is_selected = (st.session_state.user_answers[st.session_state.current_question_index] == option)
+                    for i, option in enumerate(q["options"]):
+                        is_correct = (option == q["answer"])
+                        is_selected = (st.session_state.user_answers[st.session_state.current_question_index] == option)
                     
-                    button_type = "secondary"
-                    if st.session_state.answer_submitted:
-                        if is_correct: button_type = "primary"
-                        elif is_selected: button_type = "secondary"
+                        button_type = "secondary"
+                        if st.session_state.answer_submitted:
+                            if is_correct: button_type = "primary"
+                            elif is_selected: button_type = "secondary"
                     
-                    if st.button(option, key=f"q_{st.session_state.current_question_index}_{i}", use_container_width=True, type=button_type, disabled=st.session_state.answer_submitted):
-                        st.session_state.user_answers[st.session_state.current_question_index] = option
-                        st.session_state.answer_submitted = True
-                        if is_correct:
-                            st.session_state.score += 1
-                        st.rerun()
+                        if st.button(option, key=f"q_{st.session_state.current_question_index}_{i}", use_container_width=True, type=button_type, disabled=st.session_state.answer_submitted):
+                            st.session_state.user_answers[st.session_state.current_question_index] = option
+                            st.session_state.answer_submitted = True
+                            if is_correct:
+                                st.session_state.score += 1
+                            st.rerun()
 
-            if st.session_state.answer_submitted:
-                user_answer = st.session_state.user_answers[st.session_state.current_question_index]
-                if user_answer == q["answer"]:
-                    st.success("Correct!")
-                else:
-                    st.error(f"Incorrect. The correct answer was: {q['answer']}")
+                if st.session_state.answer_submitted:
+                    user_answer = st.session_state.user_answers[st.session_state.current_question_index]
+                    if user_answer == q["answer"]:
+                        st.success("Correct!")
+                    else:
+                        st.error(f"Incorrect. The correct answer was: {q['answer']}")
                 
-                if st.session_state.current_question_index < len(st.session_state.quiz_data) - 1:
-                    if st.button("Next Question →", use_container_width=True, type="primary"):
-                        st.session_state.current_question_index += 1
-                        st.session_state.answer_submitted = False
-                        st.rerun()
-                else:
-                    if st.button("Finish Quiz", use_container_width=True, type="primary"):
-                        total = len(st.session_state.quiz_data)
-                        score = st.session_state.score
-                        percent = int(100 * score / total) if total > 0 else 0
-                        db.add(QuizResult(topic_name=st.session_state.current_quiz_topic, score=score, total_questions=total, is_passed=(1 if percent >= 80 else 0), user_id=user_id))
-                        db.commit()
-                        st.session_state.final_score_info = {"score": score, "total": total, "percent": percent}
-                        st.rerun()
-
-        else:
-            info = st.session_state.final_score_info
-            st.balloons()
-            st.success("🎉 Quiz Complete!")
+                    if st.session_state.current_question_index < len(st.session_state.quiz_data) - 1:
+                        if st.button("Next Question →", use_container_width=True, type="primary"):
+                            st.session_state.current_question_index += 1
+                            st.session_state.answer_submitted = False
+                            st.rerun()
+                    else:
+                        if st.button("Finish Quiz", use_container_width=True, type="primary"):
+                            total = len(st.session_state.quiz_data)
+                            score = st.session_state.score
+                            percent = int(100 * score / total) if total > 0 else 0
+                            db.add(QuizResult(topic_name=st.session_state.current_quiz_topic, score=score, total_questions=total, is_passed=(1 if percent >= 80 else 0), user_id=user_id))
+                            db.commit()
+                            st.session_state.final_score_info = {"score": score, "total": total, "percent": percent}
+                            st.rerun()
 
-            score_cols = st.columns(3)
-            with score_cols[0]: st.metric("Correct", f"{info['score']}")
-            with score_cols[1]: st.metric("Incorrect", f"{info['total'] - info['score']}")
-            with score_cols[2]: st.metric("Final Score", f"{info['percent']}%")
+            else:
+                info = st.session_state.final_score_info
+                st.balloons()
+                st.success("🎉 Quiz Complete!")
+
+                score_cols = st.columns(3)
+                with score_cols[0]: st.metric("Correct", f"{info['score']}")
+                with score_cols[1]: st.metric("Incorrect", f"{info['total'] - info['score']}")
+                with score_cols[2]: st.metric("Final Score", f"{info['percent']}%")
             
-            if st.session_state.get("quiz_to_save"):
-                with st.form("save_quiz_form"):
-                    st.subheader("Save Quiz to Collection")
-                    quiz_topic = st.text_input("Quiz Name", value=st.session_state.get("current_quiz_topic", "Quiz"))
-                    is_public_quiz = st.checkbox("Make this quiz public for other users?", value=False)
+                if st.session_state.get("quiz_to_save"):
+                    with st.form("save_quiz_form"):
+                        st.subheader("Save Quiz to Collection")
+                        quiz_topic = st.text_input("Quiz Name", value=st.session_state.get("current_quiz_topic", "Quiz"))
+                        is_public_quiz = st.checkbox("Make this quiz public for other users?", value=False)
                     
-                    if st.form_submit_button("Save to My Quizzes", type="primary", use_container_width=True):
-                        new_collection = QuizCollection(topic_name=quiz_topic, user_id=user_id, is_public=is_public_quiz)
-                        db.add(new_collection)
-                        db.flush()
+                        if st.form_submit_button("Save to My Quizzes", type="primary", use_container_width=True):
+                            new_collection = QuizCollection(topic_name=quiz_topic, user_id=user_id, is_public=is_public_quiz)
+                            db.add(new_collection)
+                            db.flush()
                         
-                        for q in st.session_state.quiz_to_save:
-                            db.add(QuizQuestion(
-                                question_text=q['question'],
-                                options=json.dumps(q['options']),
-                                correct_answer=q['answer'],
-                                collection_id=new_collection.id
-                            ))
+                            for q in st.session_state.quiz_to_save:
+                                db.add(QuizQuestion(
+                                    question_text=q['question'],
+                                    options=json.dumps(q['options']),
+                                    correct_answer=q['answer'],
+                                    collection_id=new_collection.id
+                                ))
                         
-                        db.commit()
-                        st.success(f"Quiz '{quiz_topic}' saved to your collection!")
-                        st.session_state.pop("quiz_to_save", None)
-                        st.rerun()
+                            db.commit()
+                            if is_public_quiz:
+                                community_cache.invalidate()
+                            st.success(f"Quiz '{quiz_topic}' saved to your collection!")
+                            st.session_state.pop("quiz_to_save", None)
+                            st.rerun()
 
-            if st.button("⬅️ Back to Quizzes", use_container_width=True):
-                keys_to_clear = ['quiz_data', 'final_score_info', 'current_question_index', 'score', 'user_answers', 'answer_submitted', 'quiz_to_save']
-                for key in keys_to_clear:
-                    st.session_state.pop(key, None)
-                st.rerun()
+                if st.button("⬅️ Back to Quizzes", use_container_width=True):
+                    keys_to_clear = ['quiz_data', 'final_score_info', 'current_question_index', 'score', 'user_answers', 'answer_submitted', 'quiz_to_save']
+                    for key in keys_to_clear:
+                        st.session_state.pop(key, None)
+                    st.rerun()
     
-    elif st.session_state.current_task == "🃏 Kinetic Flashcards":
-        if 'flashcards_data' not in st.session_state:
-            with st.form("flashcard_form"):
-                st.subheader("Generate New Flashcards")
-                fc_text_from_area = st.text_area("Paste notes or enter a topic:", height=250)
-                uploaded_file = st.file_uploader("Or upload a document to generate flashcards from", type=None)
-
-                num_c = st.slider("Number of Flashcards:", 3, 15, 5)
-                submitted = st.form_submit_button("Generate Flashcards", type="primary", use_container_width=True)
-                if submitted:
-                    final_fc_text = ""
-                    if uploaded_file is not None:
-                        final_fc_text = extract_file_text(uploaded_file)
-                    else:
-                        final_fc_text = fc_text_from_area
+        elif st.session_state.current_task == "🃏 Kinetic Flashcards":
+            def start_flashcards(result):
+                st.session_state.flashcard_topic = result["title"]
+                st.session_state.flashcards_data = result["items"]
+                st.session_state.current_flashcard_index = 0
+                st.session_state.card_flipped = False
+            show_job(start_flashcards)
+
+            if 'flashcards_data' not in st.session_state:
+                with st.form("flashcard_form"):
+                    st.subheader("Generate New Flashcards")
+                    fc_text_from_area = st.text_area("Paste notes or enter a topic:", height=250)
+                    uploaded_file = st.file_uploader("Or upload a document to generate flashcards from", type=None)
+                    picked_document_id = library_picker("fc_text_library_pick")
+
+                    num_c = st.slider("Number of Flashcards:", 3, 15, 5)
+                    use_study_pack = study_pack_checkbox("fc_study_pack")
+                    learn_concepts = learn_checkbox("fc_learn")
+                    submitted = st.form_submit_button("Generate Flashcards", type="primary", use_container_width=True)
+                    if submitted:
+                        final_fc_text = ""
+                        if uploaded_file is not None:
+                            final_fc_text = extract_file_text(uploaded_file)
+                        elif picked_document_id:
+                            final_fc_text = library_text(picked_document_id)
+                        else:
+                            final_fc_text = fc_text_from_area
                     
-                    is_valid, msg = validate_text_input(final_fc_text, "Flashcard Text")
-                    if not is_valid: 
-                        st.error(msg)
-                    else:
-                        with st.spinner("🤖 AI is creating flashcards..."):
-                            fc_json_str = client.generate_flashcards(final_fc_text, num_c)
-                            st.session_state.flashcard_topic = get_and_store_topic(final_fc_text)
-                        try:
-                            st.session_state.flashcards_data = json.loads(extract_json_from_string(fc_json_str))
-                            st.session_state.current_flashcard_index = 0
-                            st.session_state.card_flipped = False
+                        is_valid, msg = validate_text_input(final_fc_text, "Flashcard Text", max_length=Config.MAX_DOCUMENT_LENGTH)
+                        if not is_valid: 
+                            st.error(msg)
+                        elif (curated := curated_packs.match(final_fc_text)) and curated.flashcards:
+                            start_flashcards({"title": get_and_store_topic(curated.module, is_explicit_topic=True), "items": curated.flashcard_items(num_c)})
                             st.rerun()
-                        except (json.JSONDecodeError, TypeError):
-                            st.error("AI returned an invalid format. Please try again.")
-                            st.code(fc_json_str)
+                        else:
+                            start_job("flashcards", {"text": final_fc_text, "num_cards": num_c, "use_study_pack": use_study_pack,
+                                                     "learn_concepts": learn_concepts})
         
-        else:
-            if not st.session_state.flashcards_data:
-                st.info("No flashcards generated yet.")
             else:
-                st.subheader("Generated Flashcards Preview")
+                if not st.session_state.flashcards_data:
+                    st.info("No flashcards generated yet.")
+                else:
+                    st.subheader("Generated Flashcards Preview")
                 
-                total_cards = len(st.session_state.flashcards_data)
-                card_index = st.session_state.get('current_flashcard_index', 0)
-                current_card = st.session_state.flashcards_data[card_index]
-
-                transform_style = "transform: rotateY(180deg);" if st.session_state.get('card_flipped', False) else ""
-
-                st.markdown(f"""
-                <div class="flashcard">
-                    <div class="flashcard-inner" style="{transform_style}">
-                        <div class="flashcard-front">{current_card['front']}</div>
-                        <div class="flashcard-back">{current_card['back']}</div>
+                    total_cards = len(st.session_state.flashcards_data)
+                    card_index = st.session_state.get('current_flashcard_index', 0)
+                    current_card = st.session_state.flashcards_data[card_index]
+
+                    transform_style = "transform: rotateY(180deg);" if st.session_state.get('card_flipped', False) else ""
+
+                    st.markdown(f"""
+                    <div class="flashcard">
+                        <div class="flashcard-inner" style="{transform_style}">
+                            <div class="flashcard-front">{current_card['front']}</div>
+                            <div class="flashcard-back">{current_card['back']}</div>
+                        </div>
                     </div>
-                </div>
-                """, unsafe_allow_html=True)
+                    """, unsafe_allow_html=True)
                 
-                st.write("") # Spacer
+                    st.write("") # Spacer
 
-                if st.button("Flip Card", use_container_width=True):
-                    st.session_state.card_flipped = not st.session_state.get('card_flipped', False)
-                    st.rerun()
-                
-                nav_cols = st.columns([1, 1, 1])
-                with nav_cols[0]:
-                    if st.button("◀️ Previous", use_container_width=True, disabled=(card_index == 0)):
-                        st.session_state.current_flashcard_index -= 1
-                        st.session_state.card_flipped = False
+                    if st.button("Flip Card", use_container_width=True):
+                        st.session_state.card_flipped = not st.session_state.get('card_flipped', False)
                         st.rerun()
-                with nav_cols[1]:
-                    st.markdown(f"<p style='text-align: center; color: white;'>Card {card_index + 1} of {total_cards}</p>", unsafe_allow_html=True)
+                
+                    nav_cols = st.columns([1, 1, 1])
+                    with nav_cols[0]:
+                        if st.button("◀️ Previous", use_container_width=True, disabled=(card_index == 0)):
+                            st.session_state.current_flashcard_index -= 1
+                            st.session_state.card_flipped = False
+                            st.rerun()
+                    with nav_cols[1]:
+                        st.markdown(f"<p style='text-align: center; color: white;'>Card {card_index + 1} of {total_cards}</p>", unsafe_allow_html=True)
 
-                with nav_cols[2]:
-                    if st.button("Next ▶️", use_container_width=True, disabled=(card_index == total_cards - 1)):
-                        st.session_state.current_flashcard_index += 1
-                        st.session_state.card_flipped = False
-                        st.rerun()
+                    with nav_cols[2]:
+                        if st.button("Next ▶️", use_container_width=True, disabled=(card_index == total_cards - 1)):
+                            st.session_state.current_flashcard_index += 1
+                            st.session_state.card_flipped = False
+                            st.rerun()
                 
-                st.markdown("---")
+                    st.markdown("---")
 
-                with st.form("save_deck_form"):
-                    st.subheader("Save Deck to Collection")
-                    deck_topic = st.text_input("Deck Name", value=st.session_state.get("flashcard_topic", "Flashcard Deck"))
-                    is_public_deck = st.checkbox("Make this deck public for other users?", value=False)
+                    with st.form("save_deck_form"):
+                        st.subheader("Save Deck to Collection")
+                        deck_topic = st.text_input("Deck Name", value=st.session_state.get("flashcard_topic", "Flashcard Deck"))
+                        is_public_deck = st.checkbox("Make this deck public for other users?", value=False)
                     
-                    submitted = st.form_submit_button("Save to My Decks", type="primary", use_container_width=True)
-                    if submitted:
-                        new_deck = FlashcardDeck(topic_name=deck_topic, user_id=user_id, is_public=is_public_deck)
-                        db.add(new_deck)
-                        db.flush()
+                        submitted = st.form_submit_button("Save to My Decks", type="primary", use_container_width=True)
+                        if submitted:
+                            new_deck = FlashcardDeck(topic_name=deck_topic, user_id=user_id, is_public=is_public_deck)
+                            db.add(new_deck)
+                            db.flush()
                         
-                        for card in st.session_state.flashcards_data:
-                            db.add(Flashcard(front=card['front'], back=card['back'], deck_id=new_deck.id))
+                            for card in st.session_state.flashcards_data:
+                                db.add(Flashcard(front=card['front'], back=card['back'], deck_id=new_deck.id))
                         
-                        db.commit()
-                        st.success(f"Deck '{deck_topic}' saved! Study it in 'My Collections'.")
+                            db.commit()
+                            if is_public_deck:
+                                community_cache.invalidate()
+                            st.success(f"Deck '{deck_topic}' saved! Study it in 'My Collections'.")
                         
-                        keys_to_clear = ['flashcards_data', 'current_flashcard_index', 'card_flipped']
-                        for key in keys_to_clear:
-                            st.session_state.pop(key, None)
-                        st.rerun()
+                            keys_to_clear = ['flashcards_data', 'current_flashcard_index', 'card_flipped']
+                            for key in keys_to_clear:
+                                st.session_state.pop(key, None)
+                            st.rerun()
 
 
-    elif st.session_state.current_task == "🗺️ AI Study Planner":
-        existing_roadmaps = db.query(StudyRoadmap).filter(StudyRoadmap.user_id == user_id).all()
-        if not existing_roadmaps:
-            st.write("Generate a structured, interactive study plan!")
-            with st.form("planner_form"):
-                topic = st.text_input("What topic do you want to master?", placeholder="e.g., Data Structures & Algorithms")
-                days = st.number_input("How many days to learn?", 1, 30, 7)
-                if st.form_submit_button("🗺️ Generate Plan", type="primary", use_container_width=True):
-                    is_valid, msg = validate_text_input(topic, "Topic")
-                    if not is_valid: st.error(msg)
-                    else:
-                        with st.spinner("🤖 AI is designing your learning journey..."):
-                            roadmap_json = client.generate_roadmap_json(topic, days)
-                            try:
-                                roadmap_data = json.loads(extract_json_from_string(roadmap_json))
-                                new_roadmap = StudyRoadmap(topic=topic, user_id=user_id)
-                                db.add(new_roadmap)
-                                db.flush()
-                                
-                                for day_str, topics_for_day in roadmap_data.items():
-                                    day_num_match = re.search(r'\d+', day_str)
-                                    if not day_num_match: continue
-                                    day_num = int(day_num_match.group())
-                                    
-                                    for sub_topic in topics_for_day:
-                                        db.add(RoadmapItem(sub_topic=sub_topic, roadmap_id=new_roadmap.id, day_number=day_num))
-                                
-                                db.commit()
-                                get_and_store_topic(topic, is_explicit_topic=True)
-                                st.success("Your plan is ready!")
-                                st.rerun()
-                            except (json.JSONDecodeError, AttributeError, TypeError, OperationalError) as e:
-                                st.error(f"AI returned an invalid format or a database error occurred. Please try again. Error: {e}"); st.code(roadmap_json)
-        else:
-            roadmap = existing_roadmaps[-1]
-            st.subheader(f"Your Roadmap: {roadmap.topic}")
-
-            def toggle_completion(item_id):
-                item = db.query(RoadmapItem).filter(RoadmapItem.id == item_id).first()
-                if item: item.is_completed = not item.is_completed; db.commit()
+        elif st.session_state.current_task == "🗺️ AI Study Planner":
+            show_job(lambda result: st.success("Your plan is ready!"))
+            existing_roadmaps = db.query(StudyRoadmap).filter(StudyRoadmap.user_id == user_id).all()
+            if not existing_roadmaps:
+                st.write("Generate a structured, interactive study plan!")
+                with st.form("planner_form"):
+                    topic = st.text_input("What topic do you want to master?", placeholder="e.g., Data Structures & Algorithms")
+                    days = st.number_input("How many days to learn?", 1, 30, 7)
+                    if st.form_submit_button("🗺️ Generate Plan", type="primary", use_container_width=True):
+                        is_valid, msg = validate_text_input(topic, "Topic")
+                        if not is_valid: st.error(msg)
+                        elif (curated := curated_packs.match(topic)) and curated.roadmap(int(days)):
+                            save_roadmap(db, user_id, curated.module, curated.roadmap(int(days)))
+                            get_and_store_topic(curated.module, is_explicit_topic=True)
+                            st.rerun()
+                        else:
+                            start_job("roadmap", {"topic": topic, "days": int(days)})
+            else:
+                roadmap = existing_roadmaps[-1]
+                st.subheader(f"Your Roadmap: {roadmap.topic}")
+
+                def toggle_completion(item_id):
+                    # Callbacks run at the start of the next rerun, after this run's session is closed
+                    with session_scope() as callback_db:
+                        item = callback_db.query(RoadmapItem).filter(RoadmapItem.id == item_id).first()
+                        if item: item.is_completed = not item.is_completed; callback_db.commit()
             
-            items_by_day = {}
-            if roadmap.items:
-                 for item in sorted(roadmap.items, key=lambda x: x.day_number if x.day_number is not None else -1):
-                    if item.day_number not in items_by_day:
-                        items_by_day[item.day_number] = []
-                    items_by_day[item.day_number].append(item)
-
-            for day_num in sorted(items_by_day.keys()):
-                with st.expander(f"**Day {day_num}**", expanded=True, icon="🗓️"):
-                    for item in items_by_day[day_num]:
-                        with st.container(border=True):
-                            col1, col2, col3, col4 = st.columns([0.1, 0.5, 0.2, 0.2])
-                            with col1: 
-                                st.checkbox("", item.is_completed, key=f"check_{item.id}", on_change=toggle_completion, args=(item.id,), label_visibility="collapsed")
-                            with col2: 
-                                st.markdown(f"~~**{item.sub_topic}**~~" if item.is_completed else f"**{item.sub_topic}**")
-                            with col3:
-                                if st.button("✨ Explain", key=f"explain_{item.id}", use_container_width=True):
-                                    st.session_state.navigate_to = "✨ Explain a Topic"
-                                    st.session_state.prefill_topic = item.sub_topic
-                                    st.rerun()
-                            with col4:
-                                if st.button("🧩 Quiz", key=f"quiz_{item.id}", use_container_width=True):
-                                    st.session_state.navigate_to = "🧩 Interactive Quiz"
-                                    st.session_state.prefill_topic = item.sub_topic
-                                    st.rerun()
+                items_by_day = {}
+                if roadmap.items:
+                     for item in sorted(roadmap.items, key=lambda x: x.day_number if x.day_number is not None else -1):
+                        if item.day_number not in items_by_day:
+                            items_by_day[item.day_number] = []
+                        items_by_day[item.day_number].append(item)
+
+                for day_num in sorted(items_by_day.keys()):
+                    with st.expander(f"**Day {day_num}**", expanded=True, icon="🗓️"):
+                        for item in items_by_day[day_num]:
+                            with st.container(border=True):
+                                col1, col2, col3, col4 = st.columns([0.1, 0.5, 0.2, 0.2])
+                                with col1: 
+                                    st.checkbox("", item.is_completed, key=f"check_{item.id}", on_change=toggle_completion, args=(item.id,), label_visibility="collapsed")
+                                with col2: 
+                                    st.markdown(f"~~**{item.sub_topic}**~~" if item.is_completed else f"**{item.sub_topic}**")
+                                with col3:
+                                    if st.button("✨ Explain", key=f"explain_{item.id}", use_container_width=True):
+                                        st.session_state.navigate_to = "✨ Explain a Topic"
+                                        st.session_state.prefill_topic = item.sub_topic
+                                        st.rerun()
+                                with col4:
+                                    if st.button("🧩 Quiz", key=f"quiz_{item.id}", use_container_width=True):
+                                        st.session_state.navigate_to = "🧩 Interactive Quiz"
+                                        st.session_state.prefill_topic = item.sub_topic
+                                        st.rerun()
                             
-            if st.button("Create a New Roadmap", use_container_width=True):
-                for r in existing_roadmaps: db.delete(r)
-                db.commit(); st.rerun()
-
-    elif st.session_state.current_task == "🌐 Explore Community":
-        tab1, tab2 = st.tabs(["Community Decks", "Community Quizzes"])
+                if st.button("Create a New Roadmap", use_container_width=True):
+                    for r in existing_roadmaps: db.delete(r)
+                    db.commit(); st.rerun()
+
+        elif st.session_state.current_task == "🌐 Explore Community":
+            f1, f2, f3 = st.columns([0.4, 0.3, 0.3])
+            topic_filter = f1.text_input("Search topics", placeholder="e.g. Photosynthesis")
+            creator_filter = f2.text_input("Creator", placeholder="Username")
+            sort_label = f3.selectbox("Sort by", ["Newest", "Most added"])
+            community_filters = (topic_filter.strip(), creator_filter.strip(), sort_label)
+            # One cursor stack per tab: the last entry is the page shown, popping it goes back a page
+            if st.session_state.get("community_filters") != community_filters:
+                st.session_state.community_filters = community_filters
+                st.session_state.community_cursors = {"decks": [None], "quizzes": [None]}
+
+            def load_community_page(kind):
+                cursors = st.session_state.community_cursors[kind]
+                return community_cache.page(db, kind, sort="recent" if sort_label == "Newest" else "popular",
+                                            topic=topic_filter, creator=creator_filter, cursor=cursors[-1])
+
+            def page_buttons(kind, page):
+                cursors = st.session_state.community_cursors[kind]
+                if len(cursors) == 1 and not page.next_cursor:
+                    return
+                b1, b2, b3 = st.columns([0.2, 0.6, 0.2])
+                if b1.button("← Previous", key=f"community_prev_{kind}", disabled=len(cursors) == 1, use_container_width=True):
+                    cursors.pop()
+                    st.rerun()
+                b2.caption(f"Page {len(cursors)}")
+                if b3.button("Next →", key=f"community_next_{kind}", disabled=not page.next_cursor, use_container_width=True):
+                    cursors.append(page.next_cursor)
+                    st.rerun()
 
-        with tab1:
-            st.subheader("Community Flashcard Decks")
-            try:
-                public_decks = db.query(FlashcardDeck).filter(FlashcardDeck.is_public == True).all()
-            except OperationalError:
-                st.error("⚠️ Database Schema Mismatch!")
-                st.info("Your database file is out of sync with the new community features. To fix this, please delete the file 'brainstorm_buddy.db' and restart the application. This will create a fresh database with the correct structure. (Note: This will reset existing user data).")
-                public_decks = []
-
-            if not public_decks:
-                st.info("No public decks available yet. Create a deck and make it public to share with the community!")
-            else:
-                for deck in public_decks:
-                    with st.container(border=True):
-                        col1, col2, col3 = st.columns([0.6, 0.2, 0.2])
-                        with col1:
-                            st.subheader(f"Deck: {deck.topic_name}")
-                            creator = deck.user.username if deck.user else "Unknown"
-                            creator_tag = f"by {creator}" if deck.user_id != user_id else "by You"
-                            st.caption(f"{len(deck.cards)} cards | Created {creator_tag}")
-                        with col2:
-                            if st.button("Study Deck", key=f"community_study_{deck.id}", use_container_width=True):
-                                st.warning("Full deck study mode coming soon!")
-                        with col3:
-                            if deck.user_id != user_id:
-                                if st.button("Add to My Decks", key=f"community_add_deck_{deck.id}", use_container_width=True):
-                                    cloned_deck = FlashcardDeck(topic_name=deck.topic_name, user_id=user_id, is_public=False)
-                                    db.add(cloned_deck)
-                                    db.flush()
-                                    for card in deck.cards:
-                                        db.add(Flashcard(front=card.front, back=card.back, deck_id=cloned_deck.id))
-                                    db.commit()
-                                    st.success(f"Deck '{deck.topic_name}' was added to your collection!")
-                                    st.rerun()
+            tab1, tab2 = st.tabs(["Community Decks", "Community Quizzes"])
+
+            with tab1:
+                st.subheader("Community Flashcard Decks")
+                try:
+                    decks_page = load_community_page("decks")
+                except OperationalError:
+                    st.error("⚠️ Database Schema Mismatch!")
+                    st.info("Your database file is out of sync with the new community features. To fix this, please delete the file 'brainstorm_buddy.db' and restart the application. This will create a fresh database with the correct structure. (Note: This will reset existing user data).")
+                    decks_page = None
+                public_decks = decks_page.rows if decks_page else []
+
+                if not public_decks and (topic_filter or creator_filter):
+                    st.info("No public decks match your search.")
+                elif not public_decks:
+                    st.info("No public decks available yet. Create a deck and make it public to share with the community!")
+                else:
+                    for deck in public_decks:
+                        with st.container(border=True):
+                            col1, col2, col3 = st.columns([0.6, 0.2, 0.2])
+                            with col1:
+                                st.subheader(f"Deck: {deck.topic_name}")
+                                creator_tag = f"by {deck.creator}" if deck.user_id != user_id else "by You"
+                                st.caption(f"{deck.card_count} cards | Created {creator_tag} | Added {deck.clone_count} times")
+                            with col2:
+                                if st.button("Study Deck", key=f"community_study_{deck.id}", use_container_width=True):
+                                    st.warning("Full deck study mode coming soon!")
+                            with col3:
+                                if deck.user_id != user_id:
+                                    if st.button("Add to My Decks", key=f"community_add_deck_{deck.id}", use_container_width=True):
+                                        if clone_deck(db, deck.id, user_id) is None:
+                                            st.warning(f"Deck '{deck.topic_name}' is no longer shared.")
+                                        else:
+                                            st.success(f"Deck '{deck.topic_name}' was added to your collection!")
+                                            st.rerun()
+                    page_buttons("decks", decks_page)
         
-        with tab2:
-            st.subheader("Community Quizzes")
-            public_quizzes = db.query(QuizCollection).filter(QuizCollection.is_public == True).all()
-            if not public_quizzes:
-                st.info("No public quizzes are available yet.")
-            for quiz in public_quizzes:
-                with st.container(border=True):
-                    c1, c2, c3 = st.columns([0.6, 0.2, 0.2])
-                    creator = quiz.user.username if quiz.user else "Unknown"
-                    creator_tag = f"by {creator}" if quiz.user_id != user_id else "by You"
-                    c1.write(f"**{quiz.topic_name}** ({len(quiz.questions)} questions) {creator_tag}")
-                    
-                    with c2:
-                        if st.button("Take Quiz", key=f"community_take_{quiz.id}", use_container_width=True):
-                            quiz_data = []
-                            for q in quiz.questions:
-                                quiz_data.append({"question": q.question_text, "options": json.loads(q.options), "answer": q.correct_answer})
-                            st.session_state.quiz_data = quiz_data
-                            st.session_state.current_quiz_topic = quiz.topic_name
-                            st.session_state.current_question_index = 0
-                            st.session_state.score = 0
-                            st.session_state.user_answers = [None] * len(quiz_data)
-                            st.session_state.answer_submitted = False
-                            st.session_state.navigate_to = "🧩 Interactive Quiz"
-                            st.rerun()
+            with tab2:
+                st.subheader("Community Quizzes")
+                quizzes_page = load_community_page("quizzes")
+                public_quizzes = quizzes_page.rows
+                if not public_quizzes and (topic_filter or creator_filter):
+                    st.info("No public quizzes match your search.")
+                elif not public_quizzes:
+                    st.info("No public quizzes are available yet.")
+                for quiz in public_quizzes:
+                    with st.container(border=True):
+                        c1, c2, c3 = st.columns([0.6, 0.2, 0.2])
+                        creator_tag = f"by {quiz.creator}" if quiz.user_id != user_id else "by You"
+                        c1.write(f"**{quiz.topic_name}** ({quiz.question_count} questions) {creator_tag}")
+                        c1.caption(f"Added {quiz.clone_count} times")
                     
-                    with c3:
-                        if quiz.user_id != user_id:
-                            if st.button("Add to My Quizzes", key=f"community_add_quiz_{quiz.id}", use_container_width=True):
-                                cloned_quiz = QuizCollection(topic_name=quiz.topic_name, user_id=user_id, is_public=False)
-                                db.add(cloned_quiz)
-                                db.flush()
-                                for q in quiz.questions:
-                                    db.add(QuizQuestion(question_text=q.question_text, options=q.options, correct_answer=q.correct_answer, collection_id=cloned_quiz.id))
-                                db.commit()
-                                st.success(f"Quiz '{quiz.topic_name}' added to your collection!")
+                        with c2:
+                            if st.button("Take Quiz", key=f"community_take_{quiz.id}", use_container_width=True):
+                                quiz_data = quiz_items(db, quiz.id)
+                                st.session_state.quiz_data = quiz_data
+                                st.session_state.current_quiz_topic = quiz.topic_name
+                                st.session_state.current_question_index = 0
+                                st.session_state.score = 0
+                                st.session_state.user_answers = [None] * len(quiz_data)
+                                st.session_state.answer_submitted = False
+                                st.session_state.navigate_to = "🧩 Interactive Quiz"
                                 st.rerun()
-
-    # --- 8. FOOTER ---
-    st.markdown("<br><br>", unsafe_allow_html=True)
-    st.markdown("---")
-    st.caption("🚀 Developed by Aditya Ranjan Samal | Powered by Gemini AI | © 2025")
+                    
+                        with c3:
+                            if quiz.user_id != user_id:
+                                if st.button("Add to My Quizzes", key=f"community_add_quiz_{quiz.id}", use_container_width=True):
+                                    if clone_quiz(db, quiz.id, user_id) is None:
+                                        st.warning(f"Quiz '{quiz.topic_name}' is no longer shared.")
+                                    else:
+                                        st.success(f"Quiz '{quiz.topic_name}' added to your collection!")
+                                        st.rerun()
+                page_buttons("quizzes", quizzes_page)
+
+        # --- 8. FOOTER ---
+        st.markdown("<br><br>", unsafe_allow_html=True)
+        st.markdown("---")
+        st.caption("🚀 Developed by Aditya Ranjan Samal | Powered by Gemini AI | © 2025")
@@ -0,0 +1,108 @@
+# benchmarks/bench_collection_queries.py
+"""
+SQL statements and time to build the Explore Community and My Collections listings: walking ORM
+relationships per row (len(deck.cards), deck.user.username), the full listings in `queries`, and one keyset
+page of the community hub (queries.community_page), whose cost should stay flat as public content grows.
+
+    python benchmarks/bench_collection_queries.py [--decks 50 200 1000] [--cards 20]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Flashcard, FlashcardDeck, QuizCollection, QuizQuestion, User, make_engine
+from queries import community_page, list_public_decks, list_public_quizzes, list_user_decks
+
+USERS = 20
+
+
+def seed(Session, decks, cards):
+    db = Session()
+    users = [User(username=f"user{u}", hashed_password="x") for u in range(USERS)]
+    db.add_all(users)
+    db.flush()
+    for d in range(decks):
+        owner = users[d % USERS].id
+        deck = FlashcardDeck(topic_name=f"Deck {d}", user_id=owner, is_public=True)
+        quiz = QuizCollection(topic_name=f"Quiz {d}", user_id=owner, is_public=True)
+        db.add_all([deck, quiz])
+        db.flush()
+        db.add_all([Flashcard(front=f"Q{i}", back=f"A{i}", deck_id=deck.id) for i in range(cards)])
+        db.add_all([QuizQuestion(question_text=f"Q{i}", options=json.dumps(["a", "b"]), correct_answer="a", collection_id=quiz.id)
+                    for i in range(cards // 2)])
+    db.commit()
+    db.close()
+
+
+def orm_listing(db):
+    """What the pages did before: one query per list, then lazy loads per row."""
+    lines = [(d.topic_name, len(d.cards), d.user.username if d.user else "Unknown")
+             for d in db.query(FlashcardDeck).filter(FlashcardDeck.is_public == True).all()]
+    lines += [(q.topic_name, len(q.questions), q.user.username if q.user else "Unknown")
+              for q in db.query(QuizCollection).filter(QuizCollection.is_public == True).all()]
+    lines += [(d.topic_name, len(d.cards)) for d in db.query(FlashcardDeck).filter(FlashcardDeck.user_id == 1).all()]
+    return len(lines)
+
+
+def query_listing(db):
+    lines = [(d.topic_name, d.card_count, d.creator) for d in list_public_decks(db)]
+    lines += [(q.topic_name, q.question_count, q.creator) for q in list_public_quizzes(db)]
+    lines += [(d.topic_name, d.card_count) for d in list_user_decks(db, 1)]
+    return len(lines)
+
+
+def page_listing(db):
+    """The community hub now: a page of decks and of quizzes, then the page after that for decks."""
+    decks = community_page(db, "decks")
+    lines = [(d.topic_name, d.card_count, d.creator) for d in decks.rows]
+    lines += [(q.topic_name, q.question_count, q.creator) for q in community_page(db, "quizzes").rows]
+    lines += [(d.topic_name, d.card_count, d.creator) for d in community_page(db, "decks", cursor=decks.next_cursor).rows]
+    return len(lines)
+
+
+def measure(engine, Session, listing):
+    statements = []
+    listener = lambda *args: statements.append(1)
+    event.listen(engine, "before_cursor_execute", listener)
+    db = Session()
+    started = time.perf_counter()
+    rows = listing(db)
+    seconds = time.perf_counter() - started
+    db.close()
+    event.remove(engine, "before_cursor_execute", listener)
+    return rows, len(statements), seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--decks", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--cards", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'decks':>6} {'listing':>8} {'rows':>6} {'queries':>8} {'ms':>8}")
+    for decks in args.decks:
+        with tempfile.TemporaryDirectory() as directory:
+            engine = make_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+            Base.metadata.create_all(engine)
+            Session = sessionmaker(bind=engine)
+            seed(Session, decks, args.cards)
+            results = {}
+            for name, listing in (("orm", orm_listing), ("queries", query_listing), ("page", page_listing)):
+                rows, statements, seconds = measure(engine, Session, listing)
+                results[name] = statements
+                print(f"{decks:>6} {name:>8} {rows:>6} {statements:>8} {seconds * 1000:>8.1f}")
+            # The aggregated listing must not grow with the number of rows.
+            assert results["queries"] == 3 and results["page"] == 3, results
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# benchmarks/bench_diagrams.py
+"""
+Lays out synthetic DOT diagrams with `diagrams.DiagramRenderer`, first cold and then again from the cache,
+and reports layout-time percentiles from the renderer's stats.
+
+    python benchmarks/bench_diagrams.py [--diagrams 20] [--nodes 10 40 160] [--workers 2]
+
+Needs the Graphviz `dot` executable (set GRAPHVIZ_DOT if it is not on PATH).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def synthetic_dot(nodes, seed):
+    rng = random.Random(seed)
+    edges = [f'  n{i} -> n{rng.randrange(i)};' for i in range(1, nodes)]
+    edges += [f'  n{rng.randrange(nodes)} -> n{rng.randrange(nodes)};' for _ in range(nodes // 4)]
+    labels = [f'  n{i} [label="Concept {i}"];' for i in range(nodes)]
+    return "digraph G {\n  node [shape=box, style=rounded];\n" + "\n".join(labels + edges) + "\n}"
+
+
+def timed_batch(renderer, sources, workers):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers * 2) as pool:
+        results = list(pool.map(renderer.render, sources))
+    return time.perf_counter() - started, sum(r.cached for r in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--diagrams", type=int, default=20)
+    parser.add_argument("--nodes", type=int, nargs="+", default=[10, 40, 160])
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    from diagrams import DiagramRenderer
+
+    print(f"{'nodes':>6} {'pass':>7} {'seconds':>8} {'cached':>7} {'p50':>7} {'p95':>7} {'max':>7}")
+    for nodes in args.nodes:
+        sources = [synthetic_dot(nodes, seed) for seed in range(args.diagrams)]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            renderer = DiagramRenderer(cache_dir=cache_dir, workers=args.workers)
+            if not renderer.available:
+                sys.exit("Graphviz `dot` was not found; install Graphviz or set GRAPHVIZ_DOT.")
+            for name in ("cold", "cached"):
+                seconds, cached = timed_batch(renderer, sources, args.workers)
+                stats = renderer.stats()
+                print(f"{nodes:>6} {name:>7} {seconds:>7.2f}s {cached:>7} {stats['layout_p50']:>7.3f} "
+                      f"{stats['layout_p95']:>7.3f} {stats['layout_max']:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/bench_llm_json.py
+"""
+Compares the old all-or-nothing parsing (extract_json_from_string + json.loads) with llm_json.parse
+on a corpus of captured model responses, reporting how many requested items each one salvages and
+how long parsing takes.
+
+    python benchmarks/bench_llm_json.py [--corpus benchmarks/llm_json_corpus.jsonl] [--repeat 200]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_json  # noqa: E402
+
+
+def wanted(entry):
+    expected = entry["expected"]
+    return len(expected) if isinstance(expected, list) else expected
+
+
+def old_parse(entry):
+    try:
+        return json.loads(llm_json.extract_json_from_string(entry["text"]))
+    except ValueError:
+        return None
+
+
+def baseline(entry):
+    """Items the old code path yields: every valid item if the whole payload loads, otherwise none."""
+    payload = old_parse(entry)
+    if payload is None:
+        return 0
+    # Re-serialize so the loaded payload is judged by the same schema, minus the salvage logic.
+    return len(llm_json.parse(entry["kind"], json.dumps(payload), entry["expected"]).items)
+
+
+def salvaged(entry):
+    return len(llm_json.parse(entry["kind"], entry["text"], entry["expected"]).items)
+
+
+def streamed(entry, chunk_size=64):
+    text = entry["text"]
+    chunks = (text[i:i + chunk_size] for i in range(0, len(text), chunk_size))
+    return len(list(llm_json.iter_items(entry["kind"], chunks, entry["expected"])))
+
+
+def time_per_call(fn, entries, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for entry in entries:
+            fn(entry)
+    return (time.perf_counter() - started) / (repeat * len(entries)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_json_corpus.jsonl"))
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+
+    print(f"{'response':32} {'kind':14} {'wanted':>6} {'old':>5} {'new':>5} {'stream':>6}")
+    totals = {"wanted": 0, "old": 0, "new": 0}
+    for entry in entries:
+        old, new, stream = baseline(entry), salvaged(entry), streamed(entry)
+        assert stream == new, f"streaming parse disagrees on {entry['name']}"
+        totals["wanted"] += wanted(entry)
+        totals["old"] += old
+        totals["new"] += new
+        print(f"{entry['name']:32} {entry['kind']:14} {wanted(entry):>6} {old:>5} {new:>5} {stream:>6}")
+
+    print()
+    print(f"salvage rate   old: {totals['old'] / totals['wanted']:.1%}   new: {totals['new'] / totals['wanted']:.1%}"
+          f"   ({totals['wanted']} items requested over {len(entries)} responses)")
+    print(f"parse time     old: {time_per_call(old_parse, entries, args.repeat):.1f} us"
+          f"   new: {time_per_call(salvaged, entries, args.repeat):.1f} us"
+          f"   new, streamed in 64-char chunks: {time_per_call(streamed, entries, args.repeat):.1f} us  (per response)")
+
+    # Scaling check: one large response, so the scanner's cost per character is visible.
+    big = {"kind": "quiz", "expected": 400, "text": json.dumps([
+        {"question": f"Question {i}?", "options": [f"Option {i}.{k}" for k in range(4)], "answer": f"Option {i}.2"}
+        for i in range(400)
+    ], indent=2)}
+    per_call = time_per_call(salvaged, [big], max(1, args.repeat // 20))
+    print(f"large response {len(big['text']) / 1024:.0f} KiB, 400 items: {per_call / 1000:.2f} ms"
+          f" ({len(big['text']) / per_call:.0f} chars/us)")
+
+
+if __name__ == "__main__":
+    main()
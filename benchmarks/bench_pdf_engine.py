@@ -0,0 +1,107 @@
+# benchmarks/bench_pdf_engine.py
+"""
+Benchmarks pdf_engine on synthetic multi-hundred-page PDFs against the old sequential
+`text += page.extract_text()` loop: total time, time to first page and per-page timing.
+
+    python benchmarks/bench_pdf_engine.py [--pages 100 300 600] [--workers 4]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ("algorithm array binary cache compiler database entropy function graph hash index kernel lambda matrix "
+         "network object pointer query recursion stack thread vector").split()
+
+
+def synthetic_pdf(page_count, lines_per_page=45, seed=0):
+    """Builds a valid PDF of page_count text pages (Helvetica, ~12 words per line) without any PDF library."""
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page_number in range(1, page_count + 1):
+        lines = [f"Page {page_number}"] + [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(lines_per_page)]
+        body = "BT /F1 10 Tf 50 760 Td 14 TL " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        stream = body.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 3 0 R >> >> >>" % content_id)
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % kid for kid in kids), page_count)
+
+    out = BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, obj))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def old_extract(data):
+    from PyPDF2 import PdfReader
+
+    pdf, text = PdfReader(BytesIO(data)), ""
+    for page in pdf.pages:
+        text += page.extract_text() or ""
+    return text
+
+
+def run_engine(data):
+    import pdf_engine
+
+    stats = pdf_engine.ExtractionStats()
+    started = time.perf_counter()
+    first_page = None
+    pages = []
+    for page in pdf_engine.iter_pages(data, stats):
+        if first_page is None:
+            first_page = time.perf_counter() - started
+        pages.append(page.text)
+    return time.perf_counter() - started, first_page, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 300, 600])
+    parser.add_argument("--workers", type=int, default=None, help="PDF_WORKERS for the parallel run")
+    args = parser.parse_args()
+    if args.workers:
+        os.environ["PDF_WORKERS"] = str(args.workers)
+
+    from config import Config
+
+    workers = Config.PDF_WORKERS
+    print(f"parallel runs use {workers} worker processes, {Config.PDF_PAGES_PER_TASK} pages per task")
+    # Pay the one-off pool start-up before timing anything.
+    run_engine(synthetic_pdf(Config.PDF_PARALLEL_MIN_PAGES))
+
+    print(f"{'pages':>6} {'MB':>6} {'old loop':>9} {'in-process':>11} {'pool':>7} {'speed-up':>9} {'1st page':>9} {'mean/page':>10}  slowest pages")
+    for page_count in args.pages:
+        data = synthetic_pdf(page_count)
+        started = time.perf_counter()
+        old_extract(data)
+        old_seconds = time.perf_counter() - started
+
+        Config.PDF_WORKERS = 1
+        local_seconds, _, _ = run_engine(data)
+        Config.PDF_WORKERS = workers
+        pool_seconds, first_page, stats = run_engine(data)
+        summary = stats.as_dict()
+        slowest = ", ".join(f"p{number} {seconds * 1000:.0f}ms" for number, seconds in summary["slowest_pages"])
+        print(f"{page_count:>6} {len(data) / 1e6:>6.2f} {old_seconds:>8.2f}s {local_seconds:>10.2f}s {pool_seconds:>6.2f}s "
+              f"{old_seconds / pool_seconds:>8.1f}x {first_page * 1000:>7.0f}ms {summary['mean_page_ms']:>8.1f}ms  {slowest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# benchmarks/bench_sqlite_writers.py
+"""
+Many users writing at once (quiz results, card reviews, roadmap toggles) while others load their dashboards,
+against SQLite with its default settings and with the profile from database.make_engine: write throughput,
+commit latency and "database is locked" errors.
+
+    python benchmarks/bench_sqlite_writers.py [--writers 16] [--readers 4] [--writes 50]
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import (
+    Base, Flashcard, FlashcardDeck, QuizResult, RoadmapItem, StudyRoadmap, User, make_engine, sqlite_pragmas,
+)
+
+USERS = 50
+
+
+def seed(Session):
+    db = Session()
+    for u in range(USERS):
+        user = User(username=f"user{u}", hashed_password="x")
+        db.add(user)
+        db.flush()
+        deck = FlashcardDeck(topic_name="Deck", user_id=user.id)
+        roadmap = StudyRoadmap(topic="Topic", user_id=user.id)
+        db.add_all([deck, roadmap])
+        db.flush()
+        db.add_all([Flashcard(front=f"Q{i}", back=f"A{i}", deck_id=deck.id) for i in range(20)])
+        db.add_all([RoadmapItem(sub_topic=f"Step {i}", day_number=i, roadmap_id=roadmap.id) for i in range(10)])
+    db.commit()
+    db.close()
+
+
+def writer(Session, writes, latencies, errors, seed_value):
+    rng = random.Random(seed_value)
+    for _ in range(writes):
+        user_id = rng.randrange(1, USERS + 1)
+        started = time.perf_counter()
+        db = Session()
+        try:
+            action = rng.random()
+            if action < 0.4:
+                db.add(QuizResult(topic_name="Topic", score=rng.randint(0, 10), total_questions=10,
+                                  is_passed=rng.randint(0, 1), user_id=user_id))
+            elif action < 0.8:
+                card = db.query(Flashcard).join(FlashcardDeck).filter(FlashcardDeck.user_id == user_id).first()
+                card.repetitions = (card.repetitions or 0) + 1
+                card.next_review_date = datetime.date.today() + datetime.timedelta(days=rng.randint(1, 10))
+            else:
+                item = db.query(RoadmapItem).join(StudyRoadmap).filter(StudyRoadmap.user_id == user_id).first()
+                item.is_completed = not item.is_completed
+            db.commit()
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:
+            db.rollback()
+            errors.append(1)
+        finally:
+            db.close()
+
+
+def reader(Session, stop, reads, errors):
+    rng = random.Random()
+    while not stop.is_set():
+        db = Session()
+        try:
+            user_id = rng.randrange(1, USERS + 1)
+            db.query(func.count(QuizResult.id)).filter(QuizResult.user_id == user_id).scalar()
+            db.query(QuizResult.topic_name, func.avg(QuizResult.score)).group_by(QuizResult.topic_name).all()
+            db.query(Flashcard).join(FlashcardDeck).filter(FlashcardDeck.user_id == user_id).all()
+            reads.append(1)
+        except OperationalError:
+            errors.append(1)
+        finally:
+            db.close()
+
+
+def run(pragmas, args):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}", pragmas=pragmas)
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine, expire_on_commit=False)
+        seed(Session)
+        latencies, errors, reads, read_errors = [], [], [], []
+        stop = threading.Event()
+        readers = [threading.Thread(target=reader, args=(Session, stop, reads, read_errors)) for _ in range(args.readers)]
+        writers = [threading.Thread(target=writer, args=(Session, args.writes, latencies, errors, i)) for i in range(args.writers)]
+        started = time.perf_counter()
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        seconds = time.perf_counter() - started
+        stop.set()
+        for thread in readers:
+            thread.join()
+        engine.dispose()
+    latencies.sort()
+    p95 = latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0
+    return {"commits/s": len(latencies) / seconds, "p50 ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+            "p95 ms": p95 * 1000, "locked": len(errors) + len(read_errors), "reads/s": len(reads) / seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=50, help="commits per writer")
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers x {args.writes} commits, {args.readers} dashboard readers")
+    print(f"{'profile':>10} {'commits/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'locked':>7} {'reads/s':>8}")
+    # "default" is what the app used before: rollback journal, synchronous=FULL, the driver's 5s busy timeout
+    for name, pragmas in (("default", {}), ("tuned", sqlite_pragmas())):
+        result = run(pragmas, args)
+        print(f"{name:>10} {result['commits/s']:>10.0f} {result['p50 ms']:>8.1f} {result['p95 ms']:>8.1f} "
+              f"{result['locked']:>7} {result['reads/s']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# benchmarks/bench_study_pack.py
+"""
+Compares taking one text through Summarize, Quiz and Flashcards as three separate requests with
+generating the same artifacts as one study pack: requests sent, input characters and wall-clock time.
+
+    python benchmarks/bench_study_pack.py [--chars 3000 9000 60000] [--seconds-per-1k-chars 0.1]
+
+Uses the offline fake provider; its simulated latency grows with the prompt length, as prefill does.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ["CACHE_ENABLED"] = "false"
+os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "100000")
+os.environ.setdefault("LLM_BURST", "100000")
+os.environ.setdefault("USER_REQUESTS_PER_MINUTE", "100000")
+os.environ.setdefault("USER_BURST", "100000")
+
+WORDS = ("photosynthesis chlorophyll light energy glucose oxygen carbon dioxide stroma thylakoid membrane enzyme "
+         "reaction cycle plant cell water sugar electron transport").split()
+
+
+def synthetic_notes(chars, seed=0):
+    rng = random.Random(seed)
+    sentences = []
+    while sum(len(s) + 1 for s in sentences) < chars:
+        sentences.append(" ".join(rng.choice(WORDS) for _ in range(12)).capitalize() + ".")
+    return " ".join(sentences)[:chars]
+
+
+def counting_provider(seconds_per_1k_chars):
+    from llm_providers import FakeProvider
+
+    class CountingProvider(FakeProvider):
+        """Fake provider that counts requests and input characters, with latency proportional to input size."""
+
+        def __init__(self):
+            super().__init__(latency_seconds=0.2, jitter_seconds=0.0)
+            self.requests = 0
+            self.input_chars = 0
+
+        async def generate(self, prompt, model_name, method):
+            self.requests += 1
+            self.input_chars += len(prompt)
+            await asyncio.sleep(self.latency_seconds + len(prompt) / 1000 * seconds_per_1k_chars)
+            return self.respond(prompt, method)
+
+    return CountingProvider()
+
+
+def measure(flow, seconds_per_1k_chars):
+    from ai_client import AIClient
+
+    provider = counting_provider(seconds_per_1k_chars)
+    client = AIClient(provider=provider)
+    started = time.perf_counter()
+    flow(client)
+    return provider.requests, provider.input_chars, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chars", type=int, nargs="+", default=[3000, 9000, 60000])
+    parser.add_argument("--seconds-per-1k-chars", type=float, default=0.1)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--cards", type=int, default=10)
+    args = parser.parse_args()
+
+    from doc_pipeline import flashcards_for_document, quiz_for_document, study_pack_for_document, summarize_document
+
+    print(f"{'chars':>7} {'flow':>10} {'requests':>9} {'input chars':>12} {'seconds':>8}")
+    for chars in args.chars:
+        text = synthetic_notes(chars)
+
+        def separate(client):
+            # One page after another, as a student goes Summarize -> Quiz -> Flashcards.
+            client.run(summarize_document(client, text))
+            client.run(quiz_for_document(client, text, args.questions))
+            client.run(flashcards_for_document(client, text, args.cards))
+
+        def pack(client):
+            client.run(study_pack_for_document(client, text, args.questions, args.cards))
+
+        results = {name: measure(flow, args.seconds_per_1k_chars) for name, flow in (("separate", separate), ("study pack", pack))}
+        for name, (requests, input_chars, seconds) in results.items():
+            print(f"{chars:>7} {name:>10} {requests:>9} {input_chars:>12,} {seconds:>7.2f}s")
+        (_, old_chars, old_seconds), (_, new_chars, new_seconds) = results.values()
+        print(f"{'':>7} {'ratio':>10} {'':>9} {old_chars / new_chars:>11.1f}x {old_seconds / new_seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,13 @@
 
 # This file stores curated, foundational content for popular learning paths.
 # The content is used to provide a reliable starting point for explanations and quizzes.
+# `python content_packs.py build` turns each module into a prebuilt content pack; "aliases" are the other
+# topic names a student may type for it.
 
 CURATED_MODULES = {
     "SQL Fundamentals": {
         "description": "Learn the basics of Structured Query Language (SQL) to manage and query relational databases.",
+        "aliases": ["SQL", "SQL Basics", "Structured Query Language", "Learn SQL", "Intro to SQL"],
         "content": """
         SQL (Structured Query Language) is the standard language for relational database management systems. 
         It is used to create, read, update, and delete data from databases. Key concepts include:
@@ -20,6 +23,7 @@ CURATED_MODULES = {
     },
     "Data Structures & Algorithms (DSA) Basics": {
         "description": "Understand the fundamental building blocks of efficient software.",
+        "aliases": ["DSA", "Data Structures and Algorithms", "Data Structures & Algorithms", "DSA Basics", "Data Structures", "Algorithms Basics"],
         "content": """
         Data Structures and Algorithms (DSA) are crucial for writing efficient and scalable code.
         - **Data Structures**: Ways of organizing and storing data. Common examples include:
@@ -0,0 +1,178 @@
+# content_packs.py
+import argparse
+import asyncio
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+
+from config import Config
+from content_modules import CURATED_MODULES
+
+# Bump when the pack layout changes; packs of another version are ignored until rebuilt.
+PACK_FORMAT_VERSION = 1
+PACK_SUFFIX = f".v{PACK_FORMAT_VERSION}.json.gz"
+# Inputs longer than this are pasted notes, never a curated topic name.
+MAX_TOPIC_LENGTH = 120
+# "Explain SQL", "what is sql?" and "teach me SQL" all ask for the SQL module.
+_REQUEST_PREFIX = re.compile(r"^(?:please )?(?:explain|what is|what are|teach me|learn|intro to|introduction to|tell me about)\s+(?:the\s+)?")
+
+
+def normalize(text):
+    """Lowercase words only, so "SQL fundamentals!" and "sql  Fundamentals" are the same key."""
+    text = text.lower().replace("&", " and ")
+    return " ".join(re.findall(r"[a-z0-9+#]+", text))
+
+
+def slugify(name):
+    return normalize(name).replace(" ", "-")
+
+
+def source_hash(module):
+    """Fingerprint of a module's curated text; a pack built from older text is treated as stale."""
+    curated = {"description": module.get("description"), "content": module.get("content")}
+    return hashlib.sha256(json.dumps(curated, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def module_keys(name, module):
+    """Normalized names a module answers to: its name, the name without a parenthetical, the acronym inside it, and its aliases."""
+    names = [name, re.sub(r"\s*\(.*?\)", "", name)] + re.findall(r"\((.*?)\)", name) + list(module.get("aliases", []))
+    return {normalize(n) for n in names if normalize(n)}
+
+
+class ContentPack:
+    """Prebuilt explanation, quiz bank, flashcard deck and roadmaps for one curated module."""
+
+    def __init__(self, data):
+        self.module = data["module"]
+        self.explanation = data.get("explanation")
+        self.quiz = data.get("quiz", [])
+        self.flashcards = data.get("flashcards", [])
+        self.roadmaps = data.get("roadmaps", {})
+        self.built_at = data.get("built_at")
+
+    def quiz_items(self, count):
+        """A fresh draw of count questions from the bank, so repeat quizzes differ."""
+        return random.sample(self.quiz, min(count, len(self.quiz)))
+
+    def flashcard_items(self, count):
+        return self.flashcards[:count]
+
+    def roadmap(self, days):
+        return self.roadmaps.get(str(days))
+
+
+class PackLibrary:
+    """
+    Serves content packs from CONTENT_PACK_DIR. Nothing is read until a topic matches a curated module;
+    a matching pack is then decompressed once and kept in memory.
+    """
+
+    def __init__(self, directory=None, modules=None):
+        self.directory = directory or Config.CONTENT_PACK_DIR
+        self.modules = modules if modules is not None else CURATED_MODULES
+        self._keys = {key: name for name, module in self.modules.items() for key in module_keys(name, module)}
+        self._packs = {}
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.directory, slugify(name) + PACK_SUFFIX)
+
+    def match(self, text):
+        """The pack for a curated topic typed as text, or None (also when the pack is not built or is stale)."""
+        if not Config.CONTENT_PACKS_ENABLED or not text or len(text) > MAX_TOPIC_LENGTH:
+            return None
+        key = normalize(text)
+        name = self._keys.get(key) or self._keys.get(_REQUEST_PREFIX.sub("", key))
+        return self.load(name) if name else None
+
+    def load(self, name):
+        with self._lock:
+            if name in self._packs:
+                return self._packs[name]
+        try:
+            with gzip.open(self.path(name), "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("format") != PACK_FORMAT_VERSION or data.get("source_hash") != source_hash(self.modules[name]):
+            return None
+        pack = ContentPack(data)
+        with self._lock:
+            self._packs[name] = pack
+        return pack
+
+
+# --- Build command ---
+async def build_pack(client, name, module, questions, cards, days_options):
+    """Generates every artifact of one module's pack concurrently; quizzes and cards come from the curated text."""
+    content = f"{name}\n{module['description']}\n{module['content']}"
+    explanation, quiz, flashcards, *roadmaps = await asyncio.gather(
+        client.aexplain_topic(name),
+        client.agenerate_quiz_items(content, questions),
+        client.agenerate_flashcard_items(content, cards),
+        *(client.agenerate_roadmap_plan(name, days) for days in days_options),
+    )
+    return {
+        "format": PACK_FORMAT_VERSION,
+        "module": name,
+        "source_hash": source_hash(module),
+        "built_at": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+        "model": client.router.primary_model("explain"),
+        "explanation": explanation,
+        "quiz": quiz,
+        "flashcards": flashcards,
+        "roadmaps": {str(days): plan for days, plan in zip(days_options, roadmaps)},
+    }
+
+
+def write_pack(path, data):
+    """Writes a pack atomically, so a running app never reads a half-written file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = path + ".tmp"
+    with gzip.open(temp_path, "wt", encoding="utf-8", compresslevel=9) as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temp_path, path)
+
+
+def build(names=None, directory=None, questions=None, cards=None, days_options=None, force=False):
+    from ai_client import AIClient
+
+    library = PackLibrary(directory)
+    client = AIClient()
+    for name in names or list(library.modules):
+        module = library.modules[name]
+        path = library.path(name)
+        if not force and library.load(name):
+            print(f"{name}: up to date ({path})")
+            continue
+        data = client.run(build_pack(client, name, module, questions or Config.CONTENT_PACK_QUESTIONS,
+                                     cards or Config.CONTENT_PACK_CARDS, days_options or Config.CONTENT_PACK_ROADMAP_DAYS))
+        write_pack(path, data)
+        print(f"{name}: {len(data['quiz'])} questions, {len(data['flashcards'])} cards, "
+              f"roadmaps for {', '.join(data['roadmaps'])} days -> {path} ({os.path.getsize(path) / 1024:.1f} KB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds the curated content packs served without API calls.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser("build", help="generate packs for CURATED_MODULES (only missing or stale ones unless --force)")
+    build_parser.add_argument("modules", nargs="*", help="module names (default: all)")
+    build_parser.add_argument("--out", help="output directory (default: CONTENT_PACK_DIR)")
+    build_parser.add_argument("--questions", type=int)
+    build_parser.add_argument("--cards", type=int)
+    build_parser.add_argument("--days", type=int, nargs="+")
+    build_parser.add_argument("--force", action="store_true", help="rebuild packs that are up to date")
+    args = parser.parse_args()
+    unknown = [name for name in args.modules if name not in CURATED_MODULES]
+    if unknown:
+        parser.error(f"unknown module(s): {', '.join(unknown)}")
+    build(args.modules, args.out, args.questions, args.cards, args.days, args.force)
+
+
+if __name__ == "__main__":
+    main()
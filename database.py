@@ -1,9 +1,12 @@
 # database.py
 import datetime
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Float, ForeignKey, Text, Date
+from contextlib import contextmanager
+from sqlalchemy import bindparam, event, inspect, make_url, select, text, update, create_engine, Column, Integer, String, DateTime, Boolean, Float, ForeignKey, Text, Date, UniqueConstraint, Index
 from sqlalchemy.orm import sessionmaker, relationship, declarative_base
+from sqlalchemy.pool import StaticPool
+
+from config import Config
 
-DATABASE_URL = "sqlite:///brainstorm_buddy.db"
 Base = declarative_base()
 
 # --- Existing Models ---
@@ -19,6 +22,7 @@ class User(Base):
     roadmaps = relationship("StudyRoadmap", back_populates="user")
     # ADDED RELATIONSHIP FOR QUIZ COLLECTIONS
     quiz_collections = relationship("QuizCollection", back_populates="user")
+    library = relationship("LibraryDocument", back_populates="user", cascade="all, delete-orphan")
 
 class StudyTopic(Base):
     __tablename__ = "study_topics"
@@ -44,11 +48,19 @@ class QuizResult(Base):
 # --- NEW MODELS FOR SAVING QUIZZES ---
 class QuizCollection(Base):
     __tablename__ = "quiz_collections"
+    # Community listings walk these in order (see queries.community_page)
+    __table_args__ = (
+        Index("ix_quiz_collections_public_recent", "is_public", "timestamp", "id"),
+        Index("ix_quiz_collections_public_popular", "is_public", "clone_count", "id"),
+        Index("ix_quiz_collections_creator", "user_id", "is_public", "timestamp"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     topic_name = Column(String, index=True)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
     is_public = Column(Boolean, default=False, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"))
+    # Times other users added it to their collection
+    clone_count = Column(Integer, default=0, server_default="0", nullable=False)
     
     user = relationship("User", back_populates="quiz_collections")
     questions = relationship("QuizQuestion", back_populates="collection", cascade="all, delete-orphan")
@@ -60,18 +72,24 @@ class QuizQuestion(Base):
     # Storing options as a JSON string
     options = Column(Text, nullable=False) 
     correct_answer = Column(String, nullable=False)
-    collection_id = Column(Integer, ForeignKey("quiz_collections.id"))
+    collection_id = Column(Integer, ForeignKey("quiz_collections.id"), index=True)
     
     collection = relationship("QuizCollection", back_populates="questions")
 # ----------------------------------------
 
 class FlashcardDeck(Base):
     __tablename__ = "flashcard_decks"
+    __table_args__ = (
+        Index("ix_flashcard_decks_public_recent", "is_public", "timestamp", "id"),
+        Index("ix_flashcard_decks_public_popular", "is_public", "clone_count", "id"),
+        Index("ix_flashcard_decks_creator", "user_id", "is_public", "timestamp"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     topic_name = Column(String, index=True)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
     is_public = Column(Boolean, default=False, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"))
+    clone_count = Column(Integer, default=0, server_default="0", nullable=False)
     
     user = relationship("User", back_populates="decks")
     cards = relationship("Flashcard", back_populates="deck", cascade="all, delete-orphan")
@@ -85,7 +103,7 @@ class Flashcard(Base):
     interval = Column(Integer, default=1)
     ease_factor = Column(Float, default=2.5)
     repetitions = Column(Integer, default=0)
-    deck_id = Column(Integer, ForeignKey("flashcard_decks.id"))
+    deck_id = Column(Integer, ForeignKey("flashcard_decks.id"), index=True)
     
     deck = relationship("FlashcardDeck", back_populates="cards")
 
@@ -119,36 +137,237 @@ class RoadmapProject(Base):
     
     roadmap = relationship("StudyRoadmap", back_populates="project")
 
+# --- KNOWLEDGE GRAPH ---
+# Concepts and relations extracted from the documents a user studies (see knowledge_graph), merged per user.
 class KnowledgeNode(Base):
     __tablename__ = 'knowledge_nodes'
+    __table_args__ = (Index("uq_knowledge_nodes_user_label_key", "user_id", "label_key", unique=True),)
     id = Column(Integer, primary_key=True, index=True)
-    label = Column(String, unique=True, nullable=False)
-    user_id = Column(Integer, ForeignKey('users.id'))
+    label = Column(String, nullable=False)
+    # label.lower(), so concepts are matched case-insensitively on the unique (user_id, label_key) index
+    label_key = Column(String, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    # Number of analyzed documents that mentioned the concept
+    mentions = Column(Integer, default=1, nullable=False)
 
     source_edges = relationship("KnowledgeEdge", foreign_keys="[KnowledgeEdge.source_id]", back_populates="source_node", cascade="all, delete-orphan")
     target_edges = relationship("KnowledgeEdge", foreign_keys="[KnowledgeEdge.target_id]", back_populates="target_node", cascade="all, delete-orphan")
 
 class KnowledgeEdge(Base):
     __tablename__ = 'knowledge_edges'
+    __table_args__ = (UniqueConstraint("source_id", "target_id", "label", name="uq_knowledge_edges_relation"),)
     id = Column(Integer, primary_key=True, index=True)
+    # Denormalized from the nodes so a user's whole graph loads with one indexed query
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
     source_id = Column(Integer, ForeignKey('knowledge_nodes.id'), nullable=False)
     target_id = Column(Integer, ForeignKey('knowledge_nodes.id'), nullable=False)
-    label = Column(String, nullable=False) 
+    label = Column(String, nullable=False, default="")
+    mentions = Column(Integer, default=1, nullable=False)
 
     source_node = relationship("KnowledgeNode", foreign_keys=[source_id], back_populates="source_edges")
     target_node = relationship("KnowledgeNode", foreign_keys=[target_id], back_populates="target_edges")
 
+class KnowledgeSource(Base):
+    """A text already merged into a user's graph, so studying it again does not count its concepts twice."""
+    __tablename__ = 'knowledge_sources'
+    __table_args__ = (UniqueConstraint("user_id", "content_hash", name="uq_knowledge_sources_user_hash"),)
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+# --- PREREQUISITE GRAPH ---
+# Topics and the prerequisites the model named for them (see prerequisites); shared by all users.
+class PrerequisiteTopic(Base):
+    __tablename__ = 'prerequisite_topics'
+    id = Column(Integer, primary_key=True, index=True)
+    # Normalized name (content_packs.normalize), so "Linked Lists" and "linked lists" are one topic
+    key = Column(String, unique=True, index=True, nullable=False)
+    name = Column(String, nullable=False)
+    # Set once the topic's own prerequisites have been asked for; NULL for topics only seen as a prerequisite
+    expanded_at = Column(DateTime)
+
+class PrerequisiteEdge(Base):
+    __tablename__ = 'prerequisite_edges'
+    __table_args__ = (UniqueConstraint("topic_id", "prerequisite_id", name="uq_prerequisite_edges_pair"),)
+    id = Column(Integer, primary_key=True, index=True)
+    topic_id = Column(Integer, ForeignKey('prerequisite_topics.id'), nullable=False, index=True)
+    prerequisite_id = Column(Integer, ForeignKey('prerequisite_topics.id'), nullable=False)
+
+
+# --- DOCUMENT LIBRARY ---
+# Extracted text is stored once per distinct file content and shared by every user who uploads it.
+class Document(Base):
+    __tablename__ = "documents"
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, index=True, nullable=False)
+    mime_type = Column(String)
+    size_bytes = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    # JSON list of the offset in `text` where each page starts; NULL for files without pages
+    page_offsets = Column(Text)
+    page_count = Column(Integer, default=1, nullable=False)
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+
+    library_entries = relationship("LibraryDocument", back_populates="document")
+
+class LibraryDocument(Base):
+    __tablename__ = "library_documents"
+    __table_args__ = (UniqueConstraint("user_id", "document_id", name="uq_library_user_document"),)
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String, nullable=False)
+    last_used = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+
+    user = relationship("User", back_populates="library")
+    document = relationship("Document", back_populates="library_entries")
+
+
+# --- STUDY PACKS ---
+# Summary, quiz and flashcards generated together for one text (see study_packs), served to all three pages.
+class StudyPack(Base):
+    __tablename__ = "study_packs"
+    id = Column(Integer, primary_key=True, index=True)
+    # sha256 of the text the pack was generated from
+    content_hash = Column(String(64), unique=True, index=True, nullable=False)
+    title = Column(String)
+    summary = Column(Text, nullable=False)
+    # JSON lists in the same shape as the quiz and flashcard pages use
+    quiz = Column(Text, nullable=False)
+    flashcards = Column(Text, nullable=False)
+    num_questions = Column(Integer, nullable=False)
+    num_cards = Column(Integer, nullable=False)
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+# --- GENERATION JOBS ---
+# Long AI generations run in the background (see jobs); pages poll their job instead of blocking.
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+    __table_args__ = (Index("ix_generation_jobs_user_page", "user_id", "page"),)
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Registered job kind (jobs.JOB_KINDS) and the page that started it
+    kind = Column(String, nullable=False)
+    page = Column(String, nullable=False)
+    # queued, running, done, failed or cancelled
+    status = Column(String, default="queued", nullable=False, index=True)
+    params = Column(Text, nullable=False)  # JSON
+    result = Column(Text)  # JSON, once done
+    error = Column(String)
+    # Set once the page has shown the result (or the failure) to the user
+    delivered = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    # The JobRunner running the job and when it last said so (see jobs.JobRunner)
+    owner = Column(String)
+    heartbeat_at = Column(DateTime)
+
 
 # --- Database Engine and Session ---
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def sqlite_pragmas():
+    """The per-connection SQLite settings from Config, in the order they are applied."""
+    return {
+        "journal_mode": Config.SQLITE_JOURNAL_MODE,
+        "synchronous": Config.SQLITE_SYNCHRONOUS,
+        "busy_timeout": Config.SQLITE_BUSY_TIMEOUT_MS,
+        "cache_size": -Config.SQLITE_CACHE_SIZE_KB,  # negative means KiB rather than pages
+        "mmap_size": Config.SQLITE_MMAP_SIZE_MB * 1024 * 1024,
+        "temp_store": "MEMORY",
+    }
+
+def make_engine(url=None, pragmas=None):
+    """
+    Creates the engine for url (default Config.DATABASE_URL). SQLite files get `pragmas` (default
+    sqlite_pragmas()) on every new connection and an in-memory database a single shared connection;
+    server databases get a connection pool sized by the DB_POOL_* settings.
+    """
+    url = make_url(url or Config.DATABASE_URL)
+    pool = dict(pool_size=Config.DB_POOL_SIZE, max_overflow=Config.DB_MAX_OVERFLOW,
+                pool_timeout=Config.DB_POOL_TIMEOUT, pool_recycle=Config.DB_POOL_RECYCLE)
+    if url.get_backend_name() != "sqlite":
+        return create_engine(url, pool_pre_ping=True, **pool)
+    if url.database in (None, "", ":memory:"):
+        return create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+    engine = create_engine(url, connect_args={"check_same_thread": False}, **pool)
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return engine
+
+engine = make_engine()
+# Objects stay readable after commit and after their session closes (e.g. the logged-in User kept in st.session_state)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 def init_db():
+    _drop_legacy_knowledge_tables()
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _fill_knowledge_label_keys()
+    _create_missing_indexes()
 
-def get_db():
+def _add_missing_columns():
+    """create_all never alters existing tables; this adds columns declared later, with their server default if any."""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}" + ("" if column.nullable else " NOT NULL")
+                connection.execute(text(ddl))
+
+def _fill_knowledge_label_keys():
+    """Sets label_key on concepts stored before the column existed (Python's lower(), as knowledge_graph uses)."""
+    with engine.begin() as connection:
+        rows = connection.execute(select(KnowledgeNode.id, KnowledgeNode.label).where(KnowledgeNode.label_key.is_(None))).all()
+        if rows:
+            connection.execute(update(KnowledgeNode).where(KnowledgeNode.id == bindparam("node_id"))
+                               .values(label_key=bindparam("key")), [{"node_id": node_id, "key": label.lower()} for node_id, label in rows])
+
+def _create_missing_indexes():
+    """create_all only indexes tables it creates; this adds indexes declared later to tables that already exist."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+def _drop_legacy_knowledge_tables():
+    """
+    The first knowledge graph tables made labels unique across all users and were never written to;
+    drop them so create_all rebuilds them with per-user uniqueness.
+    """
+    inspector = inspect(engine)
+    if inspector.has_table("knowledge_edges") and "user_id" not in {c["name"] for c in inspector.get_columns("knowledge_edges")}:
+        KnowledgeEdge.__table__.drop(bind=engine)
+        KnowledgeNode.__table__.drop(bind=engine, checkfirst=True)
+
+@contextmanager
+def session_scope():
+    """A session for one unit of work, such as one Streamlit script run: rolled back if it raises, always closed."""
     db = SessionLocal()
     try:
         yield db
+    except BaseException:
+        db.rollback()
+        raise
     finally:
         db.close()
+
+def get_db():
+    with session_scope() as db:
+        yield db
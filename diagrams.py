@@ -0,0 +1,209 @@
+# diagrams.py
+import collections
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+
+class DiagramError(ValueError):
+    """The DOT source was rejected, or Graphviz could not lay it out in time."""
+
+
+class GraphvizNotInstalledError(DiagramError):
+    """No `dot` executable was found; callers can fall back to rendering in the browser."""
+
+
+# --- Validation ---
+_HEADER = re.compile(r"^\s*(?:strict\s+)?(digraph|graph)\b[^{]*\{", re.I)
+_FENCE = re.compile(r"^\s*```(?:dot|graphviz)?\s*|\s*```\s*$", re.I)
+# Attributes that make Graphviz read local files or emit links; model output never needs them.
+_FORBIDDEN_ATTRIBUTES = re.compile(r"\b(image|imagepath|shapefile|fontpath|fontnames|href|url|target)\s*=", re.I)
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"')
+
+
+def validate_dot(dot, max_chars=None, max_edges=None):
+    """
+    Returns the DOT source cleaned of markdown fences, or raises DiagramError if it is not a single
+    graph/digraph with balanced braces, is too large, or uses attributes that touch the file system.
+    """
+    max_chars = max_chars or Config.DIAGRAM_MAX_DOT_CHARS
+    max_edges = max_edges or Config.DIAGRAM_MAX_EDGES
+    dot = _FENCE.sub("", (dot or "").strip()).strip()
+    if not dot:
+        raise DiagramError("The diagram is empty.")
+    if len(dot) > max_chars:
+        raise DiagramError(f"The diagram is too large ({len(dot)} characters; the limit is {max_chars}).")
+    header = _HEADER.match(dot)
+    if not header:
+        raise DiagramError("The diagram is not a Graphviz graph or digraph.")
+
+    # Structure is checked with quoted labels blanked out, so braces or arrows inside labels don't count.
+    bare = _STRING.sub('""', dot)
+    if bare.count('"') % 2:
+        raise DiagramError("The diagram has an unterminated string.")
+    depth = 0
+    for position, char in enumerate(bare):
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth < 0 or (depth == 0 and bare[position + 1:].strip()):
+                raise DiagramError("The diagram's braces are unbalanced.")
+    if depth:
+        raise DiagramError("The diagram's braces are unbalanced.")
+    if _FORBIDDEN_ATTRIBUTES.search(bare):
+        raise DiagramError("The diagram uses attributes that are not allowed (images, file paths or links).")
+    directed = header.group(1).lower() == "digraph"
+    if ("--" if directed else "->") in bare:
+        raise DiagramError(f"The diagram mixes edge styles: a {header.group(1)} must use {'->' if directed else '--'}.")
+    edges = bare.count("->") + bare.count("--")
+    if edges > max_edges:
+        raise DiagramError(f"The diagram has too many edges ({edges}; the limit is {max_edges}).")
+    return dot
+
+
+def dot_key(dot, engine="dot"):
+    return hashlib.sha256(f"{engine}\n{dot}".encode("utf-8")).hexdigest()
+
+
+# --- Rendering ---
+class RenderResult:
+    """An SVG document and whether it came from the cache; seconds is the layout time (0 on a hit)."""
+
+    __slots__ = ("svg", "cached", "seconds")
+
+    def __init__(self, svg, cached, seconds):
+        self.svg = svg
+        self.cached = cached
+        self.seconds = seconds
+
+
+class DiagramRenderer:
+    """
+    Lays out DOT as SVG with the Graphviz `dot` executable. At most DIAGRAM_WORKERS layouts run at once,
+    each killed after DIAGRAM_TIMEOUT_SECONDS, and at most DIAGRAM_MAX_QUEUE wait, so a pathological graph
+    or a burst of them cannot stall the app. Output is cached on disk by DOT hash; sources that failed
+    are remembered so they are not laid out again.
+    """
+
+    def __init__(self, cache_dir=None, workers=None, timeout=None, executable=None):
+        self.cache_dir = cache_dir or Config.DIAGRAM_CACHE_DIR
+        self.timeout = timeout or Config.DIAGRAM_TIMEOUT_SECONDS
+        self.executable = shutil.which(executable or Config.GRAPHVIZ_DOT)
+        self._pool = ThreadPoolExecutor(max_workers=workers or Config.DIAGRAM_WORKERS, thread_name_prefix="graphviz")
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._failures = collections.OrderedDict()
+        self._timings = collections.deque(maxlen=500)
+        self._counts = {"renders": 0, "memory_hits": 0, "disk_hits": 0, "coalesced": 0, "failures": 0, "timeouts": 0, "rejected_busy": 0}
+        self._memory = collections.OrderedDict()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @property
+    def available(self):
+        return self.executable is not None
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.svg")
+
+    def _remember(self, key, svg):
+        self._memory[key] = svg
+        self._memory.move_to_end(key)
+        while len(self._memory) > Config.DIAGRAM_MEMORY_ITEMS:
+            self._memory.popitem(last=False)
+
+    def render(self, dot):
+        """Validates dot and returns a RenderResult; raises DiagramError (GraphvizNotInstalledError without Graphviz)."""
+        dot = validate_dot(dot)
+        key = dot_key(dot)
+        with self._lock:
+            if key in self._memory:
+                self._counts["memory_hits"] += 1
+                self._memory.move_to_end(key)
+                return RenderResult(self._memory[key], True, 0.0)
+            if key in self._failures:
+                raise DiagramError(self._failures[key])
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                svg = f.read()
+            with self._lock:
+                self._counts["disk_hits"] += 1
+                self._remember(key, svg)
+            return RenderResult(svg, True, 0.0)
+        except OSError:
+            pass
+        if not self.available:
+            raise GraphvizNotInstalledError("Graphviz is not installed on the server.")
+
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                # The same diagram is already being laid out for another session; share that layout.
+                self._counts["coalesced"] += 1
+            else:
+                if len(self._inflight) >= Config.DIAGRAM_MAX_QUEUE:
+                    self._counts["rejected_busy"] += 1
+                    raise DiagramError("The diagram renderer is busy. Please try again in a moment.")
+                future = self._inflight[key] = self._pool.submit(self._layout, key, dot)
+                future.add_done_callback(lambda _: self._done(key))
+        return future.result()
+
+    def _done(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def _fail(self, key, message, counter):
+        with self._lock:
+            self._counts[counter] += 1
+            self._failures[key] = message
+            while len(self._failures) > 256:
+                self._failures.popitem(last=False)
+        raise DiagramError(message)
+
+    def _layout(self, key, dot):
+        started = time.perf_counter()
+        try:
+            completed = subprocess.run([self.executable, "-Tsvg"], input=dot.encode("utf-8"), capture_output=True,
+                                       timeout=self.timeout, check=False)
+        except subprocess.TimeoutExpired:
+            self._fail(key, f"The diagram took longer than {self.timeout:g}s to lay out.", "timeouts")
+        seconds = time.perf_counter() - started
+        if completed.returncode != 0 or not completed.stdout:
+            error = completed.stderr.decode("utf-8", "replace").strip().splitlines()
+            self._fail(key, f"Graphviz could not draw the diagram: {error[0] if error else 'no output'}", "failures")
+        svg = completed.stdout.decode("utf-8", "replace")
+
+        # Write to a temporary name first so a reader never sees a half-written file.
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(svg)
+        os.replace(temp_path, self._path(key))
+        with self._lock:
+            self._counts["renders"] += 1
+            self._timings.append(seconds)
+            self._remember(key, svg)
+        return RenderResult(svg, False, seconds)
+
+    def stats(self):
+        """Cache hits, layouts, failures and layout-time percentiles (seconds) over the recent layouts."""
+        with self._lock:
+            stats = dict(self._counts)
+            timings = sorted(self._timings)
+        if timings:
+            pick = lambda q: round(timings[min(len(timings) - 1, int(q * len(timings)))], 4)
+            stats.update(layout_p50=pick(0.5), layout_p95=pick(0.95), layout_max=round(timings[-1], 4))
+        return stats
+
+
+def inline_svg(svg):
+    """Strips the XML prolog and doctype Graphviz emits, so the SVG can be embedded in HTML."""
+    start = svg.find("<svg")
+    return svg[start:] if start != -1 else svg
@@ -0,0 +1,263 @@
+# doc_pipeline.py
+import asyncio
+import math
+import re
+import threading
+
+from config import Config
+from fair_scheduler import current_user, quota_prepaid
+from resilience import AIClientError, InvalidResponseError
+
+
+class PipelineProgress:
+    """
+    Progress of one document job. The job updates it on AIClient's event loop while the page's
+    script thread polls snapshot() to draw a progress bar.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage = "Preparing"
+        self.done = 0
+        self.total = 0
+
+    def start(self, stage, total):
+        with self._lock:
+            self.stage, self.done, self.total = stage, 0, total
+
+    def advance(self):
+        with self._lock:
+            self.done += 1
+
+    def snapshot(self):
+        with self._lock:
+            return self.stage, self.done, self.total
+
+
+def chunk_spans(text, chunk_chars=None, overlap=None):
+    """
+    Returns (start, end) offsets of chunks of at most chunk_chars, cut at paragraph, line, sentence or
+    word boundaries, with about `overlap` characters repeated between neighbours so no idea is cut in half.
+    """
+    chunk_chars = chunk_chars or Config.DOC_CHUNK_CHARS
+    overlap = overlap if overlap is not None else Config.DOC_CHUNK_OVERLAP
+    spans, start = [], 0
+    while start < len(text):
+        end = min(start + chunk_chars, len(text))
+        if end < len(text):
+            # Only look for a boundary in the last fifth of the window so chunks stay close to full size.
+            window_start = start + int(chunk_chars * 0.8)
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = text.rfind(separator, window_start, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        if text[start:end].strip():
+            spans.append((start, end))
+        if end >= len(text):
+            break
+        next_start = max(end - overlap, start + 1)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return spans
+
+
+def split_into_chunks(text, chunk_chars=None, overlap=None):
+    """Splits text into overlapping chunks (see chunk_spans); text that fits one chunk is returned whole."""
+    text = text.strip()
+    if len(text) <= (chunk_chars or Config.DOC_CHUNK_CHARS):
+        return [text] if text else []
+    return [text[start:end].strip() for start, end in chunk_spans(text, chunk_chars, overlap)]
+
+
+async def _map(coros, progress):
+    """Runs the per-chunk calls concurrently, ticking progress as each one finishes; failed chunks become None."""
+
+    async def tracked(coro):
+        try:
+            return await coro
+        except AIClientError as e:
+            return e
+        finally:
+            if progress:
+                progress.advance()
+
+    results = await asyncio.gather(*(tracked(coro) for coro in coros))
+    errors = [result for result in results if isinstance(result, AIClientError)]
+    if len(errors) == len(results):
+        raise errors[0]
+    return [None if isinstance(result, AIClientError) else result for result in results]
+
+
+def _prepay_quota(client):
+    """Charges one request for the whole job, so its many chunk calls are not rejected one by one."""
+    client.scheduler.check_quota(current_user.get())
+    quota_prepaid.set(True)
+
+
+async def _done(value):
+    return value
+
+
+# --- Summaries ---
+async def summarize_document(client, text, progress=None):
+    """Summarizes text of any length: one call for short text, map-reduce over chunks otherwise."""
+    if len(text) <= Config.MAX_TEXT_LENGTH:
+        return await client.asummarize_notes(text)
+    _prepay_quota(client)
+    chunks = split_into_chunks(text)
+    if progress:
+        progress.start("Summarizing sections", len(chunks))
+    summaries = [s for s in await _map([client.asummarize_notes(chunk) for chunk in chunks], progress) if s]
+    return await _merge_summaries(client, summaries, progress)
+
+
+async def _merge_summaries(client, summaries, progress):
+    """Merges per-section summaries in batches that fit one request until a single summary remains."""
+    level = 1
+    while len(summaries) > 1:
+        batches, batch, size = [], [], 0
+        for summary in summaries:
+            if batch and size + len(summary) > Config.DOC_CHUNK_CHARS:
+                batches.append(batch)
+                batch, size = [], 0
+            batch.append(summary)
+            size += len(summary)
+        batches.append(batch)
+        if len(batches) == len(summaries):
+            # Every summary is already chunk-sized; merge pairs so the reduction still converges.
+            batches = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+        if progress:
+            progress.start(f"Merging summaries (round {level})", len(batches))
+        merged = await _map([client.amerge_summaries(b) if len(b) > 1 else _done(b[0]) for b in batches], progress)
+        summaries = [s for s in merged if s]
+        level += 1
+    if not summaries:
+        raise InvalidResponseError("AI returned an empty summary for every section. Please try again.")
+    return summaries[0]
+
+
+# --- Quizzes and flashcards ---
+def _words(text):
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def _near_duplicate(words, seen, threshold=0.7):
+    for other in seen:
+        union = words | other
+        if union and len(words & other) / len(union) >= threshold:
+            return True
+    return False
+
+
+def _plan_indices(chunk_count, count):
+    """
+    Indices of the chunks to generate from and how many items to ask each for. Long documents get one item
+    per chunk from as many chunks as items wanted, each taken from the middle of an equal share of the
+    document, so the picks reach from the first pages to the last.
+    """
+    if count < 1:
+        raise ValueError(f"Cannot plan {count} items; ask for at least one.")
+    wanted = math.ceil(count * Config.DOC_OVERGENERATE_RATIO)
+    per_chunk = max(1, math.ceil(wanted / chunk_count))
+    used = min(chunk_count, math.ceil(wanted / per_chunk))
+    step = chunk_count / used
+    return [int((i + 0.5) * step) for i in range(used)], per_chunk
+
+
+def _plan(chunks, count):
+    indices, per_chunk = _plan_indices(len(chunks), count)
+    return [chunks[i] for i in indices], per_chunk
+
+
+def _select(per_chunk_items, count, identity):
+    """
+    Round-robin over chunks (keeps coverage of the whole document), skipping near-duplicate items;
+    near-duplicates only fill the set if there are not enough distinct items.
+    """
+    selected, seen, skipped = [], [], []
+    queues = [list(items) for items in per_chunk_items if items]
+    while queues and len(selected) < count:
+        for items in list(queues):
+            if not items:
+                queues.remove(items)
+                continue
+            item = items.pop(0)
+            words = _words(identity(item))
+            if _near_duplicate(words, seen):
+                skipped.append(item)
+                continue
+            seen.append(words)
+            selected.append(item)
+            if len(selected) == count:
+                break
+    exact = {identity(item).lower() for item in selected}
+    for item in skipped:
+        if len(selected) == count:
+            break
+        if identity(item).lower() not in exact:
+            exact.add(identity(item).lower())
+            selected.append(item)
+    return selected
+
+
+def _select_some(per_chunk_items, count, identity, what):
+    """_select, but an empty selection (every chunk came back without usable items) is an invalid response."""
+    selected = _select(per_chunk_items, count, identity)
+    if not selected:
+        raise InvalidResponseError(f"AI returned no usable {what} for this document. Please try again.")
+    return selected
+
+
+async def _items_for_document(client, text, count, generate, identity, what, stage, progress):
+    if len(text) <= Config.MAX_TEXT_LENGTH:
+        return await generate(text, count)
+    _prepay_quota(client)
+    chunks, per_chunk = _plan(split_into_chunks(text), count)
+    if progress:
+        progress.start(stage, len(chunks))
+    results = await _map([generate(chunk, per_chunk) for chunk in chunks], progress)
+    return _select_some(results, count, identity, what)
+
+
+async def quiz_for_document(client, text, num_questions, progress=None):
+    """A quiz of num_questions drawn from the whole document, deduplicated across chunks."""
+    return await _items_for_document(client, text, num_questions, client.agenerate_quiz_items,
+                                     lambda q: q["question"], "questions", "Writing questions", progress)
+
+
+async def flashcards_for_document(client, text, num_cards, progress=None):
+    """num_cards flashcards drawn from the whole document, deduplicated across chunks."""
+    return await _items_for_document(client, text, num_cards, client.agenerate_flashcard_items,
+                                     lambda c: c["front"], "flashcards", "Writing flashcards", progress)
+
+
+# --- Study packs ---
+async def study_pack_for_document(client, text, num_questions, num_cards, progress=None):
+    """
+    Summary, quiz and flashcards for text of any length. Short text takes a single request; long text takes
+    one pack request per chunk (instead of one per chunk and artifact), then merges the summaries and selects
+    the questions and cards as the single-artifact pipelines do. Returns {"title", "summary", "quiz", "flashcards"}.
+    """
+    if len(text) <= Config.MAX_TEXT_LENGTH:
+        return await client.agenerate_study_pack(text, num_questions, num_cards)
+    _prepay_quota(client)
+    chunks = split_into_chunks(text)
+    quiz_chunks, questions_per_chunk = _plan_indices(len(chunks), num_questions)
+    card_chunks, cards_per_chunk = _plan_indices(len(chunks), num_cards)
+    quiz_chunks, card_chunks = set(quiz_chunks), set(card_chunks)
+    if progress:
+        progress.start("Reading sections", len(chunks))
+    packs = await _map([
+        client.agenerate_study_pack(chunk, questions_per_chunk if i in quiz_chunks else 0,
+                                    cards_per_chunk if i in card_chunks else 0, include_title=False, repair=False)
+        for i, chunk in enumerate(chunks)
+    ], progress)
+    packs = [pack for pack in packs if pack]
+    summaries = [pack["summary"] for pack in packs if pack["summary"]]
+    if not summaries:
+        raise InvalidResponseError("AI returned an invalid study pack format. Please try again.")
+    quiz = _select_some([pack["quiz"] for pack in packs], num_questions, lambda q: q["question"], "questions")
+    flashcards = _select_some([pack["flashcards"] for pack in packs], num_cards, lambda c: c["front"], "flashcards")
+    summary, title = await asyncio.gather(_merge_summaries(client, summaries, progress), client.agenerate_topic_title(text))
+    return {"title": title, "summary": summary, "quiz": quiz, "flashcards": flashcards}
@@ -0,0 +1,113 @@
+# document_library.py
+import datetime
+import hashlib
+import json
+
+from sqlalchemy.exc import IntegrityError
+
+import pdf_engine
+from database import Document, LibraryDocument
+
+PDF_MIME_TYPE = "application/pdf"
+# Pages are joined with a blank line so words at page boundaries are not glued together.
+PAGE_SEPARATOR = "\n\n"
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def extract_pages(data, mime_type, on_page=None):
+    """
+    Returns (pages, has_page_numbers) for a file's bytes: the text of each PDF page, or the whole
+    file as one page. Raises ValueError if the file cannot be read as text or exceeds the PDF limits.
+    """
+    if mime_type == PDF_MIME_TYPE:
+        try:
+            return pdf_engine.extract_pages(data, on_page=on_page), True
+        except pdf_engine.PdfLimitError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Could not read the PDF: {e}")
+    try:
+        return [data.decode("utf-8")], False
+    except UnicodeDecodeError:
+        raise ValueError("Could not read the uploaded file as text. Only text-based files and PDFs are fully supported for content extraction.")
+
+
+def get_or_create_document(db, data, mime_type, on_page=None):
+    """Returns the Document for these bytes, extracting the text only the first time the content is seen."""
+    digest = content_hash(data)
+    document = db.query(Document).filter(Document.content_hash == digest).first()
+    if document:
+        return document
+    pages, has_page_numbers = extract_pages(data, mime_type, on_page)
+    offsets, position = [], 0
+    for page in pages:
+        offsets.append(position)
+        position += len(page) + len(PAGE_SEPARATOR)
+    document = Document(
+        content_hash=digest, mime_type=mime_type, size_bytes=len(data), text=PAGE_SEPARATOR.join(pages),
+        page_offsets=json.dumps(offsets) if has_page_numbers else None, page_count=max(len(pages), 1),
+    )
+    db.add(document)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another session stored the same content first; use its row.
+        db.rollback()
+        document = db.query(Document).filter(Document.content_hash == digest).one()
+    return document
+
+
+def add_to_library(db, user_id, document, filename):
+    """Links a document into the user's library (or marks an existing entry as just used)."""
+    entry = db.query(LibraryDocument).filter(
+        LibraryDocument.user_id == user_id, LibraryDocument.document_id == document.id
+    ).first()
+    if entry:
+        entry.last_used = datetime.datetime.utcnow()
+    else:
+        entry = LibraryDocument(user_id=user_id, document_id=document.id, filename=filename)
+        db.add(entry)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+    return entry
+
+
+def store_upload(db, user_id, data, filename, mime_type, on_page=None):
+    """Stores an uploaded file in the user's library and returns its Document; on_page(done, total) reports PDF extraction."""
+    document = get_or_create_document(db, data, mime_type, on_page)
+    add_to_library(db, user_id, document, filename)
+    return document
+
+
+def list_library(db, user_id):
+    """(document_id, filename, page_count, size_bytes) of the user's documents, most recently used first; texts are not loaded."""
+    return db.query(LibraryDocument.document_id, LibraryDocument.filename, Document.page_count, Document.size_bytes) \
+        .join(Document, Document.id == LibraryDocument.document_id) \
+        .filter(LibraryDocument.user_id == user_id) \
+        .order_by(LibraryDocument.last_used.desc()).all()
+
+
+def open_from_library(db, user_id, document_id):
+    """Returns a document from the user's library, or None if it is not in their library."""
+    entry = db.query(LibraryDocument).filter(
+        LibraryDocument.user_id == user_id, LibraryDocument.document_id == document_id
+    ).first()
+    if not entry:
+        return None
+    entry.last_used = datetime.datetime.utcnow()
+    db.commit()
+    return entry.document
+
+
+def document_pages(document):
+    """Splits a document's text back into (pages, has_page_numbers) using the stored page offsets."""
+    if not document.page_offsets:
+        return [document.text], False
+    offsets = json.loads(document.page_offsets)
+    ends = [offset - len(PAGE_SEPARATOR) for offset in offsets[1:]] + [len(document.text)]
+    return [document.text[start:end] for start, end in zip(offsets, ends)], True
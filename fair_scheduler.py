@@ -0,0 +1,154 @@
+# fair_scheduler.py
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+
+from config import Config
+from resilience import UserQuotaExceededError
+
+# The user on whose behalf AIClient coroutines are running; set by AIClient.run()/submit()/stream().
+current_user = contextvars.ContextVar("current_user", default=None)
+# Set by multi-call jobs (e.g. doc_pipeline) that charged the user's quota once for the whole job.
+quota_prepaid = contextvars.ContextVar("quota_prepaid", default=False)
+
+INTERACTIVE, BULK = 0, 1
+
+
+class _Waiter:
+    __slots__ = ("priority", "finish_tag", "seq", "user_id", "future", "enqueued_at")
+
+    def __init__(self, priority, finish_tag, seq, user_id, future):
+        self.priority = priority
+        self.finish_tag = finish_tag
+        self.seq = seq
+        self.user_id = user_id
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.priority, self.finish_tag, self.seq) < (other.priority, other.finish_tag, other.seq)
+
+
+class FairScheduler:
+    """
+    Admission control for upstream LLM calls, shared by every session using one AIClient.
+    - Per-user quota: a token bucket per user; exceeding it raises UserQuotaExceededError.
+    - Weighted fair queuing: when all slots are busy, waiters are ordered by a per-user virtual finish
+      time, so one user's burst of large requests cannot push everyone else to the back.
+    - Priority classes: interactive methods (chat, explanations) are dispatched before bulk generation.
+    Must be used from AIClient's event loop.
+    """
+
+    def __init__(self, capacity=None, user_rate_per_minute=None, user_burst=None, interactive_methods=None,
+                 chars_per_cost_unit=None):
+        self.capacity = capacity or Config.LLM_MAX_CONCURRENCY
+        self.user_rate = (user_rate_per_minute or Config.USER_REQUESTS_PER_MINUTE) / 60.0
+        self.user_burst = user_burst or Config.USER_BURST
+        self.interactive_methods = set(interactive_methods or Config.INTERACTIVE_METHODS)
+        self.chars_per_cost_unit = chars_per_cost_unit or Config.SCHEDULER_CHARS_PER_COST_UNIT
+        self._active = 0
+        self._queue = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish = {}
+        self._weights = {}
+        self._buckets = {}
+        self._avg_service = None
+        self._stats = {"admitted": 0, "queued": 0, "quota_rejected": 0}
+
+    def set_weight(self, user_id, weight):
+        """Gives a user a larger (or smaller) share of the capacity under contention; default 1."""
+        self._weights[user_id] = weight
+
+    def priority_for(self, method):
+        return INTERACTIVE if method in self.interactive_methods else BULK
+
+    def cost_of(self, prompt):
+        """Cost in fair-queuing units: 1 per call plus 1 per chars_per_cost_unit of prompt."""
+        return 1.0 + len(prompt) / self.chars_per_cost_unit
+
+    def check_quota(self, user_id):
+        """Charges one request to the user's token bucket; anonymous (None) callers and prepaid jobs are not limited."""
+        if user_id is None or quota_prepaid.get():
+            return
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(user_id, (self.user_burst, now))
+        tokens = min(self.user_burst, tokens + (now - updated) * self.user_rate)
+        if tokens < 1:
+            self._buckets[user_id] = (tokens, now)
+            self._stats["quota_rejected"] += 1
+            retry_after = (1 - tokens) / self.user_rate
+            raise UserQuotaExceededError(
+                f"You're generating faster than your quota allows. Please wait about {retry_after:.0f}s and try again.",
+                retry_after=retry_after,
+            )
+        self._buckets[user_id] = (tokens - 1, now)
+
+    @asynccontextmanager
+    async def slot(self, method, prompt, user_id=None):
+        """Holds one of the capacity slots for the duration of an upstream call."""
+        user_id = user_id if user_id is not None else current_user.get()
+        if self._active < self.capacity and not self._queue:
+            self._active += 1
+        else:
+            await self._wait_turn(method, prompt, user_id)
+        self._stats["admitted"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._avg_service = elapsed if self._avg_service is None else 0.2 * elapsed + 0.8 * self._avg_service
+            self._release()
+
+    async def _wait_turn(self, method, prompt, user_id):
+        weight = self._weights.get(user_id, 1.0)
+        start_tag = max(self._virtual_time, self._last_finish.get(user_id, 0.0))
+        finish_tag = start_tag + self.cost_of(prompt) / weight
+        self._last_finish[user_id] = finish_tag
+        waiter = _Waiter(self.priority_for(method), finish_tag, next(self._seq), user_id,
+                         asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, waiter)
+        self._stats["queued"] += 1
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was handed to us just as we were cancelled; pass it on.
+                self._release()
+            raise
+
+    def _release(self):
+        """Hands the freed slot to the next live waiter, or returns it to the pool."""
+        while self._queue:
+            waiter = heapq.heappop(self._queue)
+            if waiter.future.done():
+                continue
+            self._virtual_time = max(self._virtual_time, waiter.finish_tag)
+            waiter.future.set_result(True)
+            return
+        self._active -= 1
+
+    def queue_status(self, user_id):
+        """Queue position and ETA of the user's earliest waiting request (position 0 = next to run)."""
+        waiting = sorted(w for w in self._queue if not w.future.done())
+        avg_service = self._avg_service or Config.SCHEDULER_DEFAULT_SERVICE_SECONDS
+        for position, waiter in enumerate(waiting):
+            if waiter.user_id == user_id:
+                return {
+                    "queued": True,
+                    "position": position,
+                    "ahead": position,
+                    "eta_seconds": (position // self.capacity + 1) * avg_service,
+                    "queue_length": len(waiting),
+                }
+        return {"queued": False, "position": None, "ahead": 0, "eta_seconds": 0.0, "queue_length": len(waiting)}
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats.update({"active": self._active, "capacity": self.capacity, "waiting": len(self._queue),
+                      "avg_service_seconds": self._avg_service})
+        return stats
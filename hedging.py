@@ -0,0 +1,121 @@
+# hedging.py
+import asyncio
+import threading
+import time
+from collections import deque
+
+from config import Config
+
+
+class LatencyHistogram:
+    """Sliding window of recent call latencies for one method."""
+
+    def __init__(self, window):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, fraction):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))
+        return samples[index]
+
+
+class Hedger:
+    """
+    Opt-in request hedging. If a call for a hedged method has not finished after the method's observed
+    HEDGE_PERCENTILE latency, a duplicate is issued; the first successful answer wins and the other is
+    cancelled. Extra calls are capped at HEDGE_BUDGET_RATIO of all calls so hedging cannot double load.
+    """
+
+    def __init__(self, enabled=None, methods=None, percentile=None, budget_ratio=None, budget_burst=None,
+                 min_samples=None, default_delay=None, min_delay=None, window=None):
+        self.enabled = Config.HEDGE_ENABLED if enabled is None else enabled
+        self.methods = set(methods if methods is not None else Config.HEDGE_METHODS)
+        self.percentile = percentile or Config.HEDGE_PERCENTILE
+        self.budget_ratio = budget_ratio if budget_ratio is not None else Config.HEDGE_BUDGET_RATIO
+        self.budget_burst = budget_burst or Config.HEDGE_BUDGET_BURST
+        self.min_samples = min_samples or Config.HEDGE_MIN_SAMPLES
+        self.default_delay = default_delay or Config.HEDGE_DEFAULT_DELAY_SECONDS
+        self.min_delay = min_delay or Config.HEDGE_MIN_DELAY_SECONDS
+        self.window = window or Config.HEDGE_WINDOW
+        self._histograms = {}
+        # Token budget: every call earns budget_ratio tokens, every hedge spends one.
+        self._budget = 1.0
+        self._stats = {"calls": 0, "hedges_issued": 0, "hedges_won": 0, "budget_denied": 0}
+
+    def _histogram(self, method):
+        if method not in self._histograms:
+            self._histograms[method] = LatencyHistogram(self.window)
+        return self._histograms[method]
+
+    def hedge_delay(self, method):
+        """Seconds to wait before hedging: the method's latency percentile once enough samples exist."""
+        histogram = self._histogram(method)
+        if len(histogram) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, histogram.percentile(self.percentile))
+
+    def _take_budget(self):
+        if self._budget >= 1.0:
+            self._budget -= 1.0
+            return True
+        self._stats["budget_denied"] += 1
+        return False
+
+    async def _timed(self, fn, method):
+        started = time.monotonic()
+        result = await fn()
+        self._histogram(method).record(time.monotonic() - started)
+        return result
+
+    async def run(self, method, fn):
+        """Awaits fn() (a coroutine factory for one attempt), hedging it when enabled for this method."""
+        self._stats["calls"] += 1
+        self._budget = min(self._budget + self.budget_ratio, self.budget_burst)
+        if not self.enabled or method not in self.methods:
+            return await self._timed(fn, method)
+
+        primary = asyncio.ensure_future(self._timed(fn, method))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay(method))
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done or not self._take_budget():
+            return await primary
+
+        self._stats["hedges_issued"] += 1
+        hedge = asyncio.ensure_future(self._timed(fn, method))
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._stats["hedges_won"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats["latency"] = {
+            method: {"samples": len(h), "p50": h.percentile(0.5), "p95": h.percentile(0.95), "p99": h.percentile(0.99)}
+            for method, h in list(self._histograms.items())
+        }
+        return stats
@@ -0,0 +1,359 @@
+# jobs.py
+import asyncio
+import datetime
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+
+from config import Config
+from database import GenerationJob, SessionLocal, StudyTopic
+from diagrams import DiagramError
+from doc_pipeline import (
+    PipelineProgress, flashcards_for_document, quiz_for_document, study_pack_for_document, summarize_document,
+)
+from knowledge_graph import is_merged, merge_graph, parse_dot
+from resilience import AIClientError
+from study_planner import save_roadmap
+from study_packs import find_pack, save_pack, text_hash
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+
+logger = logging.getLogger(__name__)
+
+
+class JobView:
+    """A detached snapshot of a GenerationJob row, safe to use after its session is closed."""
+
+    __slots__ = ("id", "kind", "page", "status", "result", "error", "delivered")
+
+    def __init__(self, job):
+        self.id = job.id
+        self.kind = job.kind
+        self.page = job.page
+        self.status = job.status
+        self.result = json.loads(job.result) if job.result else None
+        self.error = job.error
+        self.delivered = job.delivered
+
+    @property
+    def active(self):
+        return self.status in ACTIVE
+
+
+class JobContext:
+    """What a job function gets: the AI client, the user it runs for, its progress and the database."""
+
+    def __init__(self, runner, user_id, progress):
+        self.client = runner.client
+        self.user_id = user_id
+        self.progress = progress
+        self._runner = runner
+
+    async def db(self, fn):
+        """Runs fn(session) on the runner's database threads, so the AI event loop never blocks on SQL."""
+        return await asyncio.get_running_loop().run_in_executor(self._runner._db_pool, _with_session, fn)
+
+
+def _with_session(fn):
+    db = SessionLocal()
+    try:
+        return fn(db)
+    finally:
+        db.close()
+
+
+def _now():
+    return datetime.datetime.utcnow()
+
+
+# --- Job kinds ---
+# Each kind is an async function(ctx, params) returning a JSON-serializable result.
+JOB_KINDS = {}
+# Kinds that study a text, and the param holding it. When the user asks for it (the "learn_concepts" param),
+# the text's concepts are merged into their knowledge graph, at the cost of one more model call.
+LEARNS_FROM = {}
+
+
+def job_kind(name, learns_from=None):
+    def register(fn):
+        JOB_KINDS[name] = fn
+        if learns_from:
+            LEARNS_FROM[name] = learns_from
+        return fn
+    return register
+
+
+def _store_topic(db, user_id, title):
+    db.add(StudyTopic(topic_name=title, user_id=user_id))
+    db.commit()
+
+
+def _pack_data(pack):
+    return {"title": pack.title, "summary": pack.summary, "quiz": json.loads(pack.quiz), "flashcards": json.loads(pack.flashcards)}
+
+
+async def _study_pack(ctx, text, num_questions=0, num_cards=0):
+    """The stored study pack for text as a dict, generating and storing one first if needed; also says which it was."""
+    def stored_pack(db):
+        pack = find_pack(db, text, num_questions, num_cards)
+        return _pack_data(pack) if pack else None
+
+    stored = await ctx.db(stored_pack)
+    if stored:
+        return stored, True
+    data = await study_pack_for_document(ctx.client, text, max(num_questions, Config.STUDY_PACK_QUESTIONS),
+                                         max(num_cards, Config.STUDY_PACK_CARDS), ctx.progress)
+    if not data["title"]:
+        data["title"] = await ctx.client.agenerate_topic_title(text)
+    await ctx.db(lambda db: save_pack(db, text, data))
+    return data, False
+
+
+async def _learn_concepts(ctx, text):
+    """Extracts the text's concept graph and merges it into the user's knowledge graph, once per text."""
+    digest = text_hash(text)
+    if await ctx.db(lambda db: is_merged(db, ctx.user_id, digest)):
+        return
+    try:
+        graph = parse_dot(await ctx.client.aextract_knowledge_graph_dot(text))
+    except (AIClientError, DiagramError):
+        # The graph is a by-product; the job's own result must not fail because of it.
+        return
+    try:
+        await ctx.db(lambda db: merge_graph(db, ctx.user_id, graph, digest))
+    except SQLAlchemyError as e:
+        logger.warning("Could not merge the concept graph for user %s: %s", ctx.user_id, e)
+
+
+async def _with_title(ctx, text, coro):
+    """Awaits coro and the title of text together; returns (result, title)."""
+    return await asyncio.gather(coro, ctx.client.agenerate_topic_title(text))
+
+
+@job_kind("summary", learns_from="text")
+async def summary_job(ctx, params):
+    text = params["text"]
+    if params.get("use_study_pack"):
+        pack, from_pack = await _study_pack(ctx, text)
+        summary, title = pack["summary"], pack["title"]
+    else:
+        from_pack = False
+        summary, title = await _with_title(ctx, text, summarize_document(ctx.client, text, ctx.progress))
+    await ctx.db(lambda db: _store_topic(db, ctx.user_id, title))
+    return {"summary": summary, "title": title, "from_pack": from_pack}
+
+
+@job_kind("quiz", learns_from="text")
+async def quiz_job(ctx, params):
+    text, count = params["text"], params["num_questions"]
+    items = None
+    if params.get("use_study_pack"):
+        pack, from_pack = await _study_pack(ctx, text, num_questions=count)
+        items, title = pack["quiz"][:count], pack["title"]
+    if not items:
+        # No pack asked for, or one that came back without usable questions: generate them on their own.
+        from_pack = False
+        items, title = await _with_title(ctx, text, quiz_for_document(ctx.client, text, count, ctx.progress))
+    await ctx.db(lambda db: _store_topic(db, ctx.user_id, title))
+    return {"items": items, "title": title, "from_pack": from_pack}
+
+
+@job_kind("flashcards", learns_from="text")
+async def flashcards_job(ctx, params):
+    text, count = params["text"], params["num_cards"]
+    items = None
+    if params.get("use_study_pack"):
+        pack, from_pack = await _study_pack(ctx, text, num_cards=count)
+        items, title = pack["flashcards"][:count], pack["title"]
+    if not items:
+        # No pack asked for, or one that came back without usable cards: generate them on their own.
+        from_pack = False
+        items, title = await _with_title(ctx, text, flashcards_for_document(ctx.client, text, count, ctx.progress))
+    await ctx.db(lambda db: _store_topic(db, ctx.user_id, title))
+    return {"items": items, "title": title, "from_pack": from_pack}
+
+
+@job_kind("roadmap")
+async def roadmap_job(ctx, params):
+    topic, days = params["topic"], params["days"]
+    plan = await ctx.client.agenerate_roadmap_plan(topic, days)
+
+    def store(db):
+        roadmap_id = save_roadmap(db, ctx.user_id, topic, plan).id
+        _store_topic(db, ctx.user_id, topic)
+        return roadmap_id
+
+    return {"roadmap_id": await ctx.db(store)}
+
+
+# --- Runner ---
+class JobRunner:
+    """
+    Runs generation jobs in the background on AIClient's event loop, at most JOB_WORKERS at a time.
+    Job state lives in the generation_jobs table, so a page can poll it from any rerun or session and a
+    dropped connection does not lose the work. Each runner heartbeats the jobs it owns; jobs whose owner
+    stopped heartbeating (a crashed or restarted process) are claimed and started again by another runner,
+    while jobs of live processes are left alone.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._db_pool = ThreadPoolExecutor(max_workers=Config.JOB_DB_WORKERS, thread_name_prefix="jobs-db")
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._progress = {}
+        self._slots = None
+        if Config.JOB_RESUME_STALE:
+            self._resume()
+        threading.Thread(target=self._heartbeat, name="jobs-heartbeat", daemon=True).start()
+
+    def _heartbeat(self):
+        def touch(db):
+            db.query(GenerationJob).filter(GenerationJob.owner == self.owner, GenerationJob.status.in_(ACTIVE)) \
+                .update({"heartbeat_at": _now()}, synchronize_session=False)
+            db.commit()
+
+        while True:
+            time.sleep(Config.JOB_HEARTBEAT_SECONDS)
+            try:
+                _with_session(touch)
+                if Config.JOB_RESUME_STALE:
+                    self._resume()
+            except SQLAlchemyError:
+                # A busy or unreachable database; the next beat tries again.
+                continue
+
+    def _resume(self):
+        """Claims unfinished jobs whose owner stopped heartbeating and starts them in this process."""
+        def claim(db):
+            cutoff = _now() - datetime.timedelta(seconds=Config.JOB_STALE_SECONDS)
+            stale = (GenerationJob.status.in_(ACTIVE),
+                     or_(GenerationJob.heartbeat_at.is_(None), GenerationJob.heartbeat_at < cutoff))
+            with self._lock:
+                running_here = set(self._futures)
+            claimed = []
+            for job_id, in db.query(GenerationJob.id).filter(*stale).order_by(GenerationJob.id).all():
+                if job_id in running_here:
+                    continue
+                # Conditional update: when several processes find the same stale job, only one claims it.
+                taken = db.query(GenerationJob).filter(GenerationJob.id == job_id, *stale).update(
+                    {"owner": self.owner, "heartbeat_at": _now(), "status": QUEUED}, synchronize_session=False)
+                db.commit()
+                if taken:
+                    claimed.append(job_id)
+            jobs = db.query(GenerationJob).filter(GenerationJob.id.in_(claimed)).order_by(GenerationJob.id) if claimed else []
+            return [(job.id, job.user_id, job.kind, json.loads(job.params)) for job in jobs]
+
+        for job_id, user_id, kind, params in _with_session(claim):
+            self._start(job_id, user_id, kind, params)
+
+    def submit(self, user_id, kind, params, page):
+        """Records a job and starts it; returns the job id right away."""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        def create(db):
+            job = GenerationJob(user_id=user_id, kind=kind, page=page, params=json.dumps(params),
+                                owner=self.owner, heartbeat_at=_now())
+            db.add(job)
+            db.commit()
+            return job.id
+
+        job_id = _with_session(create)
+        self._start(job_id, user_id, kind, params)
+        return job_id
+
+    def _start(self, job_id, user_id, kind, params):
+        progress = PipelineProgress()
+        with self._lock:
+            self._progress[job_id] = progress
+            future = self._futures[job_id] = self.client.submit(self._run(job_id, user_id, kind, params, progress), user_id=user_id)
+        future.add_done_callback(lambda _: self._forget(job_id))
+
+    def _forget(self, job_id):
+        with self._lock:
+            self._futures.pop(job_id, None)
+            self._progress.pop(job_id, None)
+
+    async def _update(self, job_id, **fields):
+        """
+        Writes fields to a job that is still queued or running and owned by this runner; a cancelled job, or
+        one another process took over, is never overwritten.
+        """
+        def write(db):
+            db.query(GenerationJob).filter(GenerationJob.id == job_id, GenerationJob.status.in_(ACTIVE),
+                                           GenerationJob.owner == self.owner).update(fields, synchronize_session=False)
+            db.commit()
+        await asyncio.get_running_loop().run_in_executor(self._db_pool, _with_session, write)
+
+    async def _run(self, job_id, user_id, kind, params, progress):
+        if self._slots is None:
+            # Created on first use so it belongs to AIClient's loop (only that loop's thread gets here).
+            self._slots = asyncio.Semaphore(Config.JOB_WORKERS)
+        async with self._slots:
+            await self._update(job_id, status=RUNNING, started_at=_now())
+            try:
+                ctx = JobContext(self, user_id, progress)
+                if Config.KNOWLEDGE_GRAPH_ENABLED and kind in LEARNS_FROM and params.get("learn_concepts"):
+                    result, _ = await asyncio.gather(JOB_KINDS[kind](ctx, params), _learn_concepts(ctx, params[LEARNS_FROM[kind]]))
+                else:
+                    result = await JOB_KINDS[kind](ctx, params)
+            except AIClientError as e:
+                await self._update(job_id, status=FAILED, error=str(e), finished_at=_now())
+                return
+            except Exception as e:
+                await self._update(job_id, status=FAILED, error=f"Something went wrong: {e}", finished_at=_now())
+                raise
+            await self._update(job_id, status=DONE, result=json.dumps(result), finished_at=_now())
+
+    def cancel(self, job_id):
+        """Stops a queued or running job; its row is marked cancelled at once."""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future:
+            future.cancel()
+
+        def mark(db):
+            db.query(GenerationJob).filter(GenerationJob.id == job_id, GenerationJob.status.in_(ACTIVE)) \
+                .update({"status": CANCELLED, "delivered": True, "finished_at": _now()}, synchronize_session=False)
+            db.commit()
+        _with_session(mark)
+
+    def cancel_superseded(self, user_id, current_page):
+        """Cancels the user's unfinished jobs that belong to pages other than current_page."""
+        def superseded(db):
+            return [job_id for job_id, in db.query(GenerationJob.id).filter(
+                GenerationJob.user_id == user_id, GenerationJob.status.in_(ACTIVE), GenerationJob.page != current_page)]
+        for job_id in _with_session(superseded):
+            self.cancel(job_id)
+
+    def latest(self, user_id, page):
+        """The user's most recent job on this page whose outcome has not been shown yet, or None."""
+        def query(db):
+            job = db.query(GenerationJob).filter(
+                GenerationJob.user_id == user_id, GenerationJob.page == page, GenerationJob.delivered.is_(False)
+            ).order_by(GenerationJob.id.desc()).first()
+            return JobView(job) if job else None
+        return _with_session(query)
+
+    def mark_delivered(self, job_id):
+        def mark(db):
+            db.query(GenerationJob).filter(GenerationJob.id == job_id).update({"delivered": True}, synchronize_session=False)
+            db.commit()
+        _with_session(mark)
+
+    def progress(self, job_id):
+        """(stage, done, total) of a job running in this process; total is 0 when it reports no steps."""
+        with self._lock:
+            progress = self._progress.get(job_id)
+        return progress.snapshot() if progress else (None, 0, 0)
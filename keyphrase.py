@@ -0,0 +1,222 @@
+# keyphrase.py
+import math
+import re
+from collections import Counter
+
+from config import Config
+
+STOPWORDS = frozenset("""
+a about above according across actually after again against all almost along already also although always am among an
+and another any anything are around as at be became because become been before being below between both but by can
+cannot could did do does doing done down during each either else enough especially etc even ever every few for from
+further get gets given gives go had has have having he her here hers herself him himself his how however i if in into
+is it its itself just least less let like made make makes many may me might more most much must my near need neither
+no nor not now of off often on once one only onto or other others otherwise our ours out over own per perhaps quite
+rather really said same see seem seems several shall she should since so some something such than that the their
+theirs them themselves then there therefore these they thing things this those though through thus to together too
+toward towards under unless until up upon us use used uses using usually very via was way ways we well were what
+whatever when where whether which while who whom whose why will with within without would yet you your yours
+explain explained explaining describe describes discuss tell teach understand learn learning know show please help
+want wants give simple simply terms basic basics detail details overview
+""".split())
+
+# Nouns that appear in almost any study text and make poor titles on their own.
+GENERIC_WORDS = frozenset("""
+chapter section page part unit lesson lecture notes note module topic topics example examples figure table student
+students teacher course class question questions answer answers summary introduction conclusion reference references
+chapter exercise exercises definition concept concepts idea ideas point points type types case cases number numbers
+time first second third new different important main key following various include includes including called known
+""".split())
+
+# Trailing verbs of questions like "how does a hash table work".
+_TRAILING_VERBS = frozenset("work works happen happens mean means matter matters".split())
+
+# Kept lowercase inside a title ("Difference between TCP and UDP").
+SMALL_WORDS = frozenset("a an and as at but by for from in into of on or the to vs via with between".split())
+
+_SPLIT = re.compile(r"(?:'s\b)?[^\w'+#-]+|(?<!\w)'|'(?!\w)|'s$")
+_SENTENCE = re.compile(r"[.!?;:,()\[\]{}\"“”\n]+")
+_QUESTION_PREFIX = re.compile(r"^\s*(?:what|how|why|who|when|where|which|can you|could you|please)\b[^a-z0-9]*", re.I)
+
+
+class TitleGuess:
+    """A locally extracted title and how much to trust it (0-1)."""
+
+    __slots__ = ("title", "confidence", "reason")
+
+    def __init__(self, title, confidence, reason):
+        self.title = title
+        self.confidence = confidence
+        self.reason = reason
+
+    @property
+    def confident(self):
+        return bool(self.title) and self.confidence >= Config.KEYPHRASE_MIN_CONFIDENCE
+
+
+def _stem(word):
+    """Folds simple plurals so "tables" and "table" count as one term."""
+    word = word.lower()
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def _display(word, first):
+    """Title-cases a word but keeps acronyms and mixed-case names (SQL, JavaScript, mRNA) as written."""
+    if not first and word.lower() in SMALL_WORDS:
+        return word.lower()
+    if any(ch.isupper() for ch in word[1:]) or any(ch.isdigit() for ch in word):
+        return word
+    return word[:1].upper() + word[1:]
+
+
+def _title(words):
+    return " ".join(_display(word, i == 0) for i, word in enumerate(words))
+
+
+def _words(text):
+    return [w for w in _SPLIT.split(text) if w]
+
+
+class KeyphraseExtractor:
+    """
+    RAKE/TF-IDF keyphrase extraction. Candidates are the 1-3 word n-grams inside runs of content words
+    (text between stopwords and punctuation), scored by how often they occur, weighted by an IDF learned
+    from the texts seen so far (a bounded vocabulary) so that words common to every upload stop winning.
+    """
+
+    def __init__(self, scan_chars=None, vocab_size=None, max_words=4):
+        self.scan_chars = scan_chars or Config.KEYPHRASE_SCAN_CHARS
+        self.vocab_size = vocab_size or Config.KEYPHRASE_VOCAB_SIZE
+        self.max_words = max_words
+        self._df = Counter()
+        self._docs = 0
+
+    def _learn(self, terms):
+        self._docs += 1
+        self._df.update(set(terms))
+        if len(self._df) > self.vocab_size * 1.2:
+            self._df = Counter(dict(self._df.most_common(self.vocab_size)))
+
+    def _idf(self, term):
+        weight = math.log((self._docs + 1) / (self._df.get(term, 0) + 1)) + 1
+        return weight * (0.3 if term in GENERIC_WORDS else 1.0)
+
+    def _phrases(self, text):
+        """Runs of content words (original case) between stopwords and punctuation, in order of appearance."""
+        phrases = []
+        for fragment in _SENTENCE.split(text):
+            current = []
+            for word in _words(fragment):
+                if word.lower() in STOPWORDS or word.isdigit() or len(word) < 2:
+                    if current:
+                        phrases.append(current)
+                    current = []
+                else:
+                    current.append(word)
+            if current:
+                phrases.append(current)
+        return phrases
+
+    def _short_title(self, text):
+        """A short input is already a topic; trims question words and leading/trailing stopwords."""
+        words = _words(_QUESTION_PREFIX.sub("", text))
+        while words and words[0].lower() in STOPWORDS:
+            words.pop(0)
+        while words and (words[-1].lower() in STOPWORDS or words[-1].lower() in _TRAILING_VERBS):
+            words.pop()
+        if not words:
+            return TitleGuess("", 0.0, "no content words")
+        if len(words) > self.max_words + 1:
+            phrases = self._phrases(" ".join(words))
+            if not phrases:
+                return TitleGuess("", 0.2, "no content words")
+            words = max(phrases, key=len)[:self.max_words]
+            if len(words) == 1:
+                # One word left of a longer input ("CS 101 202 303 404 505") rarely names the topic.
+                return TitleGuess(_title(words), 0.4, "one word of a longer input")
+        return TitleGuess(_title(words), 0.9, "short input")
+
+    def extract(self, text):
+        """Returns a TitleGuess for the content; the caller decides whether it is confident enough to use."""
+        text = (text or "").strip()[:self.scan_chars]
+        if not text:
+            return TitleGuess("", 0.0, "empty")
+        if len(_words(text)) <= 8 and "\n" not in text:
+            return self._short_title(text)
+
+        phrases = self._phrases(text)
+        terms = [_stem(w) for phrase in phrases for w in phrase]
+        self._learn(terms)
+        if len(terms) < 5:
+            return TitleGuess("", 0.2, "too little content")
+
+        tf = Counter(terms)
+        weight = {term: count * self._idf(term) for term, count in tf.items()}
+        heading = self._heading(text)
+        lead = set(_stem(w) for w in _words(text[:200]))
+
+        occurrences, surface = Counter(), {}
+        for phrase in phrases:
+            keys = [_stem(w) for w in phrase]
+            for n in (1, 2, 3):
+                for i in range(len(phrase) - n + 1):
+                    gram = tuple(keys[i:i + n])
+                    occurrences[gram] += 1
+                    surface.setdefault(gram, phrase[i:i + n])
+        for gram, words in self._of_phrases(text):
+            occurrences[gram] += 1
+            surface.setdefault(gram, words)
+
+        def score(gram):
+            content = [t for t in gram if t != "of"]
+            value = occurrences[gram] * sum(weight[t] for t in content) / len(content) * (1 + 0.3 * (len(gram) - 1))
+            if gram in heading:
+                value *= 2.0
+            elif lead.issuperset(gram):
+                value *= 1.2
+            return value
+
+        ranked = sorted(occurrences, key=score, reverse=True)
+        best = seed = ranked[0]
+        # Grow the winning term into the longest phrase that repeats often enough ("revolution" -> "French Revolution").
+        for gram in sorted(occurrences, key=lambda g: (len(g), occurrences[g]), reverse=True):
+            if len(gram) > len(best) and set(best) <= set(gram) and occurrences[gram] >= max(2, occurrences[best] / 2):
+                best = gram
+                break
+        rival = next((g for g in ranked if not set(g) & set(best)), None)
+        margin = 1 - score(rival) / score(best) if rival else 1.0
+        if best in heading:
+            support, reason = 0.6, "heading"
+        else:
+            # A phrase grown from a frequent term is as well supported as the term itself.
+            count = occurrences[seed]
+            support, reason = (0.6 if count >= 3 else 0.45 if count == 2 else 0.2), f"repeated x{count}"
+        return TitleGuess(_title(surface[best]), min(1.0, support + 0.4 * max(margin, 0.0)), reason)
+
+    def _of_phrases(self, text):
+        """("law", "of", "motion") style n-grams that span an "of", which plain RAKE candidates split apart."""
+        for fragment in _SENTENCE.split(text):
+            words = _words(fragment)
+            for i in range(1, len(words) - 1):
+                before, after = words[i - 1], words[i + 1]
+                if words[i].lower() != "of" or len(before) < 2 or len(after) < 2:
+                    # One-letter words are never scored, e.g. "x of y"
+                    continue
+                if before.lower() not in STOPWORDS and after.lower() not in STOPWORDS \
+                        and not before.isdigit() and not after.isdigit():
+                    yield (_stem(before), "of", _stem(after)), [before, "of", after]
+
+    def _heading(self, text):
+        """Stemmed n-grams of the first line when it looks like a heading (short, no sentence punctuation)."""
+        first_line = text.split("\n", 1)[0].strip()
+        if not first_line or len(first_line.split()) > 10 or first_line.endswith((".", "?", "!")):
+            return set()
+        grams = set()
+        for phrase in self._phrases(first_line):
+            keys = [_stem(w) for w in phrase]
+            grams.update(tuple(keys[i:i + n]) for n in (1, 2, 3) for i in range(len(keys) - n + 1))
+        return grams
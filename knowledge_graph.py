@@ -0,0 +1,392 @@
+# knowledge_graph.py
+import collections
+import re
+import threading
+import time
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+from config import Config
+from database import KnowledgeEdge, KnowledgeNode, KnowledgeSource
+from diagrams import validate_dot
+
+MAX_LABEL_LENGTH = 120
+
+# --- DOT parsing ---
+_TOKEN = re.compile(r"""
+    (?P<comment>//[^\n]*|/\*.*?\*/|^\s*\#[^\n]*)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<html><(?:[^<>]|<[^<>]*>)*>)
+  | (?P<op>->|--)
+  | (?P<id>[A-Za-z_\x80-\uffff][\w\x80-\uffff]*|-?(?:\.\d+|\d+(?:\.\d*)?))
+  | (?P<punct>[{}\[\];,=:])
+""", re.X | re.S | re.M)
+_KEYWORDS = {"graph", "digraph", "node", "edge", "subgraph", "strict"}
+_ESCAPES = re.compile(r"\\[nlr]")
+
+
+def clean_label(text):
+    """A DOT id or label as display text: quotes, HTML tags and line-break escapes removed, whitespace collapsed."""
+    if text.startswith('"'):
+        text = text[1:-1].replace('\\"', '"')
+    elif text.startswith("<"):
+        text = re.sub(r"<[^<>]*>", " ", text[1:-1])
+    return " ".join(_ESCAPES.sub(" ", text).split())[:MAX_LABEL_LENGTH]
+
+
+class ParsedGraph:
+    """Concept labels and (source, target, relation) triples read from one DOT graph; labels are unique ignoring case."""
+
+    def __init__(self):
+        self.nodes = []
+        self.edges = []
+        self._canonical = {}
+        self._seen_edges = set()
+
+    def add_node(self, label):
+        key = label.lower()
+        if key not in self._canonical:
+            self._canonical[key] = label
+            self.nodes.append(label)
+        return self._canonical[key]
+
+    def add_edge(self, source, target, relation):
+        source, target = self.add_node(source), self.add_node(target)
+        key = (source.lower(), target.lower(), relation.lower())
+        if source.lower() != target.lower() and key not in self._seen_edges:
+            self._seen_edges.add(key)
+            self.edges.append((source, target, relation))
+
+
+class _DotReader:
+    """A small recursive-descent reader for the statements of a DOT body; subgraphs are flattened."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+        self.node_labels = {}
+        self.statements = []
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def attributes(self):
+        """Reads any number of [k=v, ...] lists after a statement."""
+        attrs = {}
+        while self.peek()[1] == "[":
+            self.take()
+            while self.peek()[1] not in ("]", None):
+                kind, key = self.take()
+                if self.peek()[1] == "=":
+                    self.take()
+                    attrs[clean_label(key).lower()] = self.take()[1]
+            self.take()
+        return attrs
+
+    def operand(self):
+        """A node id (with an optional :port) or a { ... } group of node ids; returns a list of ids."""
+        kind, value = self.peek()
+        if value == "subgraph":
+            self.take()
+            if self.peek()[1] != "{":
+                self.take()
+            kind, value = self.peek()
+        if value == "{":
+            self.take()
+            ids, depth = [], 1
+            while depth and self.peek()[1] is not None:
+                kind, value = self.take()
+                if value == "{":
+                    depth += 1
+                elif value == "}":
+                    depth -= 1
+                elif value == "=":
+                    self.take()
+                elif kind in ("id", "string", "html") and value.lower() not in _KEYWORDS and self.peek()[1] != "=":
+                    ids.append(value)
+            return ids
+        if kind not in ("id", "string", "html"):
+            self.take()
+            return []
+        self.take()
+        while self.peek()[1] == ":":
+            self.take()
+            self.take()
+        return [value]
+
+    def _group_is_operand(self):
+        """True if the { ... } group starting here is followed by an edge operator, as in {a b} -> c."""
+        depth, offset = 0, 0
+        while self.peek(offset)[1] is not None:
+            value = self.peek(offset)[1]
+            depth += {"{": 1, "}": -1}.get(value, 0)
+            offset += 1
+            if not depth:
+                return self.peek(offset)[0] == "op"
+        return False
+
+    def read(self):
+        while self.peek()[1] is not None:
+            kind, value = self.peek()
+            if value == "{" and self._group_is_operand():
+                self._statement()
+            elif value in (";", ",", "}", "{") or kind == "op":
+                self.take()
+            elif kind == "id" and value.lower() in ("graph", "node", "edge") and self.peek(1)[1] == "[":
+                self.take()
+                self.attributes()
+            elif self.peek(1)[1] == "=":
+                self.position += 3
+            elif kind == "id" and value.lower() == "subgraph":
+                self.take()
+                if self.peek()[1] != "{":
+                    self.take()
+            else:
+                self._statement()
+
+    def _statement(self):
+        """A node statement or an edge chain, with its attributes."""
+        operands = [self.operand()]
+        while self.peek()[0] == "op":
+            self.take()
+            operands.append(self.operand())
+        attrs = self.attributes()
+        if len(operands) == 1:
+            for node_id in operands[0]:
+                if "label" in attrs:
+                    self.node_labels[node_id] = attrs["label"]
+                self.statements.append(((node_id,), ""))
+        else:
+            relation = clean_label(attrs.get("label") or "")
+            for sources, targets in zip(operands, operands[1:]):
+                self.statements.extend(((s, t), relation) for s in sources for t in targets)
+
+
+def parse_dot(dot, max_nodes=None):
+    """
+    Reads concepts and labelled relations out of DOT text (validated first; raises DiagramError).
+    A node's label attribute is used as its name when it has one; at most max_nodes concepts are kept.
+    """
+    dot = validate_dot(dot)
+    max_nodes = max_nodes or Config.KNOWLEDGE_MAX_NODES_PER_TEXT
+    tokens = [(m.lastgroup, m.group(m.lastgroup)) for m in _TOKEN.finditer(dot) if m.lastgroup != "comment"]
+    body = next(i for i, (kind, value) in enumerate(tokens) if value == "{") + 1
+    reader = _DotReader(tokens[body:])
+    reader.read()
+
+    graph = ParsedGraph()
+    name = lambda node_id: clean_label(reader.node_labels.get(node_id, node_id))
+    for ids, relation in reader.statements:
+        labels = [name(node_id) for node_id in ids]
+        if not all(labels) or len(graph.nodes) >= max_nodes and any(label.lower() not in graph._canonical for label in labels):
+            continue
+        if len(labels) == 1:
+            graph.add_node(labels[0])
+        else:
+            graph.add_edge(labels[0], labels[1], relation)
+    return graph
+
+
+# --- Storage ---
+def _node_ids(db, user_id, labels):
+    """{lowercased label: node id} for the user's existing nodes among labels (one query on the (user_id, label_key) index)."""
+    if not labels:
+        return {}
+    rows = db.query(KnowledgeNode.id, KnowledgeNode.label_key).filter(
+        KnowledgeNode.user_id == user_id, KnowledgeNode.label_key.in_([label.lower() for label in labels]))
+    return {key: node_id for node_id, key in rows}
+
+
+def is_merged(db, user_id, content_hash):
+    return db.query(KnowledgeSource.id).filter(
+        KnowledgeSource.user_id == user_id, KnowledgeSource.content_hash == content_hash).first() is not None
+
+
+def merge_graph(db, user_id, graph, content_hash=None):
+    """
+    Adds a parsed graph to the user's knowledge graph with a handful of bulk statements: existing concepts
+    and relations get their mention counts bumped, new ones are inserted together. With content_hash the
+    text is recorded as merged, and a text merged before is skipped. Returns (new concepts, new relations).
+    """
+    for attempt in range(2):
+        try:
+            result = _merge(db, user_id, graph, content_hash)
+            db.commit()
+            break
+        except IntegrityError:
+            # A concurrent merge for this user inserted some of the same rows first; redo against its result.
+            db.rollback()
+            if attempt or (content_hash and is_merged(db, user_id, content_hash)):
+                return 0, 0
+    graph_cache.invalidate(user_id)
+    return result
+
+
+def _merge(db, user_id, graph, content_hash):
+    if content_hash:
+        if is_merged(db, user_id, content_hash):
+            return 0, 0
+        db.add(KnowledgeSource(user_id=user_id, content_hash=content_hash))
+        db.flush()
+    if not graph.nodes:
+        return 0, 0
+
+    ids = _node_ids(db, user_id, graph.nodes)
+    if ids:
+        db.execute(update(KnowledgeNode).where(KnowledgeNode.id.in_(ids.values()))
+                   .values(mentions=KnowledgeNode.mentions + 1))
+    new_nodes = [label for label in graph.nodes if label.lower() not in ids]
+    if new_nodes:
+        db.execute(insert(KnowledgeNode), [{"user_id": user_id, "label": label, "label_key": label.lower(), "mentions": 1}
+                                           for label in new_nodes])
+        ids.update(_node_ids(db, user_id, new_nodes))
+
+    relations = {(ids[s.lower()], ids[t.lower()], relation) for s, t, relation in graph.edges}
+    if not relations:
+        return len(new_nodes), 0
+    node_ids = {source for source, _, _ in relations}
+    existing = {(source, target, relation): edge_id for edge_id, source, target, relation in db.query(
+        KnowledgeEdge.id, KnowledgeEdge.source_id, KnowledgeEdge.target_id, KnowledgeEdge.label
+    ).filter(KnowledgeEdge.user_id == user_id, KnowledgeEdge.source_id.in_(node_ids))}
+    known = [existing[r] for r in relations if r in existing]
+    if known:
+        db.execute(update(KnowledgeEdge).where(KnowledgeEdge.id.in_(known)).values(mentions=KnowledgeEdge.mentions + 1))
+    new_edges = [r for r in relations if r not in existing]
+    if new_edges:
+        db.execute(insert(KnowledgeEdge), [{"user_id": user_id, "source_id": s, "target_id": t, "label": relation, "mentions": 1}
+                                           for s, t, relation in new_edges])
+    return len(new_nodes), len(new_edges)
+
+
+# --- Traversal ---
+class UserGraph:
+    """One user's knowledge graph as in-memory adjacency lists; lookups by label ignore case."""
+
+    def __init__(self, nodes, edges):
+        self.labels = {node_id: label for node_id, label, _ in nodes}
+        self.mentions = {node_id: mentions for node_id, _, mentions in nodes}
+        self._ids = {label.lower(): node_id for node_id, label, _ in nodes}
+        # node id -> [(other node id, relation, True if the edge points away from the node)]
+        self.adjacent = collections.defaultdict(list)
+        for source, target, relation in edges:
+            self.adjacent[source].append((target, relation, True))
+            self.adjacent[target].append((source, relation, False))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def find(self, label):
+        return self._ids.get((label or "").strip().lower())
+
+    def concepts(self):
+        """Labels ordered by how connected and how often mentioned they are."""
+        return sorted(self.labels.values(), key=lambda l: (-len(self.adjacent[self._ids[l.lower()]]), -self.mentions[self._ids[l.lower()]], l))
+
+    def neighbors(self, label):
+        """[(neighbor label, relation, outgoing)] for a concept, most mentioned neighbors first."""
+        node_id = self.find(label)
+        if node_id is None:
+            return []
+        adjacent = sorted(self.adjacent[node_id], key=lambda a: -self.mentions[a[0]])
+        return [(self.labels[other], relation, outgoing) for other, relation, outgoing in adjacent]
+
+    def subgraph(self, label, hops=2, max_nodes=40):
+        """Concepts within `hops` relations of label (either direction) and the relations among them: (labels, edges)."""
+        start = self.find(label)
+        if start is None:
+            return [], []
+        seen, frontier = {start: None}, [start]
+        for _ in range(hops):
+            following = []
+            for node_id in frontier:
+                for other, _, _ in sorted(self.adjacent[node_id], key=lambda a: -self.mentions[a[0]]):
+                    if other not in seen and len(seen) < max_nodes:
+                        seen[other] = None
+                        following.append(other)
+            frontier = following
+        edges = [(self.labels[node_id], self.labels[other], relation)
+                 for node_id in seen for other, relation, outgoing in self.adjacent[node_id] if outgoing and other in seen]
+        return [self.labels[node_id] for node_id in seen], edges
+
+    def shortest_path(self, from_label, to_label):
+        """
+        The fewest relations linking two concepts, ignoring edge direction, as [(source, relation, target)]
+        steps in their stored direction; [] for the same concept and None when they are not connected.
+        """
+        start, goal = self.find(from_label), self.find(to_label)
+        if start is None or goal is None:
+            return None
+        previous = {start: None}
+        queue = collections.deque([start])
+        while queue and goal not in previous:
+            node_id = queue.popleft()
+            for other, relation, outgoing in self.adjacent[node_id]:
+                if other not in previous:
+                    previous[other] = (node_id, relation, outgoing)
+                    queue.append(other)
+        if goal not in previous:
+            return None
+        steps, node_id = [], goal
+        while previous[node_id]:
+            before, relation, outgoing = previous[node_id]
+            source, target = (before, node_id) if outgoing else (node_id, before)
+            steps.append((self.labels[source], relation, self.labels[target]))
+            node_id = before
+        return steps[::-1]
+
+
+def to_dot(labels, edges, focus=None):
+    """DOT for a set of concepts and relations (e.g. a subgraph), with the focus concept highlighted."""
+    quote = lambda text: '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    lines = ["digraph Knowledge {", '    rankdir=LR;', '    node [shape=box, style="rounded,filled", fillcolor="#eef2ff"];']
+    for label in labels:
+        style = ' [fillcolor="#fde68a", penwidth=2]' if focus and label.lower() == focus.lower() else ""
+        lines.append(f"    {quote(label)}{style};")
+    for source, target, relation in edges:
+        lines.append(f"    {quote(source)} -> {quote(target)}" + (f" [label={quote(relation)}];" if relation else ";"))
+    lines.append("}")
+    return "\n".join(lines)
+
+
+class KnowledgeGraphCache:
+    """
+    Per-user UserGraphs loaded with two queries (nodes, then edges by user_id) and kept for
+    KNOWLEDGE_CACHE_SECONDS, so traversals never go back to the database edge by edge. merge_graph
+    invalidates a user's entry; the TTL bounds staleness from writes made by other processes.
+    """
+
+    def __init__(self, max_users=None, ttl_seconds=None):
+        self.max_users = max_users or Config.KNOWLEDGE_CACHE_USERS
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.KNOWLEDGE_CACHE_SECONDS
+        self._graphs = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db, user_id):
+        with self._lock:
+            entry = self._graphs.get(user_id)
+            if entry and time.monotonic() - entry[0] < self.ttl_seconds:
+                self._graphs.move_to_end(user_id)
+                return entry[1]
+        nodes = db.query(KnowledgeNode.id, KnowledgeNode.label, KnowledgeNode.mentions).filter(KnowledgeNode.user_id == user_id).all()
+        edges = db.query(KnowledgeEdge.source_id, KnowledgeEdge.target_id, KnowledgeEdge.label).filter(KnowledgeEdge.user_id == user_id).all()
+        graph = UserGraph(nodes, edges)
+        with self._lock:
+            self._graphs[user_id] = (time.monotonic(), graph)
+            self._graphs.move_to_end(user_id)
+            while len(self._graphs) > self.max_users:
+                self._graphs.popitem(last=False)
+        return graph
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._graphs.pop(user_id, None)
+
+
+graph_cache = KnowledgeGraphCache()
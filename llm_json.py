@@ -0,0 +1,436 @@
+# llm_json.py
+import json
+import re
+
+
+def extract_json_from_string(text):
+    """Finds and extracts the first valid JSON object or array from a string."""
+    match = re.search(r"```json\s*([\s\S]*?)\s*```", text)
+    if match:
+        return match.group(1).strip()
+
+    first_bracket = -1
+    last_bracket = -1
+
+    first_curly = text.find('{')
+    first_square = text.find('[')
+
+    if first_curly != -1 and (first_square == -1 or first_curly < first_square):
+        first_bracket = first_curly
+        last_bracket = text.rfind('}')
+    elif first_square != -1:
+        first_bracket = first_square
+        last_bracket = text.rfind(']')
+
+    if first_bracket != -1 and last_bracket != -1:
+        return text[first_bracket : last_bracket + 1].strip()
+
+    return text
+
+
+# --- Incremental scanning ---
+_OPENERS = re.compile(r"[\[{]")
+_STRUCTURAL = re.compile(r'[\[\]{},"]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class JSONItemScanner:
+    """
+    Incremental scanner for the top-level items of the first JSON array or object in LLM output.
+    feed() accepts text as it arrives and returns the raw text of every item completed so far, so
+    items can be used while the response is still streaming. Any prose or ```json fence before the
+    payload is skipped, and items are split on top-level commas only: one malformed item never takes
+    its neighbours down with it. For objects, an item is one `"key": value` pair.
+    """
+
+    def __init__(self):
+        self.container = None
+        self.closed = False
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._item_start = None
+
+    def _mark_start(self, start, end):
+        """Records where the current item begins if a non-blank character appears in buffer[start:end]."""
+        if self._depth == 1 and self._item_start is None:
+            segment = self._buffer[start:end]
+            stripped = segment.lstrip()
+            if stripped:
+                self._item_start = start + len(segment) - len(stripped)
+
+    def _emit(self, items, end):
+        if self._item_start is not None:
+            items.append(self._buffer[self._item_start:end].strip())
+            self._item_start = None
+
+    def feed(self, chunk):
+        """Consumes the next piece of text and returns the raw items it completed."""
+        self._buffer += chunk
+        buf, i, items = self._buffer, self._pos, []
+        while not self.closed:
+            if self.container is None:
+                match = _OPENERS.search(buf, i)
+                if not match:
+                    i = len(buf)
+                    break
+                self.container = match.group()
+                self._depth = 1
+                i = match.end()
+                continue
+            if self._in_string:
+                match = _STRING_SPECIAL.search(buf, i)
+                if not match:
+                    i = len(buf)
+                    break
+                if match.group() == "\\":
+                    if match.end() >= len(buf):
+                        # The escaped character has not arrived yet.
+                        i = match.start()
+                        break
+                    i = match.end() + 1
+                    continue
+                self._in_string = False
+                i = match.end()
+                continue
+            match = _STRUCTURAL.search(buf, i)
+            if not match:
+                self._mark_start(i, len(buf))
+                i = len(buf)
+                break
+            ch, j = match.group(), match.start()
+            if ch not in ",]}":
+                self._mark_start(i, j + 1)
+            else:
+                self._mark_start(i, j)
+            if ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                self._depth += 1
+            elif ch in "]}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(items, j)
+                    self.closed = True
+            elif self._depth == 1:
+                self._emit(items, j)
+            i = j + 1
+        # Keep only the unfinished item so long streams are not rescanned or copied over and over.
+        keep_from = self._item_start if self._item_start is not None else i
+        self._buffer = buf[keep_from:]
+        self._pos = i - keep_from
+        if self._item_start is not None:
+            self._item_start = 0
+        return items
+
+    def finish(self):
+        """Returns the trailing item of a payload that was cut off before its closing bracket."""
+        items = []
+        if not self.closed and self._item_start is not None:
+            self._emit(items, len(self._buffer))
+        return items
+
+    @property
+    def truncated(self):
+        return self.container is not None and not self.closed
+
+
+def _repair(raw):
+    """Cheap fixes for the mistakes models make most often: trailing commas and typographic quotes."""
+    raw = re.sub(r",\s*([\]}])", r"\1", raw)
+    return raw.replace("“", '"').replace("”", '"')
+
+
+def _decode(raw, wrap=None):
+    text = f"{wrap[0]}{raw}{wrap[1]}" if wrap else raw
+    try:
+        return json.loads(text)
+    except ValueError:
+        return json.loads(_repair(text))
+
+
+# --- Schemas ---
+class SchemaError(ValueError):
+    """An item does not match its payload schema."""
+
+
+def _text(value, field):
+    if not isinstance(value, str) or not value.strip():
+        raise SchemaError(f"'{field}' must be a non-empty string")
+    return value.strip()
+
+
+def _quiz_item(item):
+    if not isinstance(item, dict):
+        raise SchemaError("question is not an object")
+    question = _text(item.get("question"), "question")
+    options = item.get("options")
+    if not isinstance(options, list) or len(options) != 4:
+        raise SchemaError("'options' must be a list of 4 strings")
+    options = [_text(option, "options") for option in options]
+    if len({option.lower() for option in options}) != 4:
+        raise SchemaError("options are not distinct")
+    answer = item.get("answer")
+    if isinstance(answer, int) and not isinstance(answer, bool) and 0 <= answer < 4:
+        answer = options[answer]
+    answer = _text(answer, "answer")
+    by_text = {option.lower(): option for option in options}
+    if answer.lower() in by_text:
+        answer = by_text[answer.lower()]
+    else:
+        # "B", "B)" or "B) the option text" -> the option itself
+        letter = re.match(r"^\(?([A-Da-d])(?:\s*[).:]\s*(.*))?$", answer, re.S)
+        option = options["abcd".index(letter.group(1).lower())] if letter else None
+        if option is None or (letter.group(2) and letter.group(2).lower() != option.lower()):
+            raise SchemaError("'answer' is not one of the options")
+        answer = option
+    return {"question": question, "options": options, "answer": answer}
+
+
+def _flashcard_item(item):
+    if not isinstance(item, dict):
+        raise SchemaError("flashcard is not an object")
+    return {"front": _text(item.get("front"), "front"), "back": _text(item.get("back"), "back")}
+
+
+def _prerequisite_item(item):
+    return _text(item, "prerequisite")
+
+
+def _roadmap_entry(key, value):
+    day = re.search(r"\d+", key)
+    if not day:
+        raise SchemaError(f"'{key}' is not a day key")
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not value:
+        raise SchemaError(f"'{key}' must list its sub-topics")
+    return f"Day {int(day.group())}", [_text(sub_topic, key) for sub_topic in value]
+
+
+def _project_field(key, value):
+    if key not in ("title", "description"):
+        return None
+    return key, _text(value, key)
+
+
+class PayloadSchema:
+    """
+    Shape of one kind of JSON payload. Array payloads validate each element with validate(item);
+    object payloads validate each pair with validate(key, value), which may return None to ignore it.
+    identity(item) spots duplicates; required lists the keys an object payload cannot do without.
+    """
+
+    def __init__(self, kind, container, validate, identity=None, max_items=None, required=()):
+        self.kind = kind
+        self.container = container
+        self.validate = validate
+        self.identity = identity
+        self.max_items = max_items
+        self.required = tuple(required)
+
+
+SCHEMAS = {
+    "quiz": PayloadSchema("quiz", "array", _quiz_item, identity=lambda q: q["question"].lower()),
+    "flashcards": PayloadSchema("flashcards", "array", _flashcard_item, identity=lambda c: c["front"].lower()),
+    "prerequisites": PayloadSchema("prerequisites", "array", _prerequisite_item, identity=str.lower, max_items=3),
+    "roadmap": PayloadSchema("roadmap", "object", _roadmap_entry),
+    "project_idea": PayloadSchema("project_idea", "object", _project_field, required=("title", "description")),
+}
+
+
+class ParseResult:
+    """
+    The valid items salvaged from one or more responses, plus what was dropped and why.
+    expected is a count for array payloads or the list of keys an object payload must contain.
+    """
+
+    def __init__(self, schema, expected=None):
+        self.schema = schema
+        self.expected = expected
+        self.items = []
+        self.errors = []
+        self.truncated = False
+        self._seen = set()
+
+    def _add(self, item):
+        schema = self.schema
+        if schema.container == "object":
+            key, value = item
+            if any(existing == key for existing, _ in self.items):
+                return "duplicate key"
+            if isinstance(self.expected, (list, tuple)) and key not in self.expected:
+                return f"unexpected key '{key}'"
+            self.items.append(item)
+            return None
+        identity = schema.identity(item) if schema.identity else None
+        if identity is not None and identity in self._seen:
+            return "duplicate item"
+        limit = self.expected if isinstance(self.expected, int) else schema.max_items
+        if limit is not None and len(self.items) >= limit:
+            return "more items than requested"
+        self._seen.add(identity)
+        self.items.append(item)
+        return None
+
+    def add_raw(self, raw):
+        """Decodes and validates one raw item from the scanner; records the reason if it is dropped."""
+        index = len(self.items) + len(self.errors)
+        schema = self.schema
+        try:
+            if schema.container == "object":
+                candidates = []
+                for key, value in _decode(raw, "{}").items():
+                    pair = schema.validate(key, value)
+                    if pair is not None:
+                        candidates.append(pair)
+            else:
+                candidates = [schema.validate(_decode(raw))]
+        except (ValueError, AttributeError) as e:
+            self.errors.append((index, str(e) or type(e).__name__))
+            return []
+        added = []
+        for candidate in candidates:
+            reason = self._add(candidate)
+            if reason:
+                self.errors.append((index, reason))
+            else:
+                added.append(candidate)
+        return added
+
+    def add_wrapped(self, raw):
+        """Salvages an array payload the model wrapped in an object, e.g. {"questions": [...]}."""
+        try:
+            values = list(_decode(raw, "{}").values())
+        except ValueError as e:
+            self.errors.append((len(self.items) + len(self.errors), str(e)))
+            return []
+        added = []
+        for value in values:
+            for element in value if isinstance(value, list) else [value]:
+                added.extend(self.add_raw(json.dumps(element)))
+        return added
+
+    def merge(self, other):
+        """Adds the items of a follow-up response that fill gaps in this result."""
+        for item in other.items:
+            self._add(item)
+
+    @property
+    def data(self):
+        """The payload rebuilt from the valid items: a list, or a dict for object payloads."""
+        if self.schema.container == "object":
+            data = dict(self.items)
+            if self.schema.kind == "roadmap":
+                return dict(sorted(data.items(), key=lambda pair: int(pair[0].split()[1])))
+            return data
+        return list(self.items)
+
+    @property
+    def missing_keys(self):
+        if self.schema.container != "object":
+            return []
+        present = {key for key, _ in self.items}
+        wanted = self.expected if isinstance(self.expected, (list, tuple)) else self.schema.required
+        return [key for key in wanted if key not in present]
+
+    @property
+    def shortfall(self):
+        """How many items are still missing compared to what was asked for."""
+        if self.schema.container == "object":
+            return len(self.missing_keys)
+        if isinstance(self.expected, int):
+            return max(0, self.expected - len(self.items))
+        return 0 if self.items else 1
+
+    @property
+    def complete(self):
+        return self.shortfall == 0
+
+
+def _feed(result, scanner, raw_items):
+    added = []
+    for raw in raw_items:
+        if result.schema.container == "array" and scanner.container == "{":
+            added.extend(result.add_wrapped(raw))
+        else:
+            added.extend(result.add_raw(raw))
+    return added
+
+
+def parse(kind, text, expected=None):
+    """Parses a complete response for a payload kind in SCHEMAS, keeping every valid item."""
+    result = ParseResult(SCHEMAS[kind], expected)
+    scanner = JSONItemScanner()
+    _feed(result, scanner, scanner.feed(text or ""))
+    _feed(result, scanner, scanner.finish())
+    result.truncated = scanner.truncated
+    return result
+
+
+def iter_items(kind, chunks, expected=None):
+    """Yields validated items as soon as they are complete in a stream of text chunks."""
+    result = ParseResult(SCHEMAS[kind], expected)
+    scanner = JSONItemScanner()
+    for chunk in chunks:
+        yield from _feed(result, scanner, scanner.feed(chunk))
+    yield from _feed(result, scanner, scanner.finish())
+
+
+# --- Study packs (several artifacts in one response) ---
+_PACK_KEY = re.compile(r'^\s*"([^"]+)"\s*:\s*', re.S)
+
+
+class StudyPackResult:
+    """
+    The sections salvaged from a study pack response: title and summary strings (None when missing)
+    and a ParseResult each for the quiz and the flashcards, so one broken question costs only itself.
+    """
+
+    def __init__(self, num_questions, num_cards):
+        self.title = None
+        self.summary = None
+        self.quiz = ParseResult(SCHEMAS["quiz"], num_questions)
+        self.flashcards = ParseResult(SCHEMAS["flashcards"], num_cards)
+        self.errors = []
+
+    def add_section(self, key, raw_value):
+        """Adds one `"key": value` pair of the response; unknown keys are ignored."""
+        key = key.strip().lower()
+        if key in ("quiz", "flashcards"):
+            section = getattr(self, key)
+            parsed = parse(key, raw_value, expected=section.expected)
+            section.merge(parsed)
+            section.errors.extend(parsed.errors)
+            return
+        if key not in ("title", "summary"):
+            return
+        value = _decode(raw_value)
+        if isinstance(value, list):
+            # A summary sent as a list of bullet points
+            value = "\n".join(f"- {_text(point, key)}" for point in value)
+        setattr(self, key, _text(value, key))
+
+    @property
+    def empty(self):
+        return not (self.summary or self.quiz.items or self.flashcards.items)
+
+    def data(self):
+        return {"title": self.title, "summary": self.summary, "quiz": self.quiz.data, "flashcards": self.flashcards.data}
+
+
+def parse_study_pack(text, num_questions, num_cards):
+    """Parses a {"title", "summary", "quiz", "flashcards"} response section by section."""
+    result = StudyPackResult(num_questions, num_cards)
+    scanner = JSONItemScanner()
+    for raw in scanner.feed(text or "") + scanner.finish():
+        match = _PACK_KEY.match(raw)
+        if scanner.container != "{" or not match:
+            result.errors.append(raw[:40])
+            continue
+        try:
+            result.add_section(match.group(1), raw[match.end():])
+        except ValueError as e:
+            result.errors.append(f"{match.group(1)}: {e}")
+    return result
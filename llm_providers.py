@@ -0,0 +1,274 @@
+# llm_providers.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+
+from config import Config
+from resilience import EmptyResponseError, InvalidResponseError, UpstreamRequestError
+from response_cache import normalize_prompt
+
+logger = logging.getLogger(__name__)
+
+
+class LLMProvider:
+    """
+    Interface for the model backends behind AIClient.
+    generate() returns the full text; open_stream() performs the request and returns an async
+    iterator of text chunks, so connection errors surface (and can be retried) before streaming starts.
+    """
+
+    name = "base"
+    # Responses from providers with a namespace are cached separately from real Gemini answers.
+    cache_namespace = ""
+
+    async def generate(self, prompt, model_name, method):
+        raise NotImplementedError
+
+    async def open_stream(self, prompt, model_name, method):
+        raise NotImplementedError
+
+
+# --- Gemini ---
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, api_key=None):
+        import google.generativeai as genai
+
+        api_key = api_key or Config.GEMINI_API_KEY
+        if not api_key:
+            raise ValueError("Gemini API key not found. Please set GEMINI_API_KEY in environment.")
+        genai.configure(api_key=api_key)
+        self._genai = genai
+        self._models = {}
+
+    def _model(self, model_name):
+        if model_name not in self._models:
+            self._models[model_name] = self._genai.GenerativeModel(model_name)
+        return self._models[model_name]
+
+    def _extract_text(self, response):
+        """Extracts reliable text output from any Gemini response structure."""
+        if not response:
+            raise EmptyResponseError("No response received from Gemini.")
+        if hasattr(response, "text") and response.text:
+            return response.text.strip()
+        try:
+            candidates = getattr(response, "candidates", [])
+            for cand in candidates:
+                parts = getattr(cand.content, "parts", [])
+                text_segments = []
+                for p in parts:
+                    if isinstance(p, dict) and "text" in p:
+                        text_segments.append(p["text"])
+                    elif hasattr(p, "text"):
+                        text_segments.append(p.text)
+                if text_segments:
+                    return "\n".join(text_segments).strip()
+        except Exception as e:
+            logger.debug("Could not extract text parts from a Gemini response: %s", e)
+        raise InvalidResponseError("Gemini returned a response without any text parts.")
+
+    def _chunk_text(self, chunk):
+        """Returns the text of a streamed chunk, or an empty string for chunks without text parts."""
+        try:
+            return chunk.text or ""
+        except (ValueError, AttributeError):
+            return ""
+
+    async def generate(self, prompt, model_name, method):
+        response = await self._model(model_name).generate_content_async(prompt)
+        return self._extract_text(response)
+
+    async def open_stream(self, prompt, model_name, method):
+        response = await self._model(model_name).generate_content_async(prompt, stream=True)
+
+        async def chunks():
+            async for chunk in response:
+                text = self._chunk_text(chunk)
+                if text:
+                    yield text
+        return chunks()
+
+
+# --- Deterministic local stand-in ---
+class FakeProvider(LLMProvider):
+    """
+    Offline provider for benchmarks and load tests. Answers are deterministic per prompt and shaped
+    like the real ones (valid quiz/flashcard/roadmap JSON), with configurable simulated latency.
+    """
+
+    name = "fake"
+    cache_namespace = "fake"
+
+    def __init__(self, latency_seconds=None, jitter_seconds=None):
+        self.latency_seconds = latency_seconds if latency_seconds is not None else Config.FAKE_LLM_LATENCY_SECONDS
+        self.jitter_seconds = jitter_seconds if jitter_seconds is not None else Config.FAKE_LLM_JITTER_SECONDS
+
+    def _rng(self, prompt):
+        seed = int(hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()[:16], 16)
+        return random.Random(seed)
+
+    async def _simulate_latency(self, rng):
+        await asyncio.sleep(self.latency_seconds + rng.uniform(0, self.jitter_seconds))
+
+    def _subject(self, prompt):
+        """Best-effort subject of the prompt: a quoted topic, or the first words of the analyzed content."""
+        quoted = re.search(r"""(?:topic|concept of|learning about|struggling with the topic:)\s*['"]([^'"]+)['"]""", prompt)
+        if quoted:
+            return quoted.group(1)
+        content = re.search(r"---\s*(.+?)\s*---", prompt, re.S) or re.search(r'TEXT: """(.+?)"""', prompt, re.S)
+        words = re.findall(r"[A-Za-z][A-Za-z0-9+#-]*", content.group(1) if content else prompt)
+        return " ".join(words[:3]) or "General Knowledge"
+
+    def _count(self, prompt, default):
+        match = re.search(r"Generate exactly (\d+)", prompt)
+        return int(match.group(1)) if match else default
+
+    def respond(self, prompt, method):
+        """Builds the canned response text for a prompt."""
+        rng = self._rng(prompt)
+        subject = self._subject(prompt)
+        if method == "quiz":
+            questions = []
+            for i in range(self._count(prompt, 5)):
+                options = [f"{subject} fact {i + 1}{letter}" for letter in "ABCD"]
+                questions.append({"question": f"Question {i + 1} about {subject}?", "options": options,
+                                  "answer": options[rng.randrange(4)]})
+            return json.dumps(questions)
+        if method == "flashcards":
+            return json.dumps([{"front": f"{subject} term {i + 1}", "back": f"Definition {i + 1} of {subject}."}
+                               for i in range(self._count(prompt, 5))])
+        if method == "roadmap":
+            days = re.search(r"completed in (\d+) days", prompt)
+            days = int(days.group(1)) if days else 3
+            return json.dumps({f"Day {d}": [f"{subject} part {d}.{k}" for k in range(1, 3)] for d in range(1, days + 1)})
+        if method == "prerequisites":
+            return json.dumps([f"Foundations of {subject}", f"Introduction to {subject}"][: rng.randint(1, 2)])
+        if method == "project_idea":
+            return json.dumps({"title": f"Build a {subject} Mini-Project",
+                               "description": f"Apply what you learned about {subject} in a small hands-on project."})
+        if method == "study_pack":
+            questions = re.search(r"exactly (\d+) multiple-choice", prompt)
+            cards = re.search(r"exactly (\d+) flashcards", prompt)
+            pack = {"title": subject.title()} if '"title"' in prompt else {}
+            pack["summary"] = f"- {subject} in brief.\n- Key points of {subject}."
+            if questions:
+                pack["quiz"] = json.loads(self.respond(f"Generate exactly {questions.group(1)}\n---{subject}---", "quiz"))
+            if cards:
+                pack["flashcards"] = json.loads(self.respond(f"Generate exactly {cards.group(1)}\n---{subject}---", "flashcards"))
+            return json.dumps(pack)
+        if method == "topic_title":
+            return subject.title()
+        if method == "diagram":
+            return (f"{subject} connects a few core ideas.\n\n```dot\ndigraph G {{\n"
+                    f'    "{subject}" -> "Core Idea";\n    "Core Idea" -> "Example";\n}}\n```')
+        if method == "knowledge_graph":
+            return f'digraph G {{\n    "{subject}" -> "Core Idea" [label="includes"];\n    "Core Idea" -> "Example" [label="illustrated by"];\n}}'
+        sentences = [f"{subject} is explained here in simple terms (note {rng.randint(1, 999)})."] + \
+                    [f"- Key point {i + 1} about {subject}." for i in range(rng.randint(3, 6))]
+        return "\n".join(sentences)
+
+    async def generate(self, prompt, model_name, method):
+        await self._simulate_latency(self._rng(prompt))
+        return self.respond(prompt, method)
+
+    async def open_stream(self, prompt, model_name, method):
+        rng = self._rng(prompt)
+        text = self.respond(prompt, method)
+        pieces = re.findall(r"\S+\s*", text)
+        # Time to first chunk is a fraction of the full simulated latency, as with a real stream.
+        step = (self.latency_seconds + rng.uniform(0, self.jitter_seconds)) / max(len(pieces), 1)
+        await asyncio.sleep(step)
+
+        async def chunks():
+            for piece in pieces:
+                yield piece
+                await asyncio.sleep(step)
+        return chunks()
+
+
+# --- Record / replay ---
+class RecordReplayProvider(LLMProvider):
+    """
+    Captures responses from an inner provider to cassette files ("record") and serves them back
+    without network access ("replay"). One JSON cassette per (method, normalized prompt): the model that
+    answered is recorded but not part of the key, so a session still replays after the router falls back
+    to another tier.
+    """
+
+    name = "replay"
+
+    def __init__(self, cassette_dir=None, mode="replay", inner=None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown record/replay mode: {mode}")
+        if mode == "record" and inner is None:
+            raise ValueError("Recording requires an inner provider.")
+        self.cassette_dir = cassette_dir or Config.LLM_CASSETTE_DIR
+        self.mode = mode
+        self.inner = inner
+        self.name = mode
+        os.makedirs(self.cassette_dir, exist_ok=True)
+
+    def _path(self, prompt, method):
+        digest = hashlib.sha256(f"{method}:{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cassette_dir, f"{method}-{digest[:24]}.json")
+
+    def _load(self, prompt, method):
+        path = self._path(prompt, method)
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)["response"]
+        except FileNotFoundError:
+            raise UpstreamRequestError(f"No recorded response for this {method} prompt ({os.path.basename(path)}).")
+
+    def _save(self, prompt, model_name, method, response):
+        path = self._path(prompt, method)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model": model_name, "method": method, "prompt": prompt, "response": response}, f, indent=2)
+        os.replace(tmp_path, path)
+
+    async def generate(self, prompt, model_name, method):
+        if self.mode == "replay":
+            return self._load(prompt, method)
+        response = await self.inner.generate(prompt, model_name, method)
+        self._save(prompt, model_name, method, response)
+        return response
+
+    async def open_stream(self, prompt, model_name, method):
+        if self.mode == "replay":
+            text = self._load(prompt, method)
+
+            async def replayed():
+                for piece in re.findall(r"\S+\s*", text):
+                    yield piece
+            return replayed()
+
+        inner_chunks = await self.inner.open_stream(prompt, model_name, method)
+
+        async def recorded():
+            pieces = []
+            async for piece in inner_chunks:
+                pieces.append(piece)
+                yield piece
+            self._save(prompt, model_name, method, "".join(pieces).strip())
+        return recorded()
+
+
+def build_provider(name=None):
+    """Creates the provider selected by Config.LLM_PROVIDER: gemini, fake, record or replay."""
+    name = (name or Config.LLM_PROVIDER).lower()
+    if name == "gemini":
+        return GeminiProvider()
+    if name == "fake":
+        return FakeProvider()
+    if name == "record":
+        return RecordReplayProvider(mode="record", inner=GeminiProvider())
+    if name == "replay":
+        return RecordReplayProvider(mode="replay")
+    raise ValueError(f"Unknown LLM provider '{name}'. Use gemini, fake, record or replay.")
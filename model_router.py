@@ -0,0 +1,108 @@
+# model_router.py
+import threading
+import time
+
+from config import Config
+
+
+class ModelHealth:
+    """Rolling latency and error state for one model."""
+
+    def __init__(self):
+        self.ewma_latency = None
+        self.latency_updated = 0.0
+        self.consecutive_errors = 0
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    def as_dict(self):
+        return {
+            "ewma_latency": round(self.ewma_latency, 3) if self.ewma_latency is not None else None,
+            "consecutive_errors": self.consecutive_errors,
+            "cooling_down": self.cooldown_until > time.monotonic(),
+            "calls": self.calls,
+            "errors": self.errors,
+        }
+
+
+class ModelRouter:
+    """
+    Picks a model per task type. Each AIClient method maps to a tier (Config.METHOD_TIERS); a tier
+    that is erroring or slower than its latency budget is moved behind the other tiers until it recovers.
+    """
+
+    def __init__(self, tiers=None, method_tiers=None, default_tier=None, latency_budgets=None,
+                 error_threshold=None, cooldown_seconds=None, smoothing=0.3):
+        self.tiers = dict(tiers or Config.MODEL_TIERS)
+        self.method_tiers = dict(method_tiers or Config.METHOD_TIERS)
+        self.default_tier = default_tier or Config.DEFAULT_MODEL_TIER
+        self.latency_budgets = dict(latency_budgets or Config.MODEL_TIER_LATENCY_BUDGETS)
+        self.error_threshold = error_threshold or Config.ROUTER_ERROR_THRESHOLD
+        self.cooldown_seconds = cooldown_seconds or Config.ROUTER_COOLDOWN_SECONDS
+        self.smoothing = smoothing
+        self._health = {model: ModelHealth() for model in self.tiers.values()}
+        self._lock = threading.Lock()
+        self._fallbacks = 0
+
+    def tier_for(self, method):
+        return self.method_tiers.get(method, self.default_tier)
+
+    def primary_model(self, method):
+        """The model a method is routed to when every tier is healthy; used for cache keys."""
+        return self.tiers[self.tier_for(method)]
+
+    def _degraded(self, tier, now):
+        health = self._health[self.tiers[tier]]
+        if health.cooldown_until > now:
+            return True
+        budget = self.latency_budgets.get(tier)
+        if budget is None or health.ewma_latency is None:
+            return False
+        # A slow verdict expires after the cooldown so the tier gets probed with live traffic again.
+        return health.ewma_latency > budget and now - health.latency_updated < self.cooldown_seconds
+
+    def candidates(self, method):
+        """Models to try, in order: the method's tier, then the remaining tiers; degraded tiers go last."""
+        primary = self.tier_for(method)
+        order = [primary] + [tier for tier in self.tiers if tier != primary]
+        now = time.monotonic()
+        with self._lock:
+            healthy = [tier for tier in order if not self._degraded(tier, now)]
+            degraded = [tier for tier in order if tier not in healthy]
+        models = []
+        for tier in healthy + degraded:
+            if self.tiers[tier] not in models:
+                models.append(self.tiers[tier])
+        return models
+
+    def record_success(self, model, latency, fallback=False):
+        with self._lock:
+            health = self._health.setdefault(model, ModelHealth())
+            health.calls += 1
+            health.consecutive_errors = 0
+            if health.ewma_latency is None:
+                health.ewma_latency = latency
+            else:
+                health.ewma_latency = self.smoothing * latency + (1 - self.smoothing) * health.ewma_latency
+            health.latency_updated = time.monotonic()
+            if fallback:
+                self._fallbacks += 1
+
+    def record_failure(self, model):
+        with self._lock:
+            health = self._health.setdefault(model, ModelHealth())
+            health.calls += 1
+            health.errors += 1
+            health.consecutive_errors += 1
+            if health.consecutive_errors >= self.error_threshold:
+                health.cooldown_until = time.monotonic() + self.cooldown_seconds
+                # Forget the stale latency so the model is judged afresh after the cooldown.
+                health.ewma_latency = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "fallbacks": self._fallbacks,
+                "models": {model: health.as_dict() for model, health in self._health.items()},
+            }
@@ -0,0 +1,202 @@
+# pdf_engine.py
+import atexit
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from PyPDF2 import PdfReader
+
+from config import Config
+
+
+class PdfLimitError(ValueError):
+    """The PDF is larger than PDF_MAX_BYTES or has more than PDF_MAX_PAGES pages."""
+
+
+class PageResult:
+    """Text of one page (1-based number) and how long its extraction took."""
+
+    __slots__ = ("number", "text", "seconds")
+
+    def __init__(self, number, text, seconds):
+        self.number = number
+        self.text = text
+        self.seconds = seconds
+
+
+class ExtractionStats:
+    """Timing summary of one extraction, filled in as pages are consumed."""
+
+    def __init__(self):
+        self.page_count = 0
+        self.parallel = False
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.page_seconds = []
+
+    def begin(self, page_count, parallel):
+        self.page_count = page_count
+        self.parallel = parallel
+        self.started = time.perf_counter()
+
+    def record(self, page):
+        self.page_seconds.append((page.seconds, page.number))
+        self.elapsed = time.perf_counter() - self.started
+
+    def slowest(self, n=3):
+        return [(number, seconds) for seconds, number in sorted(self.page_seconds, reverse=True)[:n]]
+
+    def as_dict(self):
+        busy = sum(seconds for seconds, _ in self.page_seconds)
+        return {
+            "pages": len(self.page_seconds),
+            "parallel": self.parallel,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "cpu_seconds": round(busy, 3),
+            "mean_page_ms": round(busy / len(self.page_seconds) * 1000, 2) if self.page_seconds else 0.0,
+            "slowest_pages": [(number, round(seconds, 3)) for number, seconds in self.slowest()],
+        }
+
+
+# --- Worker side ---
+# Each worker keeps the reader of the job it last worked on, so consecutive batches skip re-parsing.
+_worker_reader = (None, None)
+
+
+def _extract_batch(job_id, path, first, last):
+    """Extracts pages first..last (0-based, inclusive) of the PDF at path; runs in a pool process."""
+    global _worker_reader
+    if _worker_reader[0] != job_id:
+        _worker_reader = (job_id, PdfReader(path))
+    reader = _worker_reader[1]
+    results = []
+    for index in range(first, last + 1):
+        started = time.perf_counter()
+        try:
+            text = reader.pages[index].extract_text() or ""
+        except Exception:
+            # One unreadable page should not cost the rest of the document.
+            text = ""
+        results.append((index + 1, text, time.perf_counter() - started))
+    return results
+
+
+# --- Pool ---
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """The process pool shared by every session; spawned rather than forked because the app process runs threads."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=Config.PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+
+def _reset_pool():
+    """Drops a pool whose worker died (e.g. killed for memory) so the next document gets a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _local_pages(reader, start=0):
+    for index in range(start, len(reader.pages)):
+        started = time.perf_counter()
+        try:
+            text = reader.pages[index].extract_text() or ""
+        except Exception:
+            text = ""
+        yield PageResult(index + 1, text, time.perf_counter() - started)
+
+
+def check_limits(data, max_bytes=None, max_pages=None):
+    """Opens the PDF just far enough to count pages; raises PdfLimitError before any text is extracted."""
+    max_bytes = max_bytes or Config.PDF_MAX_BYTES
+    max_pages = max_pages or Config.PDF_MAX_PAGES
+    if len(data) > max_bytes:
+        raise PdfLimitError(f"The PDF is {len(data) / 2**20:.1f} MB; the limit is {max_bytes / 2**20:.0f} MB.")
+    reader = PdfReader(BytesIO(data))
+    page_count = len(reader.pages)
+    if page_count > max_pages:
+        raise PdfLimitError(f"The PDF has {page_count} pages; the limit is {max_pages}.")
+    return reader, page_count
+
+
+def iter_pages(data, stats=None, max_bytes=None, max_pages=None):
+    """
+    Yields a PageResult per page, in page order, as soon as each page is ready, so callers can
+    start chunking or indexing before the whole document is extracted. Large PDFs are split into
+    batches of PDF_PAGES_PER_TASK pages across the process pool; small ones are extracted in-process.
+    """
+    reader, page_count = check_limits(data, max_bytes, max_pages)
+    parallel = Config.PDF_WORKERS > 1 and page_count >= Config.PDF_PARALLEL_MIN_PAGES
+    if stats is not None:
+        stats.begin(page_count, parallel)
+
+    if not parallel:
+        for result in _local_pages(reader):
+            if stats is not None:
+                stats.record(result)
+            yield result
+        return
+
+    # Workers read the bytes from a temporary file instead of receiving a pickled copy per batch.
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    futures = []
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        pool = _get_pool()
+        batch = Config.PDF_PAGES_PER_TASK
+        job_id = uuid.uuid4().hex
+        futures = [pool.submit(_extract_batch, job_id, path, first, min(first + batch, page_count) - 1)
+                   for first in range(0, page_count, batch)]
+        next_page = 1
+        for future in futures:
+            try:
+                batch_results = [PageResult(*page) for page in future.result()]
+            except BrokenProcessPool:
+                _reset_pool()
+                futures = []
+                batch_results = _local_pages(reader, next_page - 1)
+            for result in batch_results:
+                next_page = result.number + 1
+                if stats is not None:
+                    stats.record(result)
+                yield result
+            if not futures:
+                break
+    finally:
+        # Also runs when the consumer stops early: drop queued batches and the temp file.
+        for future in futures:
+            future.cancel()
+        for future in futures:
+            if not future.cancelled():
+                try:
+                    future.result()
+                except Exception:
+                    pass
+        os.remove(path)
+
+
+def extract_pages(data, stats=None, on_page=None, max_bytes=None, max_pages=None):
+    """Collects iter_pages() into a list of page texts; on_page(done, total) is called after each page."""
+    stats = stats if stats is not None else ExtractionStats()
+    pages = []
+    for page in iter_pages(data, stats, max_bytes, max_pages):
+        pages.append(page.text)
+        if on_page:
+            on_page(page.number, stats.page_count)
+    return pages
@@ -0,0 +1,192 @@
+# prerequisites.py
+import asyncio
+import collections
+import datetime
+import heapq
+import threading
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+from config import Config
+from content_packs import normalize
+from database import PrerequisiteEdge, PrerequisiteTopic
+from fair_scheduler import current_user, quota_prepaid
+from resilience import AIClientError
+
+
+async def fetch_prerequisites(client, topics):
+    """
+    {topic: [prerequisite names]} asked concurrently; topics whose request failed are left out and asked again
+    later. The batch is charged to the user's quota as one request, as doc_pipeline does for a document, so a
+    batch larger than the user's burst is not cut short by UserQuotaExceededError.
+    """
+    client.scheduler.check_quota(current_user.get())
+    quota_prepaid.set(True)
+    results = await asyncio.gather(*(client.aget_prerequisite_list(topic) for topic in topics), return_exceptions=True)
+    found = {}
+    for topic, result in zip(topics, results):
+        if isinstance(result, AIClientError):
+            continue
+        if isinstance(result, BaseException):
+            raise result
+        found[topic] = result
+    return found
+
+
+class PrerequisiteGraph:
+    """
+    In-process memo of the stored prerequisite DAG. A topic's prerequisites are fixed once stored (the first
+    answer wins), so each expanded topic is read from the database at most once per process, and walks and
+    review orders over known topics need no queries or model calls at all.
+    """
+
+    def __init__(self, max_topics=None):
+        self.max_topics = max_topics or Config.PREREQ_MEMO_TOPICS
+        self._names = {}
+        # key -> prerequisite keys, only for topics whose prerequisites have been asked for
+        self._prerequisites = {}
+        self._lock = threading.Lock()
+
+    def _load(self, db, keys):
+        """Memoizes the stored prerequisites of keys in two queries; returns the keys never expanded."""
+        with self._lock:
+            missing = [key for key in keys if key not in self._prerequisites]
+        if not missing:
+            return []
+        topics = db.query(PrerequisiteTopic.id, PrerequisiteTopic.key, PrerequisiteTopic.name, PrerequisiteTopic.expanded_at) \
+            .filter(PrerequisiteTopic.key.in_(missing)).all()
+        expanded = {topic_id: key for topic_id, key, _, expanded_at in topics if expanded_at}
+        edges = collections.defaultdict(list)
+        if expanded:
+            rows = db.query(PrerequisiteEdge.topic_id, PrerequisiteTopic.key, PrerequisiteTopic.name) \
+                .join(PrerequisiteTopic, PrerequisiteEdge.prerequisite_id == PrerequisiteTopic.id) \
+                .filter(PrerequisiteEdge.topic_id.in_(expanded)).order_by(PrerequisiteEdge.id)
+            for topic_id, key, name in rows:
+                edges[expanded[topic_id]].append((key, name))
+        with self._lock:
+            for _, key, name, _ in topics:
+                self._names[key] = name
+            for key in expanded.values():
+                self._prerequisites[key] = [prerequisite for prerequisite, _ in edges[key]]
+                for prerequisite, name in edges[key]:
+                    self._names.setdefault(prerequisite, name)
+            return [key for key in missing if key not in self._prerequisites]
+
+    def _store(self, db, found):
+        """Stores {topic name: [prerequisite names]} with bulk inserts; topics someone else expanded first keep that answer."""
+        names = {}
+        for topic, prerequisites in found.items():
+            for name in [topic, *prerequisites]:
+                if normalize(name):
+                    names.setdefault(normalize(name), name)
+        parents = {normalize(topic) for topic in found if normalize(topic)}
+        for attempt in range(2):
+            try:
+                rows = db.query(PrerequisiteTopic.key, PrerequisiteTopic.id, PrerequisiteTopic.expanded_at) \
+                    .filter(PrerequisiteTopic.key.in_(names)).all()
+                ids = {key: topic_id for key, topic_id, _ in rows}
+                fresh = parents - {key for key, _, expanded_at in rows if expanded_at}
+                new = [key for key in names if key not in ids]
+                if new:
+                    db.execute(insert(PrerequisiteTopic), [{"key": key, "name": names[key]} for key in new])
+                    ids.update(db.query(PrerequisiteTopic.key, PrerequisiteTopic.id).filter(PrerequisiteTopic.key.in_(new)).all())
+                if fresh:
+                    db.execute(update(PrerequisiteTopic).where(PrerequisiteTopic.id.in_([ids[key] for key in fresh]))
+                               .values(expanded_at=datetime.datetime.utcnow()))
+                edges = []
+                for topic, prerequisites in found.items():
+                    if normalize(topic) in fresh:
+                        keys = dict.fromkeys(normalize(p) for p in prerequisites if normalize(p) not in ("", normalize(topic)))
+                        edges += [{"topic_id": ids[normalize(topic)], "prerequisite_id": ids[key]} for key in keys]
+                if edges:
+                    db.execute(insert(PrerequisiteEdge), edges)
+                db.commit()
+                return
+            except IntegrityError:
+                # Another session stored some of these topics first; retry against what it wrote.
+                db.rollback()
+                if attempt:
+                    # Still racing it: leave these topics unstored, to be asked again on a later walk.
+                    return
+
+    def unexpanded(self, db, topics):
+        """The topics whose prerequisites have never been asked for."""
+        keys = {normalize(topic): topic for topic in topics if normalize(topic)}
+        missing = set(self._load(db, list(keys)))
+        return [topic for key, topic in keys.items() if key in missing]
+
+    def expand(self, db, topics, fetch=None, depth=None, limit=None):
+        """
+        Breadth-first walk from topics through at most `depth` levels of prerequisites; returns the keys
+        reached, nearest first. Known topics come from the memo or the database. With fetch (a callable
+        taking topic names and returning {name: [prerequisites]}), topics never expanded are asked about in
+        one concurrent batch per level, at most `limit` in all, and stored for every later walk.
+        """
+        depth = Config.PREREQ_MAX_DEPTH if depth is None else depth
+        limit = Config.PREREQ_MAX_FETCH if limit is None else limit
+        with self._lock:
+            if len(self._prerequisites) > self.max_topics:
+                self._prerequisites.clear()
+                self._names.clear()
+            for topic in topics:
+                if normalize(topic):
+                    self._names.setdefault(normalize(topic), topic)
+        level = list(dict.fromkeys(normalize(topic) for topic in topics if normalize(topic)))
+        reached = dict.fromkeys(level)
+        asked = 0
+        for _ in range(depth):
+            unknown = self._load(db, level)
+            if unknown and fetch and asked < limit:
+                batch = unknown[:limit - asked]
+                asked += len(batch)
+                found = fetch([self._names[key] for key in batch])
+                if found:
+                    self._store(db, found)
+                    self._load(db, batch)
+            following = []
+            for key in level:
+                for prerequisite in self._prerequisites.get(key, []):
+                    if prerequisite not in reached:
+                        reached[prerequisite] = None
+                        following.append(prerequisite)
+            if not following:
+                break
+            level = following
+        return list(reached)
+
+    def review_order(self, db, topics, fetch=None, depth=None):
+        """
+        [(name, is_one_of_topics)] for topics and their known prerequisites, each after its prerequisites and
+        deeper foundations first among those ready. A cycle in the model's answers is broken at the topic
+        with the fewest unmet prerequisites.
+        """
+        keys = self.expand(db, topics, fetch, depth)
+        position = {key: i for i, key in enumerate(keys)}
+        with self._lock:
+            prerequisites = {key: {p for p in self._prerequisites.get(key, []) if p in position} for key in keys}
+            names = {key: self._names.get(key, key) for key in keys}
+        requested = {normalize(topic) for topic in topics}
+        unmet = {key: len(prerequisites[key]) for key in keys}
+        unlocks = collections.defaultdict(list)
+        for key, before in prerequisites.items():
+            for prerequisite in before:
+                unlocks[prerequisite].append(key)
+
+        ready = [(-position[key], key) for key in keys if not unmet[key]]
+        heapq.heapify(ready)
+        order, done = [], set()
+        while len(order) < len(keys):
+            if not ready:
+                key = min((k for k in keys if k not in done), key=lambda k: (unmet[k], -position[k]))
+                heapq.heappush(ready, (-position[key], key))
+            _, key = heapq.heappop(ready)
+            if key in done:
+                continue
+            done.add(key)
+            order.append(key)
+            for later in unlocks[key]:
+                unmet[later] -= 1
+                if unmet[later] == 0 and later not in done:
+                    heapq.heappush(ready, (-position[later], later))
+        return [(names[key], key in requested) for key in order]
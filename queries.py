@@ -0,0 +1,233 @@
+# queries.py
+import collections
+import datetime
+import json
+import threading
+import time
+
+from sqlalchemy import func, insert, literal, select, tuple_, update
+
+from config import Config
+from database import Flashcard, FlashcardDeck, QuizCollection, QuizQuestion, User
+
+
+class DeckRow:
+    """A flashcard deck as the collection and community pages list it: no relationships to lazy-load."""
+
+    __slots__ = ("id", "topic_name", "user_id", "creator", "is_public", "timestamp", "clone_count", "card_count")
+
+    def __init__(self, id, topic_name, user_id, creator, is_public, timestamp, clone_count, card_count):
+        self.id = id
+        self.topic_name = topic_name
+        self.user_id = user_id
+        self.creator = creator or "Unknown"
+        self.is_public = is_public
+        self.timestamp = timestamp
+        self.clone_count = clone_count
+        self.card_count = card_count
+
+
+class QuizRow:
+    """A saved quiz as the collection and community pages list it."""
+
+    __slots__ = ("id", "topic_name", "user_id", "creator", "is_public", "timestamp", "clone_count", "question_count")
+
+    def __init__(self, id, topic_name, user_id, creator, is_public, timestamp, clone_count, question_count):
+        self.id = id
+        self.topic_name = topic_name
+        self.user_id = user_id
+        self.creator = creator or "Unknown"
+        self.is_public = is_public
+        self.timestamp = timestamp
+        self.clone_count = clone_count
+        self.question_count = question_count
+
+
+# --- Listings (one query each) ---
+# Counts are correlated subqueries, so they are computed only for the rows a page returns.
+_LISTINGS = {
+    "decks": (FlashcardDeck, Flashcard, Flashcard.deck_id, DeckRow),
+    "quizzes": (QuizCollection, QuizQuestion, QuizQuestion.collection_id, QuizRow),
+}
+
+
+def _listing(db, kind):
+    model, child, parent_key, _ = _LISTINGS[kind]
+    count = select(func.count(child.id)).where(parent_key == model.id).correlate(model).scalar_subquery()
+    return db.query(model.id, model.topic_name, model.user_id, User.username, model.is_public, model.timestamp,
+                    model.clone_count, count).outerjoin(User, User.id == model.user_id)
+
+
+def _rows(kind, rows):
+    return [_LISTINGS[kind][3](*row) for row in rows]
+
+
+def _deck_rows(db, *criteria):
+    return _rows("decks", _listing(db, "decks").filter(*criteria).order_by(FlashcardDeck.id))
+
+
+def _quiz_rows(db, *criteria):
+    return _rows("quizzes", _listing(db, "quizzes").filter(*criteria).order_by(QuizCollection.id))
+
+
+def list_user_decks(db, user_id):
+    return _deck_rows(db, FlashcardDeck.user_id == user_id)
+
+
+def list_user_quizzes(db, user_id):
+    return _quiz_rows(db, QuizCollection.user_id == user_id)
+
+
+def list_public_decks(db):
+    return _deck_rows(db, FlashcardDeck.is_public.is_(True))
+
+
+def list_public_quizzes(db):
+    return _quiz_rows(db, QuizCollection.is_public.is_(True))
+
+
+# --- Community Hub (keyset pages) ---
+SORTS = {"recent": "timestamp", "popular": "clone_count"}
+
+
+class Page:
+    """One page of a community listing; next_cursor is None on the last page."""
+
+    __slots__ = ("rows", "next_cursor")
+
+    def __init__(self, rows, next_cursor):
+        self.rows = rows
+        self.next_cursor = next_cursor
+
+
+def _encode_cursor(sort, row):
+    value = row.timestamp.isoformat() if sort == "recent" else row.clone_count
+    return f"{value}|{row.id}"
+
+
+def _decode_cursor(sort, cursor):
+    value, row_id = cursor.rsplit("|", 1)
+    return (datetime.datetime.fromisoformat(value) if sort == "recent" else int(value)), int(row_id)
+
+
+def community_page(db, kind, sort="recent", topic="", creator="", cursor=None, page_size=None):
+    """
+    One page of public decks or quizzes ("decks"/"quizzes"), newest or most added first, optionally
+    filtered by a topic substring and a creator's username. Pages are keyset-paginated: cursor is the
+    previous page's next_cursor, and the query walks the (is_public, sort key, id) index from there, so
+    its cost depends on the page size rather than on how much has been published.
+    """
+    model = _LISTINGS[kind][0]
+    page_size = page_size or Config.COMMUNITY_PAGE_SIZE
+    order = getattr(model, SORTS[sort])
+    query = _listing(db, kind).filter(model.is_public.is_(True))
+    if topic:
+        query = query.filter(model.topic_name.icontains(topic, autoescape=True))
+    if creator:
+        creator_id = db.query(User.id).filter(func.lower(User.username) == creator.lower()).scalar()
+        if creator_id is None:
+            return Page([], None)
+        query = query.filter(model.user_id == creator_id)
+    if cursor:
+        query = query.filter(tuple_(order, model.id) < tuple_(*_decode_cursor(sort, cursor)))
+    rows = _rows(kind, query.order_by(order.desc(), model.id.desc()).limit(page_size + 1))
+    next_cursor = _encode_cursor(sort, rows[page_size - 1]) if len(rows) > page_size else None
+    return Page(rows[:page_size], next_cursor)
+
+
+class PageCache:
+    """
+    Community pages by (kind, sort, filters, cursor), kept for COMMUNITY_CACHE_SECONDS. Publishing, adding
+    or deleting public content calls invalidate(); the TTL bounds staleness from other server processes.
+    """
+
+    def __init__(self, ttl_seconds=None, max_pages=None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.COMMUNITY_CACHE_SECONDS
+        self.max_pages = max_pages or Config.COMMUNITY_CACHE_PAGES
+        self._pages = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def page(self, db, kind, sort="recent", topic="", creator="", cursor=None):
+        key = (kind, sort, topic.strip().lower(), creator.strip().lower(), cursor)
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl_seconds:
+                self._pages.move_to_end(key)
+                return entry[1]
+        page = community_page(db, kind, sort, topic.strip(), creator.strip(), cursor)
+        with self._lock:
+            self._pages[key] = (time.monotonic(), page)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        return page
+
+    def invalidate(self):
+        with self._lock:
+            self._pages.clear()
+
+
+community_cache = PageCache()
+
+
+# --- Actions ---
+def quiz_items(db, collection_id):
+    """A saved quiz's questions in the shape the quiz page plays ({"question", "options", "answer"})."""
+    rows = db.query(QuizQuestion.question_text, QuizQuestion.options, QuizQuestion.correct_answer) \
+        .filter(QuizQuestion.collection_id == collection_id).order_by(QuizQuestion.id)
+    return [{"question": text, "options": json.loads(options), "answer": answer} for text, options, answer in rows]
+
+
+def clone_deck(db, deck_id, user_id):
+    """
+    Copies a public deck and its cards (fresh review schedule) into user_id's collection; returns the new deck
+    id, or None if the deck was deleted or made private since the (cached) community page listed it.
+    """
+    deck = db.query(FlashcardDeck).filter(FlashcardDeck.id == deck_id, FlashcardDeck.is_public.is_(True)).first()
+    if deck is None:
+        community_cache.invalidate()
+        return None
+    copy = FlashcardDeck(topic_name=deck.topic_name, user_id=user_id, is_public=False)
+    db.add(copy)
+    db.flush()
+    cards = select(Flashcard.front, Flashcard.back, literal(copy.id)).where(Flashcard.deck_id == deck_id).order_by(Flashcard.id)
+    db.execute(insert(Flashcard).from_select(["front", "back", "deck_id"], cards))
+    db.execute(update(FlashcardDeck).where(FlashcardDeck.id == deck_id).values(clone_count=FlashcardDeck.clone_count + 1))
+    db.commit()
+    community_cache.invalidate()
+    return copy.id
+
+
+def clone_quiz(db, collection_id, user_id):
+    """Copies a public quiz and its questions into user_id's collection; returns the new collection id, or None as clone_deck does."""
+    quiz = db.query(QuizCollection).filter(QuizCollection.id == collection_id, QuizCollection.is_public.is_(True)).first()
+    if quiz is None:
+        community_cache.invalidate()
+        return None
+    copy = QuizCollection(topic_name=quiz.topic_name, user_id=user_id, is_public=False)
+    db.add(copy)
+    db.flush()
+    questions = select(QuizQuestion.question_text, QuizQuestion.options, QuizQuestion.correct_answer, literal(copy.id)) \
+        .where(QuizQuestion.collection_id == collection_id).order_by(QuizQuestion.id)
+    db.execute(insert(QuizQuestion).from_select(["question_text", "options", "correct_answer", "collection_id"], questions))
+    db.execute(update(QuizCollection).where(QuizCollection.id == collection_id).values(clone_count=QuizCollection.clone_count + 1))
+    db.commit()
+    community_cache.invalidate()
+    return copy.id
+
+
+def delete_deck(db, deck_id, user_id):
+    """Deletes one of the user's decks with its cards; decks of other users are left alone."""
+    db.query(Flashcard).filter(Flashcard.deck_id == deck_id, Flashcard.deck_id.in_(
+        select(FlashcardDeck.id).where(FlashcardDeck.user_id == user_id))).delete(synchronize_session=False)
+    db.query(FlashcardDeck).filter(FlashcardDeck.id == deck_id, FlashcardDeck.user_id == user_id).delete(synchronize_session=False)
+    db.commit()
+    community_cache.invalidate()
+
+
+def delete_quiz(db, collection_id, user_id):
+    """Deletes one of the user's saved quizzes with its questions."""
+    db.query(QuizQuestion).filter(QuizQuestion.collection_id == collection_id, QuizQuestion.collection_id.in_(
+        select(QuizCollection.id).where(QuizCollection.user_id == user_id))).delete(synchronize_session=False)
+    db.query(QuizCollection).filter(QuizCollection.id == collection_id, QuizCollection.user_id == user_id).delete(synchronize_session=False)
+    db.commit()
+    community_cache.invalidate()
@@ -0,0 +1,175 @@
+# resilience.py
+import asyncio
+import random
+import time
+
+from config import Config
+
+
+# --- Typed errors surfaced by AIClient ---
+class AIClientError(Exception):
+    """Base class for every error AIClient raises to the pages."""
+    retryable = False
+
+
+class RateLimitedError(AIClientError):
+    """The upstream rejected the call because the quota was exhausted (HTTP 429)."""
+    retryable = True
+
+
+class UpstreamUnavailableError(AIClientError):
+    """A transient upstream failure: 5xx, timeout or dropped connection."""
+    retryable = True
+
+
+class UpstreamRequestError(AIClientError):
+    """A non-retryable upstream failure, e.g. an invalid request or a blocked prompt."""
+
+
+class EmptyResponseError(AIClientError):
+    """The model answered without any text."""
+
+
+class CircuitOpenError(AIClientError):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+class InvalidResponseError(AIClientError):
+    """Nothing usable could be salvaged from the model's answer (see llm_json)."""
+
+
+class UserQuotaExceededError(AIClientError):
+    """A single user exceeded their share of the request quota (see fair_scheduler.FairScheduler)."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def classify_error(exc):
+    """Maps an exception raised by the Gemini SDK (or the network stack) onto an AIClientError."""
+    if isinstance(exc, AIClientError):
+        return exc
+    code = getattr(exc, "code", None)
+    code = getattr(code, "value", code)
+    if code == 429 or type(exc).__name__ == "ResourceExhausted":
+        return RateLimitedError(f"Gemini rate limit reached: {exc}")
+    if code in (500, 502, 503, 504) or isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return UpstreamUnavailableError(f"Gemini is temporarily unavailable: {exc}")
+    return UpstreamRequestError(f"Gemini API Error: {exc}")
+
+
+class TokenBucket:
+    """Async token-bucket rate limiter; waiters are served in FIFO order."""
+
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class CircuitBreaker:
+    """Opens after consecutive retryable failures, then lets a single probe through once reset_timeout has passed."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError("The AI service is temporarily unavailable. Please try again in a minute.")
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                raise CircuitOpenError("The AI service is recovering. Please try again shortly.")
+            self._probe_in_flight = True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self, error):
+        if not error.retryable:
+            # Bad prompts say nothing about upstream health; only release a half-open probe.
+            self._probe_in_flight = False
+            return
+        self._failures += 1
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class ResilientCaller:
+    """Wraps upstream calls with the rate limiter, jittered exponential retry and the circuit breaker."""
+
+    def __init__(self, requests_per_minute=None, burst=None, max_retries=None, backoff_base=None, backoff_max=None,
+                 failure_threshold=None, reset_timeout=None):
+        rpm = requests_per_minute or Config.LLM_REQUESTS_PER_MINUTE
+        self.limiter = TokenBucket(rpm / 60.0, burst or Config.LLM_BURST)
+        self.breaker = CircuitBreaker(failure_threshold or Config.CIRCUIT_FAILURE_THRESHOLD,
+                                      reset_timeout or Config.CIRCUIT_RESET_SECONDS)
+        self.max_retries = max_retries if max_retries is not None else Config.LLM_MAX_RETRIES
+        self.backoff_base = backoff_base or Config.LLM_BACKOFF_BASE_SECONDS
+        self.backoff_max = backoff_max or Config.LLM_BACKOFF_MAX_SECONDS
+        self._stats = {"calls": 0, "retries": 0, "failures": 0, "short_circuited": 0}
+
+    def backoff_delay(self, attempt):
+        """Full-jitter exponential backoff: uniform(0, min(max, base * 2**attempt))."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def call(self, fn):
+        """Awaits fn() under rate limiting, retrying retryable errors; raises an AIClientError on failure."""
+        self._stats["calls"] += 1
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self._stats["short_circuited"] += 1
+                raise
+            await self.limiter.acquire()
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                self.breaker.record_failure(UpstreamRequestError("cancelled"))
+                raise
+            except Exception as e:
+                error = classify_error(e)
+                self.breaker.record_failure(error)
+                if not error.retryable or attempt == self.max_retries:
+                    self._stats["failures"] += 1
+                    raise error from e
+                self._stats["retries"] += 1
+                await asyncio.sleep(self.backoff_delay(attempt))
+                continue
+            self.breaker.record_success()
+            return result
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats["circuit_state"] = self.breaker.state
+        return stats
@@ -0,0 +1,274 @@
+# response_cache.py
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+
+
+def normalize_prompt(prompt):
+    """Collapses whitespace so re-indented but otherwise identical prompts share a cache entry."""
+    return re.sub(r"\s+", " ", str(prompt)).strip()
+
+
+def make_cache_key(model_name, method, prompt):
+    """Builds the cache key from (model name, method, normalized prompt hash)."""
+    prompt_hash = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    return f"{model_name}:{method}:{prompt_hash}"
+
+
+class MemoryLRU:
+    """A small thread-safe LRU with per-entry expiry, used as the in-process tier."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteResponseStore:
+    """Persistent tier shared by every worker process through a single SQLite file."""
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                cache_key TEXT PRIMARY KEY,
+                method TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_responses_last_access ON llm_responses (last_access)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_inflight (cache_key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, expires_at FROM llm_responses WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None, None
+            response, expires_at = row
+            if expires_at < now:
+                self._conn.execute("DELETE FROM llm_responses WHERE cache_key = ?", (key,))
+                return None, None
+            self._conn.execute("UPDATE llm_responses SET last_access = ? WHERE cache_key = ?", (now, key))
+            return response, expires_at
+
+    def put(self, key, method, value, expires_at):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (cache_key, method, response, created_at, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, method, value, now, expires_at, now),
+            )
+            self._writes_since_prune += 1
+            if self._writes_since_prune >= 100:
+                self._prune(now)
+
+    def _prune(self, now):
+        """Drops expired rows, then the least recently used rows beyond max_entries."""
+        self._writes_since_prune = 0
+        self._conn.execute("DELETE FROM llm_responses WHERE expires_at < ?", (now,))
+        self._conn.execute(
+            "DELETE FROM llm_responses WHERE cache_key IN ("
+            "SELECT cache_key FROM llm_responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def discard(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses WHERE cache_key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses")
+
+    # --- In-flight leases (used by singleflight.SingleFlight across worker processes) ---
+    def try_acquire_lease(self, key, owner, ttl_seconds):
+        """Claims the in-flight lease for key unless another owner holds an unexpired one."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO llm_inflight (cache_key, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(cache_key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE llm_inflight.expires_at < ? OR llm_inflight.owner = excluded.owner",
+                (key, owner, now + ttl_seconds, now),
+            )
+            return cursor.rowcount == 1
+
+    def release_lease(self, key, owner):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_inflight WHERE cache_key = ? AND owner = ?", (key, owner))
+
+
+class ResponseCache:
+    """Two-tier LLM response cache: a bounded in-memory LRU in front of a persistent SQLite store."""
+
+    def __init__(self, path=None, memory_entries=None, disk_entries=None, ttl_seconds=None, disabled_methods=None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.CACHE_TTL_SECONDS
+        self.disabled_methods = set(disabled_methods if disabled_methods is not None else Config.CACHE_DISABLED_METHODS)
+        self.memory = MemoryLRU(memory_entries or Config.CACHE_MEMORY_ENTRIES)
+        self.disk = SQLiteResponseStore(path or Config.CACHE_DB_PATH, disk_entries or Config.CACHE_DISK_ENTRIES)
+        self._stats_lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "bypassed": 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def is_enabled_for(self, method):
+        return method not in self.disabled_methods
+
+    def get(self, model_name, method, prompt):
+        """Returns the cached response text, or None on a miss or when the method opted out."""
+        if not self.is_enabled_for(method):
+            self._count("bypassed")
+            return None
+        key = make_cache_key(model_name, method, prompt)
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        value, expires_at = self.disk.get(key)
+        if value is not None:
+            self.memory.put(key, value, expires_at)
+            self._count("disk_hits")
+            return value
+        self._count("misses")
+        return None
+
+    def peek(self, model_name, method, prompt):
+        """Like get() but without touching the hit/miss counters; used while polling for another worker's result."""
+        if not self.is_enabled_for(method):
+            return None
+        key = make_cache_key(model_name, method, prompt)
+        value = self.memory.get(key)
+        if value is None:
+            value, _ = self.disk.get(key)
+        return value
+
+    def put(self, model_name, method, prompt, value):
+        if not self.is_enabled_for(method) or not value:
+            return
+        key = make_cache_key(model_name, method, prompt)
+        expires_at = time.time() + self.ttl_seconds
+        self.memory.put(key, value, expires_at)
+        self.disk.put(key, method, value, expires_at)
+        self._count("stores")
+
+    def discard(self, model_name, method, prompt):
+        """Drops one cached response, e.g. an answer that turned out to be unusable."""
+        key = make_cache_key(model_name, method, prompt)
+        self.memory.discard(key)
+        self.disk.discard(key)
+
+    def clear(self):
+        self.memory.clear()
+        self.disk.clear()
+
+    # --- Event-loop API (AIClient): the memory tier is checked inline, SQLite runs on a worker thread ---
+    async def _off_loop(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def aget(self, model_name, method, prompt):
+        """get() for coroutines: a busy SQLite file never stalls the event loop and every request on it."""
+        if not self.is_enabled_for(method):
+            self._count("bypassed")
+            return None
+        key = make_cache_key(model_name, method, prompt)
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        value, expires_at = await self._off_loop(self.disk.get, key)
+        if value is not None:
+            self.memory.put(key, value, expires_at)
+            self._count("disk_hits")
+            return value
+        self._count("misses")
+        return None
+
+    async def apeek(self, model_name, method, prompt):
+        if not self.is_enabled_for(method):
+            return None
+        key = make_cache_key(model_name, method, prompt)
+        value = self.memory.get(key)
+        if value is None:
+            value, _ = await self._off_loop(self.disk.get, key)
+        return value
+
+    async def aput(self, model_name, method, prompt, value):
+        if not self.is_enabled_for(method) or not value:
+            return
+        key = make_cache_key(model_name, method, prompt)
+        expires_at = time.time() + self.ttl_seconds
+        self.memory.put(key, value, expires_at)
+        await self._off_loop(self.disk.put, key, method, value, expires_at)
+        self._count("stores")
+
+    async def adiscard(self, model_name, method, prompt):
+        key = make_cache_key(model_name, method, prompt)
+        self.memory.discard(key)
+        await self._off_loop(self.disk.discard, key)
+
+    def stats(self):
+        """Returns hit/miss counters for this process plus the current hit ratio."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        return stats
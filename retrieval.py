@@ -0,0 +1,128 @@
+# retrieval.py
+import bisect
+import re
+from collections import Counter
+
+import numpy as np
+
+from config import Config
+from doc_pipeline import chunk_spans
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his how
+i if in into is it its itself just me more most my no nor not now of off on once only or other our out over own same
+she should so some such than that the their them then there these they this those through to too under until up
+very was we were what when where which while who whom why will with would you your
+""".split())
+
+
+def tokenize(text):
+    """Lower-cased word tokens without stopwords or single characters."""
+    return [token for token in _TOKEN.findall(text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+class Passage:
+    """One retrievable chunk of a document and the pages it spans (1-based; None for documents without pages)."""
+
+    __slots__ = ("ordinal", "text", "first_page", "last_page")
+
+    def __init__(self, ordinal, text, first_page, last_page):
+        self.ordinal = ordinal
+        self.text = text
+        self.first_page = first_page
+        self.last_page = last_page
+
+    @property
+    def citation(self):
+        if self.first_page is None:
+            return f"section {self.ordinal + 1}"
+        if self.first_page == self.last_page:
+            return f"p. {self.first_page}"
+        return f"pp. {self.first_page}-{self.last_page}"
+
+
+class DocumentIndex:
+    """
+    In-memory BM25 index over overlapping chunks of one document, built once per upload.
+    Postings are kept as flat NumPy arrays sorted by term (CSR layout) with the BM25 weight of every
+    (term, chunk) pair precomputed, so a query is a gather plus one bincount regardless of document length.
+    """
+
+    def __init__(self, pages, has_page_numbers=True, chunk_chars=None, overlap=None, k1=1.5, b=0.75):
+        chunk_chars = chunk_chars or Config.RETRIEVAL_CHUNK_CHARS
+        overlap = overlap if overlap is not None else Config.RETRIEVAL_CHUNK_OVERLAP
+        text = "\n\n".join(pages)
+        # Offset of the first character of every page in the joined text, for mapping chunks back to pages.
+        page_starts, offset = [], 0
+        for page in pages:
+            page_starts.append(offset)
+            offset += len(page) + 2
+
+        self.passages = []
+        for start, end in chunk_spans(text, chunk_chars, overlap):
+            if has_page_numbers:
+                first = bisect.bisect_right(page_starts, start)
+                last = bisect.bisect_right(page_starts, max(start, end - 1))
+            else:
+                first = last = None
+            self.passages.append(Passage(len(self.passages), text[start:end].strip(), first, last))
+
+        vocabulary, term_ids, doc_ids, tfs, lengths = {}, [], [], [], []
+        for passage in self.passages:
+            counts = Counter(tokenize(passage.text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(passage.ordinal)
+                tfs.append(tf)
+        self.vocabulary = vocabulary
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        order = np.argsort(term_ids, kind="stable")
+        self._doc_ids = np.asarray(doc_ids, dtype=np.int32)[order]
+        tfs = np.asarray(tfs, dtype=np.float32)[order]
+        df = np.bincount(term_ids, minlength=len(vocabulary))
+        self._term_ptr = np.concatenate(([0], np.cumsum(df)))
+
+        n = max(len(self.passages), 1)
+        lengths = np.asarray(lengths or [0], dtype=np.float32)
+        avg_length = float(lengths.mean()) or 1.0
+        idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = k1 * (1 - b + b * lengths[self._doc_ids] / avg_length)
+        self._weights = idf[term_ids[order]] * tfs * (k1 + 1) / (tfs + norm)
+
+    def __len__(self):
+        return len(self.passages)
+
+    def search(self, query, k=None):
+        """Returns up to k (passage, score) pairs, best first; passages sharing no term with the query are left out."""
+        k = k or Config.RETRIEVAL_TOP_K
+        query_terms = Counter(self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary)
+        if not query_terms or not self.passages:
+            return []
+        slices = [(self._term_ptr[t], self._term_ptr[t + 1], count) for t, count in query_terms.items()]
+        doc_ids = np.concatenate([self._doc_ids[lo:hi] for lo, hi, _ in slices])
+        weights = np.concatenate([self._weights[lo:hi] * count for lo, hi, count in slices])
+        scores = np.bincount(doc_ids, weights=weights, minlength=len(self.passages))
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.passages[i], float(scores[i])) for i in top]
+
+    def context_for(self, query, k=None):
+        """
+        The passages to ground an answer in, in document order. Falls back to the opening passages when
+        the question shares no words with the document (e.g. "summarize this").
+        """
+        k = k or Config.RETRIEVAL_TOP_K
+        hits = [passage for passage, _ in self.search(query, k)] or self.passages[:k]
+        return sorted(hits, key=lambda passage: passage.ordinal)
+
+
+def format_context(passages):
+    """Renders passages as labelled excerpts the model can cite, e.g. "[p. 4] ..."."""
+    return "\n\n".join(f"[{passage.citation}]\n{passage.text}" for passage in passages)
@@ -0,0 +1,115 @@
+# singleflight.py
+import asyncio
+import os
+import time
+import uuid
+
+from config import Config
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight requests so that concurrent callers share one upstream call.
+    Must be used from a single event loop (AIClient's). When a lease store is given, the leader of a
+    key also holds a short lease in the shared SQLite file so other worker processes wait for its
+    result (delivered through the response cache) instead of issuing their own call. Lease calls run
+    on the loop's default executor, since a busy SQLite file can block for its whole busy timeout.
+    """
+
+    def __init__(self, lease_store=None, lease_seconds=None, poll_interval=None):
+        self.lease_store = lease_store
+        self.lease_seconds = lease_seconds or Config.SINGLEFLIGHT_LEASE_SECONDS
+        self.poll_interval = poll_interval or Config.SINGLEFLIGHT_POLL_SECONDS
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._inflight = {}
+        self._stats = {"leaders": 0, "coalesced_local": 0, "coalesced_remote": 0, "lease_takeovers": 0}
+
+    def is_inflight(self, key):
+        return key in self._inflight
+
+    def begin(self, key):
+        """Registers the caller as leader for key (e.g. a streaming call); pair with finish()."""
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+        self._stats["leaders"] += 1
+
+    def finish(self, key, result=None, error=None, abandoned=False):
+        """Resolves the followers of a key registered with begin(); abandoned followers retry as leaders."""
+        future = self._inflight.pop(key, None)
+        if future is None or future.done():
+            return
+        if abandoned:
+            future.cancel()
+        elif error is not None:
+            future.set_exception(error)
+            future.exception()
+        else:
+            future.set_result(result)
+
+    async def do(self, key, fn, lookup=None):
+        """
+        Runs the coroutine function fn() once per key among concurrent callers.
+        The coroutine function lookup() is polled for the result while another process holds the key's
+        lease; pass None to coalesce within this process only.
+        """
+        while key in self._inflight:
+            future = self._inflight[key]
+            try:
+                result = await asyncio.shield(future)
+                self._stats["coalesced_local"] += 1
+                return result
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled; fall through and try to lead ourselves.
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._lead(key, fn, lookup)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Followers retrieve the exception; mark it retrieved so a leader-only failure is not logged twice.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+    async def _lead(self, key, fn, lookup):
+        if self.lease_store is None or lookup is None:
+            self._stats["leaders"] += 1
+            return await fn()
+
+        deadline = time.time() + self.lease_seconds
+        while not await self._off_loop(self.lease_store.try_acquire_lease, key, self.owner, self.lease_seconds):
+            # Another process is computing this key; wait for its result to land in the cache.
+            await asyncio.sleep(self.poll_interval)
+            result = await lookup()
+            if result is not None:
+                self._stats["coalesced_remote"] += 1
+                return result
+            if time.time() > deadline:
+                self._stats["lease_takeovers"] += 1
+                break
+
+        self._stats["leaders"] += 1
+        try:
+            return await fn()
+        finally:
+            await self._off_loop(self.lease_store.release_lease, key, self.owner)
+
+    async def _off_loop(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats["inflight"] = len(self._inflight)
+        coalesced = stats["coalesced_local"] + stats["coalesced_remote"]
+        total = coalesced + stats["leaders"]
+        stats["coalesced_ratio"] = coalesced / total if total else 0.0
+        return stats
@@ -0,0 +1,43 @@
+# study_packs.py
+import datetime
+import hashlib
+import json
+
+from sqlalchemy.exc import IntegrityError
+
+from database import StudyPack
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def find_pack(db, text, num_questions=0, num_cards=0):
+    """The stored pack for this text if it has at least the requested number of questions and cards, else None."""
+    pack = db.query(StudyPack).filter(StudyPack.content_hash == text_hash(text)).first()
+    if pack and pack.num_questions >= num_questions and pack.num_cards >= num_cards:
+        return pack
+    return None
+
+
+def save_pack(db, text, data):
+    """Stores a generated pack ({"title", "summary", "quiz", "flashcards"}), replacing a smaller one for the same text."""
+    digest = text_hash(text)
+    pack = db.query(StudyPack).filter(StudyPack.content_hash == digest).first()
+    if pack is None:
+        pack = StudyPack(content_hash=digest)
+        db.add(pack)
+    pack.title = data.get("title")
+    pack.summary = data["summary"]
+    pack.quiz = json.dumps(data["quiz"])
+    pack.flashcards = json.dumps(data["flashcards"])
+    pack.num_questions = len(data["quiz"])
+    pack.num_cards = len(data["flashcards"])
+    pack.timestamp = datetime.datetime.utcnow()
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another session stored a pack for the same text first; serve that one.
+        db.rollback()
+        pack = db.query(StudyPack).filter(StudyPack.content_hash == digest).one()
+    return pack
@@ -1,16 +1,31 @@
 # study_planner.py
 from config import Config
+from database import RoadmapItem, StudyRoadmap
 
-def validate_text_input(text, field_name="Text"):
+def validate_text_input(text, field_name="Text", max_length=None):
     """
     Validate user-provided text input to ensure it's not empty and not too long.
+    max_length defaults to Config.MAX_TEXT_LENGTH; document pages pass Config.MAX_DOCUMENT_LENGTH.
     Returns a tuple: (is_valid: bool, message: str)
     """
     if not text or not str(text).strip():
         return False, f"{field_name} cannot be empty."
     
     # This 'if' statement now has an indented block below it.
-    if len(str(text)) > getattr(Config, "MAX_TEXT_LENGTH", 4000):
-        return False, f"{field_name} is too long. Limit to {Config.MAX_TEXT_LENGTH} characters."
+    max_length = max_length or getattr(Config, "MAX_TEXT_LENGTH", 4000)
+    if len(str(text)) > max_length:
+        return False, f"{field_name} is too long. Limit to {max_length} characters."
     
-    return True, "Valid input."
\ No newline at end of file
+    return True, "Valid input."
+
+
+def save_roadmap(db, user_id, topic, plan):
+    """Stores a {"Day N": [sub-topics]} plan as the user's roadmap for topic and returns the new StudyRoadmap."""
+    roadmap = StudyRoadmap(topic=topic, user_id=user_id)
+    db.add(roadmap)
+    db.flush()
+    for day, sub_topics in plan.items():
+        for sub_topic in sub_topics:
+            db.add(RoadmapItem(sub_topic=sub_topic, roadmap_id=roadmap.id, day_number=int(day.split()[1])))
+    db.commit()
+    return roadmap
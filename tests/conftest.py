@@ -0,0 +1,11 @@
+# tests/conftest.py
+import os
+import sys
+
+# Tests run offline: the fake provider stands in for Gemini and nothing is cached on disk.
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY_SECONDS", "0")
+os.environ.setdefault("FAKE_LLM_JITTER_SECONDS", "0")
+os.environ.setdefault("CACHE_ENABLED", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,118 @@
+# tests/test_fair_scheduler.py
+import asyncio
+import contextvars
+
+import pytest
+
+import fair_scheduler
+from fair_scheduler import FairScheduler, quota_prepaid
+from resilience import UserQuotaExceededError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(fair_scheduler.time, "monotonic", clock)
+    return clock
+
+
+def scheduler(**kwargs):
+    options = dict(capacity=1, user_rate_per_minute=60, user_burst=2, interactive_methods=["chat"],
+                   chars_per_cost_unit=1_000_000)
+    options.update(kwargs)
+    return FairScheduler(**options)
+
+
+def admission_order(sched, requests):
+    """
+    Holds the only slot while every (user, method) request queues, in the given order, then releases it
+    and returns the order in which the requests were admitted.
+    """
+    async def run():
+        admitted, hold = [], asyncio.Event()
+
+        async def holder():
+            async with sched.slot("quiz", "hold", user_id="holder"):
+                await hold.wait()
+
+        async def request(user_id, method, name):
+            async with sched.slot(method, "same prompt", user_id=user_id):
+                admitted.append(name)
+
+        holding = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        tasks = []
+        for user_id, method, name in requests:
+            tasks.append(asyncio.create_task(request(user_id, method, name)))
+            await asyncio.sleep(0)
+        hold.set()
+        await asyncio.gather(holding, *tasks)
+        return admitted
+
+    return asyncio.run(run())
+
+
+def test_waiting_users_are_served_in_turn(clock):
+    requests = [("a", "quiz", f"a{i}") for i in range(1, 5)] + [("b", "quiz", f"b{i}") for i in range(1, 3)]
+    # b queued behind a's whole burst but is not made to wait for all of it.
+    assert admission_order(scheduler(), requests) == ["a1", "b1", "a2", "b2", "a3", "a4"]
+
+
+def test_heavier_weight_gets_a_larger_share(clock):
+    sched = scheduler()
+    sched.set_weight("b", 2.0)
+    requests = [("a", "quiz", f"a{i}") for i in range(1, 4)] + [("b", "quiz", f"b{i}") for i in range(1, 4)]
+    assert admission_order(sched, requests) == ["b1", "a1", "b2", "b3", "a2", "a3"]
+
+
+def test_interactive_requests_go_before_bulk(clock):
+    requests = [("a", "quiz", "quiz1"), ("a", "quiz", "quiz2"), ("b", "chat", "chat")]
+    assert admission_order(scheduler(), requests) == ["chat", "quiz1", "quiz2"]
+
+
+def test_quota_allows_the_burst_then_refills_over_time(clock):
+    sched = scheduler()
+    sched.check_quota("a")
+    sched.check_quota("a")
+    with pytest.raises(UserQuotaExceededError) as raised:
+        sched.check_quota("a")
+    assert raised.value.retry_after == pytest.approx(1.0)
+    # Other users have their own bucket.
+    sched.check_quota("b")
+    clock.advance(1.0)
+    sched.check_quota("a")
+    with pytest.raises(UserQuotaExceededError):
+        sched.check_quota("a")
+
+
+def test_prepaid_calls_are_not_charged(clock):
+    sched = scheduler()
+
+    def prepaid_job():
+        sched.check_quota("a")
+        quota_prepaid.set(True)
+        for _ in range(10):
+            sched.check_quota("a")
+
+    contextvars.copy_context().run(prepaid_job)
+    # Only the prepayment was charged, and the flag did not leak out of the job's context.
+    sched.check_quota("a")
+    with pytest.raises(UserQuotaExceededError):
+        sched.check_quota("a")
+
+
+def test_anonymous_callers_are_not_limited(clock):
+    sched = scheduler()
+    for _ in range(10):
+        sched.check_quota(None)
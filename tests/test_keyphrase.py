@@ -0,0 +1,42 @@
+# tests/test_keyphrase.py
+import pytest
+
+from ai_client import AIClient
+from keyphrase import KeyphraseExtractor
+from llm_providers import FakeProvider
+
+
+@pytest.mark.parametrize("text", ["1 2 3 4 5 6", "x y z w v u"])
+def test_short_input_without_content_words_is_not_confident(text):
+    guess = KeyphraseExtractor().extract(text)
+    assert guess.title == ""
+    assert not guess.confident
+
+
+def test_one_word_picked_from_a_longer_input_is_not_confident():
+    guess = KeyphraseExtractor().extract("CS 101 202 303 404 505")
+    assert guess.title == "CS"
+    assert not guess.confident
+
+
+@pytest.mark.parametrize("text, title", [
+    ("What is recursion?", "Recursion"),
+    ("How does a hash table work", "Hash Table"),
+    ("Photosynthesis", "Photosynthesis"),
+])
+def test_short_topics_are_kept(text, title):
+    guess = KeyphraseExtractor().extract(text)
+    assert guess.title == title
+    assert guess.confident
+
+
+@pytest.mark.parametrize("text", ["1 2 3 4 5 6", "x y z w v u", "CS 101 202 303 404 505"])
+def test_topic_title_falls_back_to_the_model(text):
+    client = AIClient(provider=FakeProvider(latency_seconds=0, jitter_seconds=0))
+    assert client.generate_topic_title(text)
+    assert client._title_stats["fallback"] == 1
+
+
+def test_of_phrase_around_one_letter_words_is_skipped():
+    text = "Vectors and matrices. The value of x of y is computed by the function."
+    assert KeyphraseExtractor().extract(text).title
@@ -0,0 +1,166 @@
+# tests/test_knowledge_graph.py
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+import knowledge_graph
+from database import Base, KnowledgeEdge, KnowledgeNode, KnowledgeSource, User, make_engine
+from knowledge_graph import ParsedGraph, UserGraph, graph_cache, merge_graph, parse_dot
+
+
+@pytest.fixture
+def db():
+    engine = make_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(username="Learner", hashed_password="x"))
+    db.commit()
+    yield db
+    db.close()
+    engine.dispose()
+
+
+def graph(*edges):
+    parsed = ParsedGraph()
+    for source, target, relation in edges:
+        parsed.add_edge(source, target, relation)
+    return parsed
+
+
+def stored(db):
+    """({label: mentions}, {(source label, target label, relation): mentions}) for user 1."""
+    labels = {node.id: node.label for node in db.query(KnowledgeNode)}
+    nodes = {node.label: node.mentions for node in db.query(KnowledgeNode)}
+    edges = {(labels[e.source_id], labels[e.target_id], e.label): e.mentions for e in db.query(KnowledgeEdge)}
+    return nodes, edges
+
+
+# --- Parsing ---
+def test_subgraphs_are_flattened():
+    parsed = parse_dot('digraph G { subgraph cluster_a { label="Part"; A -> B; } B -> C [label="then"]; }')
+    assert parsed.nodes == ["A", "B", "C"]
+    assert parsed.edges == [("A", "B", ""), ("B", "C", "then")]
+
+
+def test_groups_expand_to_one_edge_per_member():
+    parsed = parse_dot('digraph G { A -> {B C} [label="has"]; {D E} -> F; }')
+    assert parsed.edges == [("A", "B", "has"), ("A", "C", "has"), ("D", "F", ""), ("E", "F", "")]
+
+
+def test_label_set_after_the_edges_names_the_node():
+    parsed = parse_dot('digraph G { a -> b [label=uses]; a [label="Hash Table"]; b [label="Hash\\nFunction"]; }')
+    assert parsed.nodes == ["Hash Table", "Hash Function"]
+    assert parsed.edges == [("Hash Table", "Hash Function", "uses")]
+
+
+def test_html_labels_lose_their_tags():
+    parsed = parse_dot("digraph G { n1 [label=<<b>Binary</b> Tree>]; n1 -> n2; n2 [label=<Node<br/>Values>]; }")
+    assert parsed.edges == [("Binary Tree", "Node Values", "")]
+
+
+def test_labels_are_unique_ignoring_case_and_self_loops_dropped():
+    parsed = parse_dot("digraph G { A -> A; a -> B; A -> b; }")
+    assert parsed.nodes == ["A", "B"]
+    assert parsed.edges == [("A", "B", "")]
+
+
+def test_max_nodes_limits_the_concepts_kept():
+    parsed = parse_dot("digraph G { A -> B; B -> C; C -> D; }", max_nodes=2)
+    assert parsed.nodes == ["A", "B"]
+    assert parsed.edges == [("A", "B", "")]
+
+
+# --- Storage ---
+def test_merging_a_text_twice_counts_it_once(db):
+    parsed = graph(("Stack", "Array", "built on"), ("Queue", "Array", "built on"))
+    assert merge_graph(db, 1, parsed, content_hash="abc") == (3, 2)
+    assert merge_graph(db, 1, parsed, content_hash="abc") == (0, 0)
+    assert stored(db) == ({"Stack": 1, "Array": 1, "Queue": 1},
+                          {("Stack", "Array", "built on"): 1, ("Queue", "Array", "built on"): 1})
+    assert db.query(KnowledgeSource).count() == 1
+
+
+def test_merging_without_a_hash_bumps_mentions(db):
+    parsed = graph(("Stack", "Array", "built on"))
+    assert merge_graph(db, 1, parsed) == (2, 1)
+    assert merge_graph(db, 1, graph(("Stack", "Array", "built on"), ("Stack", "LIFO", "is"))) == (1, 1)
+    assert stored(db) == ({"Stack": 2, "Array": 2, "LIFO": 1},
+                          {("Stack", "Array", "built on"): 2, ("Stack", "LIFO", "is"): 1})
+
+
+def test_labels_differing_in_case_are_one_concept(db):
+    merge_graph(db, 1, graph(("Linked List", "Pointer", "uses")))
+    merge_graph(db, 1, graph(("linked list", "POINTER", "uses")))
+    assert stored(db) == ({"Linked List": 2, "Pointer": 2}, {("Linked List", "Pointer", "uses"): 2})
+    db.add(KnowledgeNode(user_id=1, label="LINKED LIST", label_key="linked list"))
+    with pytest.raises(IntegrityError):
+        db.commit()
+
+
+def test_concurrent_insert_is_retried(db, monkeypatch):
+    merge_graph(db, 1, graph(("Heap", "Tree", "is a")))
+    lookup, calls = knowledge_graph._node_ids, []
+
+    def stale_first_lookup(db, user_id, labels):
+        # The first lookup misses the rows another session committed meanwhile, so the insert collides.
+        calls.append(labels)
+        return {} if len(calls) == 1 else lookup(db, user_id, labels)
+
+    monkeypatch.setattr(knowledge_graph, "_node_ids", stale_first_lookup)
+    assert merge_graph(db, 1, graph(("Heap", "Tree", "is a"), ("Heap", "Priority Queue", "implements"))) == (1, 1)
+    assert stored(db) == ({"Heap": 2, "Tree": 2, "Priority Queue": 1},
+                          {("Heap", "Tree", "is a"): 2, ("Heap", "Priority Queue", "implements"): 1})
+
+
+def test_second_collision_gives_up_without_storing(db, monkeypatch):
+    merge_graph(db, 1, graph(("Heap", "Tree", "is a")))
+    monkeypatch.setattr(knowledge_graph, "_node_ids", lambda db, user_id, labels: {})
+    assert merge_graph(db, 1, graph(("Heap", "Tree", "is a")), content_hash="abc") == (0, 0)
+    assert stored(db) == ({"Heap": 1, "Tree": 1}, {("Heap", "Tree", "is a"): 1})
+    assert db.query(KnowledgeSource).count() == 0
+
+
+def test_merge_invalidates_the_cached_graph(db):
+    merge_graph(db, 1, graph(("Heap", "Tree", "is a")))
+    assert len(graph_cache.get(db, 1)) == 2
+    merge_graph(db, 1, graph(("Tree", "Graph", "is a")))
+    assert len(graph_cache.get(db, 1)) == 3
+
+
+# --- Traversal ---
+@pytest.fixture
+def user_graph():
+    #  Array <- Stack -> LIFO        Island
+    #    ^
+    #  Queue -> FIFO
+    nodes = [(1, "Array", 5), (2, "Stack", 3), (3, "LIFO", 1), (4, "Queue", 2), (5, "FIFO", 1), (6, "Island", 1)]
+    edges = [(2, 1, "built on"), (2, 3, "is"), (4, 1, "built on"), (4, 5, "is")]
+    return UserGraph(nodes, edges)
+
+
+def test_subgraph_follows_relations_both_ways(user_graph):
+    labels, edges = user_graph.subgraph("stack", hops=1)
+    assert labels == ["Stack", "Array", "LIFO"]
+    assert sorted(edges) == [("Stack", "Array", "built on"), ("Stack", "LIFO", "is")]
+    labels, _ = user_graph.subgraph("Stack", hops=2)
+    assert labels == ["Stack", "Array", "LIFO", "Queue"]
+
+
+def test_subgraph_respects_max_nodes(user_graph):
+    labels, edges = user_graph.subgraph("Stack", hops=3, max_nodes=2)
+    assert labels == ["Stack", "Array"]
+    assert edges == [("Stack", "Array", "built on")]
+
+
+def test_shortest_path_keeps_edge_direction(user_graph):
+    assert user_graph.shortest_path("LIFO", "FIFO") == [
+        ("Stack", "is", "LIFO"), ("Stack", "built on", "Array"), ("Queue", "built on", "Array"), ("Queue", "is", "FIFO"),
+    ]
+    assert user_graph.shortest_path("Stack", "stack") == []
+    assert user_graph.shortest_path("Stack", "Island") is None
+    assert user_graph.shortest_path("Stack", "Unknown") is None
+
+
+def test_concepts_rank_by_connections_then_mentions(user_graph):
+    assert user_graph.concepts()[:3] == ["Array", "Stack", "Queue"]
+    assert user_graph.neighbors("Stack") == [("Array", "built on", True), ("LIFO", "is", True)]
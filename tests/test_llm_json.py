@@ -0,0 +1,142 @@
+# tests/test_llm_json.py
+import json
+import os
+
+import pytest
+
+import llm_json
+from ai_client import AIClient
+from llm_providers import FakeProvider
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "llm_json_corpus.jsonl")
+
+with open(CORPUS, encoding="utf-8") as f:
+    ENTRIES = {entry["name"]: entry for entry in (json.loads(line) for line in f if line.strip())}
+
+# Items salvaged from each captured response, and how many are still missing after parsing.
+SALVAGED = {
+    "quiz_clean": (5, 0),
+    "quiz_fenced": (5, 0),
+    "quiz_preamble": (5, 0),
+    "quiz_trailing_comma": (5, 0),
+    "quiz_letter_answers": (5, 0),
+    "quiz_unescaped_quote": (4, 1),
+    "quiz_truncated": (6, 2),
+    "quiz_answer_not_in_options": (4, 1),
+    "quiz_three_options": (4, 1),
+    "quiz_wrapped_object": (5, 0),
+    "quiz_smart_quotes": (6, 0),
+    "quiz_missing_comma": (4, 1),
+    "flashcards_clean": (5, 0),
+    "flashcards_fenced_preamble": (5, 0),
+    "flashcards_missing_back": (4, 1),
+    "flashcards_truncated": (4, 3),
+    "flashcards_duplicate": (4, 1),
+    "flashcards_trailing_commas": (5, 0),
+    "roadmap_clean": (5, 0),
+    "roadmap_fenced": (5, 0),
+    "roadmap_string_day": (5, 0),
+    "roadmap_truncated": (4, 1),
+    "roadmap_lowercase_key": (5, 0),
+    "roadmap_bad_day": (4, 1),
+    "prerequisites_clean": (2, 0),
+    "prerequisites_fenced": (3, 0),
+    "prerequisites_too_many": (3, 0),
+    "project_clean": (2, 0),
+    "project_preamble": (2, 0),
+    "project_missing_description": (1, 1),
+}
+
+
+class ScriptedProvider(FakeProvider):
+    """Answers the first call with a captured response, later (repair) calls as FakeProvider does."""
+
+    def __init__(self, first):
+        super().__init__(latency_seconds=0, jitter_seconds=0)
+        self.first = first
+        self.prompts = []
+
+    def respond(self, prompt, method):
+        self.prompts.append(prompt)
+        return self.first if len(self.prompts) == 1 else super().respond(prompt, method)
+
+
+def parse(name):
+    entry = ENTRIES[name]
+    return llm_json.parse(entry["kind"], entry["text"], entry["expected"])
+
+
+def test_corpus_is_covered():
+    assert set(ENTRIES) == set(SALVAGED)
+
+
+@pytest.mark.parametrize("name", sorted(SALVAGED))
+def test_salvaged_items(name):
+    result = parse(name)
+    assert (len(result.items), result.shortfall) == SALVAGED[name]
+    for item in result.items:
+        # Whatever is kept already passes its schema, so validating it again changes nothing.
+        schema = llm_json.SCHEMAS[ENTRIES[name]["kind"]]
+        if schema.container == "array":
+            assert schema.validate(item) == item
+        else:
+            assert schema.validate(*item) == item
+
+
+@pytest.mark.parametrize("name", sorted(SALVAGED))
+def test_streamed_parse_matches(name):
+    entry = ENTRIES[name]
+    chunks = (entry["text"][i:i + 64] for i in range(0, len(entry["text"]), 64))
+    assert list(llm_json.iter_items(entry["kind"], chunks, entry["expected"])) == parse(name).items
+
+
+def test_quiz_answers_normalized_to_options():
+    for question in parse("quiz_letter_answers").data:
+        assert question["answer"] in question["options"]
+
+
+def test_dropped_items_are_reported():
+    assert [reason for _, reason in parse("quiz_answer_not_in_options").errors] == ["'answer' is not one of the options"]
+    assert [reason for _, reason in parse("flashcards_duplicate").errors] == ["duplicate item"]
+    assert parse("quiz_truncated").truncated
+
+
+def test_missing_keys():
+    assert parse("roadmap_truncated").missing_keys == ["Day 5"]
+    assert parse("roadmap_bad_day").missing_keys == ["Day 3"]
+    assert parse("project_missing_description").missing_keys == ["description"]
+
+
+def test_roadmap_repair_asks_only_for_missing_days():
+    provider = ScriptedProvider(ENTRIES["roadmap_bad_day"]["text"])
+    planned = parse("roadmap_bad_day").data
+    plan = AIClient(provider=provider).generate_roadmap_plan("SQL", 5)
+    assert len(provider.prompts) == 2
+    assert "containing ONLY these keys: Day 3." in provider.prompts[1]
+    assert json.dumps(planned) in provider.prompts[1]
+    assert list(plan) == [f"Day {d}" for d in range(1, 6)]
+    assert {day: topics for day, topics in plan.items() if day != "Day 3"} == planned
+
+
+@pytest.mark.parametrize("name, kind, field", [
+    ("quiz_truncated", "quiz", "question"),
+    ("flashcards_truncated", "flashcards", "front"),
+])
+def test_array_repair_asks_for_the_shortfall(name, kind, field):
+    entry = ENTRIES[name]
+    provider = ScriptedProvider(entry["text"])
+    client = AIClient(provider=provider)
+    generate = client.generate_quiz_items if kind == "quiz" else client.generate_flashcard_items
+    items = generate("Data structures and algorithms", entry["expected"])
+    salvaged = parse(name)
+    assert len(provider.prompts) == 2
+    assert f"Generate exactly {salvaged.shortfall} " in provider.prompts[1]
+    assert json.dumps([item[field] for item in salvaged.items]) in provider.prompts[1]
+    assert len(items) == entry["expected"]
+    assert items[:len(salvaged.items)] == salvaged.items
+
+
+def test_complete_response_needs_no_repair():
+    provider = ScriptedProvider(ENTRIES["quiz_clean"]["text"])
+    assert len(AIClient(provider=provider).generate_quiz_items("Data structures", 5)) == 5
+    assert len(provider.prompts) == 1
@@ -0,0 +1,142 @@
+# tests/test_prerequisites.py
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from ai_client import AIClient
+from database import Base, PrerequisiteEdge, PrerequisiteTopic, make_engine
+from fair_scheduler import FairScheduler
+from llm_providers import FakeProvider
+from prerequisites import PrerequisiteGraph, fetch_prerequisites
+from resilience import UserQuotaExceededError
+
+# What the model answers for each topic; Calculus and Limits name each other, as models sometimes do.
+ANSWERS = {
+    "Calculus": ["Limits", "Algebra"],
+    "Limits": ["Functions", "Calculus"],
+    "Functions": ["Algebra"],
+    "Algebra": ["Arithmetic"],
+    "Arithmetic": [],
+}
+
+
+@pytest.fixture
+def engine():
+    engine = make_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    db = sessionmaker(bind=engine)()
+    yield db
+    db.close()
+
+
+class Fetcher:
+    """Stands in for fetch_prerequisites: answers from ANSWERS and records each batch asked."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, names):
+        self.batches.append(names)
+        return {name: ANSWERS.get(name, []) for name in names}
+
+
+def statements(engine, fn):
+    """(fn's result, number of SQL statements it ran)."""
+    executed = []
+    listener = lambda *args: executed.append(1)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        return fn(), len(executed)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+
+def test_expand_asks_one_batch_per_level(db):
+    fetch = Fetcher()
+    reached = PrerequisiteGraph().expand(db, ["Calculus"], fetch=fetch, depth=3)
+    assert reached == ["calculus", "limits", "algebra", "functions", "arithmetic"]
+    assert fetch.batches == [["Calculus"], ["Limits", "Algebra"], ["Functions", "Arithmetic"]]
+
+
+def test_expand_stops_at_depth(db):
+    fetch = Fetcher()
+    assert PrerequisiteGraph().expand(db, ["Calculus"], fetch=fetch, depth=1) == ["calculus", "limits", "algebra"]
+    assert fetch.batches == [["Calculus"]]
+
+
+def test_expand_asks_for_at_most_limit_topics(db):
+    fetch = Fetcher()
+    graph = PrerequisiteGraph()
+    graph.expand(db, ["Calculus"], fetch=fetch, depth=3, limit=2)
+    assert fetch.batches == [["Calculus"], ["Limits"]]
+    assert graph.unexpanded(db, ["Limits", "Algebra", "Functions"]) == ["Algebra", "Functions"]
+
+
+def test_known_topics_need_no_queries_or_fetches(engine, db):
+    PrerequisiteGraph().expand(db, ["Calculus"], fetch=Fetcher(), depth=3)
+    graph, fetch = PrerequisiteGraph(), Fetcher()
+    first, first_count = statements(engine, lambda: graph.expand(db, ["calculus"], fetch=fetch, depth=3))
+    again, again_count = statements(engine, lambda: graph.review_order(db, ["Calculus"], fetch=fetch, depth=3))
+    assert first == ["calculus", "limits", "algebra", "functions", "arithmetic"]
+    assert 0 < first_count <= 2 * 3
+    assert again_count == 0
+    assert [name for name, _ in again] == ["Arithmetic", "Algebra", "Functions", "Limits", "Calculus"]
+    assert fetch.batches == []
+
+
+def test_review_order_breaks_cycles(db):
+    order = PrerequisiteGraph().review_order(db, ["Calculus", "Functions"], fetch=Fetcher(), depth=3)
+    names = [name for name, _ in order]
+    assert sorted(names) == sorted(ANSWERS)
+    position = {name: i for i, name in enumerate(names)}
+    broken = [(topic, p) for topic, prerequisites in ANSWERS.items() for p in prerequisites if position[p] > position[topic]]
+    assert broken == [("Limits", "Calculus")]
+    assert dict(order) == {"Calculus": True, "Functions": True, "Limits": False, "Algebra": False, "Arithmetic": False}
+
+
+def test_first_stored_answer_wins(db):
+    PrerequisiteGraph().expand(db, ["Algebra"], fetch=Fetcher(), depth=1)
+    PrerequisiteGraph()._store(db, {"Algebra": ["Counting"]})
+    assert PrerequisiteGraph().expand(db, ["Algebra"], depth=1) == ["algebra", "arithmetic"]
+
+
+def test_store_retries_once_then_gives_up(db, monkeypatch):
+    commit, failures = db.commit, []
+
+    def racing_commit(times):
+        def fail():
+            if len(failures) < times:
+                failures.append(1)
+                raise IntegrityError("INSERT", {}, Exception("UNIQUE constraint failed"))
+            commit()
+        return fail
+
+    monkeypatch.setattr(db, "commit", racing_commit(1))
+    PrerequisiteGraph()._store(db, {"Algebra": ["Arithmetic"]})
+    assert db.query(PrerequisiteEdge).count() == 1
+
+    failures.clear()
+    monkeypatch.setattr(db, "commit", racing_commit(2))
+    PrerequisiteGraph()._store(db, {"Functions": ["Algebra"]})
+    assert len(failures) == 2
+    assert db.query(PrerequisiteEdge).count() == 1
+    assert db.query(PrerequisiteTopic.key).filter(PrerequisiteTopic.expanded_at.isnot(None)).all() == [("algebra",)]
+
+
+def test_fetch_charges_the_quota_once():
+    client = AIClient(provider=FakeProvider(latency_seconds=0, jitter_seconds=0))
+    client.scheduler = FairScheduler(user_rate_per_minute=0.001, user_burst=2)
+    topics = ["Calculus", "Limits", "Functions", "Algebra", "Arithmetic"]
+    found = client.run(fetch_prerequisites(client, topics), user_id=7)
+    assert sorted(found) == sorted(topics)
+    # The batch took one of the two tokens; the prepaid flag does not outlive it.
+    client.ask_gemini("Explain recursion", user_id=7)
+    with pytest.raises(UserQuotaExceededError):
+        client.ask_gemini("Explain iteration", user_id=7)
@@ -0,0 +1,147 @@
+# tests/test_queries.py
+import datetime
+import json
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Flashcard, FlashcardDeck, QuizCollection, QuizQuestion, User, make_engine
+from queries import (
+    clone_deck, clone_quiz, community_page, delete_deck, list_public_decks, list_public_quizzes, list_user_decks,
+    list_user_quizzes,
+)
+
+USERS = 3
+
+
+@pytest.fixture
+def engine():
+    engine = make_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def seeded(engine, decks):
+    """A session on a database with `decks` decks and as many quizzes, spread over USERS users; most are public."""
+    db = sessionmaker(bind=engine, expire_on_commit=False)()
+    users = [User(username=f"User{u}", hashed_password="x") for u in range(USERS)]
+    db.add_all(users)
+    db.flush()
+    started = datetime.datetime(2025, 1, 1)
+    for d in range(decks):
+        # Pairs share a timestamp, so pages must break ties by id.
+        owner, timestamp, public = users[d % USERS].id, started + datetime.timedelta(minutes=d // 2), d % 4 != 0
+        deck = FlashcardDeck(topic_name=f"Deck {d}", user_id=owner, is_public=public, timestamp=timestamp, clone_count=d % 3)
+        quiz = QuizCollection(topic_name=f"Quiz {d}", user_id=owner, is_public=public, timestamp=timestamp)
+        db.add_all([deck, quiz])
+        db.flush()
+        db.add_all([Flashcard(front=f"Q{i}", back=f"A{i}", deck_id=deck.id) for i in range(3)])
+        db.add_all([QuizQuestion(question_text=f"Q{i}", options=json.dumps(["a", "b"]), correct_answer="a",
+                                 collection_id=quiz.id) for i in range(2)])
+    db.commit()
+    return db
+
+
+def statements(engine, fn):
+    """(fn's result, number of SQL statements it ran)."""
+    executed = []
+    listener = lambda *args: executed.append(1)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        return fn(), len(executed)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+
+LISTINGS = {
+    "public decks": lambda db: list_public_decks(db),
+    "public quizzes": lambda db: list_public_quizzes(db),
+    "user decks": lambda db: list_user_decks(db, 1),
+    "user quizzes": lambda db: list_user_quizzes(db, 1),
+}
+
+
+@pytest.mark.parametrize("decks", [4, 40, 200])
+@pytest.mark.parametrize("listing", sorted(LISTINGS))
+def test_listings_run_one_statement(engine, decks, listing):
+    db = seeded(engine, decks)
+    rows, count = statements(engine, lambda: LISTINGS[listing](db))
+    assert count == 1
+    assert rows
+    # Reading counts and creators must not lazy-load anything.
+    _, count = statements(engine, lambda: [(row.creator, getattr(row, "card_count", None) or row.question_count) for row in rows])
+    assert count == 0
+
+
+def test_listing_counts_children(engine):
+    db = seeded(engine, 8)
+    assert {row.card_count for row in list_user_decks(db, 1)} == {3}
+    assert {row.question_count for row in list_user_quizzes(db, 1)} == {2}
+    assert {row.creator for row in list_public_decks(db)} == {f"User{u}" for u in range(USERS)}
+
+
+@pytest.mark.parametrize("decks", [30, 300])
+@pytest.mark.parametrize("kind", ["decks", "quizzes"])
+@pytest.mark.parametrize("sort", ["recent", "popular"])
+def test_first_and_next_pages_run_one_statement(engine, decks, kind, sort):
+    db = seeded(engine, decks)
+    first, count = statements(engine, lambda: community_page(db, kind, sort=sort, page_size=10))
+    assert count == 1 and len(first.rows) == 10 and first.next_cursor
+    second, count = statements(engine, lambda: community_page(db, kind, sort=sort, cursor=first.next_cursor, page_size=10))
+    assert count == 1 and len(second.rows) == 10
+
+
+@pytest.mark.parametrize("decks", [30, 300])
+def test_creator_filter_adds_one_lookup(engine, decks):
+    db = seeded(engine, decks)
+    page, count = statements(engine, lambda: community_page(db, "decks", creator="user1", page_size=10))
+    assert count == 2
+    assert {row.user_id for row in page.rows} == {2}
+
+
+@pytest.mark.parametrize("sort, key", [
+    ("recent", lambda row: (row.timestamp, row.id)),
+    ("popular", lambda row: (row.clone_count, row.id)),
+])
+def test_pages_walk_every_public_row_once_in_order(engine, sort, key):
+    db = seeded(engine, 45)
+    walked, cursor = [], None
+    while True:
+        page = community_page(db, "decks", sort=sort, cursor=cursor, page_size=7)
+        walked += page.rows
+        cursor = page.next_cursor
+        if not cursor:
+            break
+    expected = sorted(list_public_decks(db), key=key, reverse=True)
+    assert [row.id for row in walked] == [row.id for row in expected]
+
+
+def test_topic_filter_matches_substrings_literally(engine):
+    db = seeded(engine, 12)
+    assert [row.topic_name for row in community_page(db, "decks", topic="deck 1").rows] == ["Deck 11", "Deck 10", "Deck 1"]
+    assert community_page(db, "decks", topic="%").rows == []
+    assert community_page(db, "decks", creator="nobody").rows == []
+
+
+def test_clone_copies_public_content_and_counts_it(engine):
+    db = seeded(engine, 4)
+    copy_id = clone_deck(db, 2, user_id=1)
+    assert {row.id: row.card_count for row in list_user_decks(db, 1)}[copy_id] == 3
+    assert db.get(FlashcardDeck, 2).clone_count == 2
+    assert clone_quiz(db, 2, user_id=1) is not None
+
+
+@pytest.mark.parametrize("clone", [clone_deck, clone_quiz])
+def test_clone_refuses_private_or_missing_content(engine, clone):
+    db = seeded(engine, 4)
+    # Item 1 is private (every fourth item is), 999 never existed.
+    assert clone(db, 1, user_id=2) is None
+    assert clone(db, 999, user_id=2) is None
+
+
+def test_clone_of_a_deleted_deck_returns_none(engine):
+    db = seeded(engine, 4)
+    delete_deck(db, 2, user_id=2)
+    assert clone_deck(db, 2, user_id=1) is None